@@ -0,0 +1,132 @@
+# File: bench_positions_aggregation.py
+#
+# Compares GET /positions read from the holdings table (aggregate_open_positions)
+# against the original per-row Python loop at several portfolio sizes.
+#
+# Usage (from the backend directory):
+#   python bench_positions_aggregation.py                 # 10k, 100k and 1M lots
+#   python bench_positions_aggregation.py --sizes 10000 50000
+#
+# Each size gets its own throwaway database in a temp directory.
+
+import argparse
+import contextlib
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def legacy_aggregate(conn, dict_factory):
+    """The GET /positions body before aggregation moved into SQL, kept for comparison."""
+    c = conn.cursor()
+    c.row_factory = dict_factory
+    c.execute("""
+        SELECT
+            id, ticker, symbol, sector, buy_date, buy_price, qty,
+            current_price, daily_change, daily_pnl, tradevalue,
+            market_value, total_pnl, pct_pnl, pos_age, account, tvm
+        FROM positions
+        WHERE sell_date IS NULL AND qty > 0 AND type = 'BUY'
+        ORDER BY symbol, buy_date ASC
+    """)
+    grouped = defaultdict(lambda: {"totalQty": 0, "totalCost": 0.0, "buy_date_first": None})
+    for row in c.fetchall():
+        sym = row.get('symbol', '').upper()
+        qty = row.get('qty', 0)
+        ticker = str(row.get('ticker', '')) if not pd.isna(row.get('ticker')) else ""
+        buy_date = row.get('buy_date')
+        for k in ['current_price', 'daily_change', 'daily_pnl', 'tradevalue',
+                  'market_value', 'total_pnl', 'pct_pnl', 'tvm']:
+            row[k] = float(row.get(k, 0.0))
+        for k in ['sector', 'pos_age', 'account']:
+            row[k] = str(row.get(k, '')).strip()
+        if sym and qty > 0:
+            g = grouped[sym]
+            if g["totalQty"] == 0:
+                g.update(row, ticker=ticker, buy_date_first=buy_date)
+            if buy_date and (g["buy_date_first"] is None or buy_date < g["buy_date_first"]):
+                g["buy_date_first"] = buy_date
+            g["totalQty"] += qty
+            g["totalCost"] += qty * row.get('buy_price', 0.0)
+
+    result = []
+    for sym, data in grouped.items():
+        avg = round(data["totalCost"] / data["totalQty"], 2)
+        market_value = round(round(data["current_price"], 2) * data["totalQty"], 2)
+        result.append({"symbol": sym, "avgPrice": avg, "totalQty": data["totalQty"], "marketValue": market_value})
+    return result
+
+
+def populate(db_path, lots):
+    """Inserts `lots` open BUY lots spread over lots/20 symbols."""
+    rng = np.random.default_rng(11)
+    symbols = np.array([f"SYM{i:06d}" for i in range(max(lots // 20, 1))])
+    buy_price = rng.uniform(50, 5000, lots).round(2)
+    qty = rng.integers(1, 500, lots)
+    buy_dates = (pd.Timestamp("2018-01-01") + pd.to_timedelta(rng.integers(0, 2500, lots), unit="D")).strftime("%Y-%m-%d")
+    rows = zip(
+        rng.choice(symbols, lots).tolist(), buy_dates.tolist(), buy_price.tolist(), qty.tolist(),
+        (buy_price * rng.uniform(0.7, 1.5, lots)).round(2).tolist(),
+    )
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany("""
+            INSERT INTO positions (ticker, symbol, sector, buy_date, buy_price, qty, type,
+                                   current_price, daily_change, daily_pnl, tradevalue,
+                                   market_value, total_pnl, pct_pnl, tvm, pos_age, account)
+            VALUES ('', ?, 'Energy', ?, ?, ?, 'BUY', ?, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, '', 'Zerodha')
+        """, rows)
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="GET /positions aggregation: SQL vs Python loop")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(tempfile.mkdtemp(prefix="bench_positions_"))
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        import main # creates and migrates portfolio.db in the temp directory
+
+    print(f"{'lots':>10} {'symbols':>8} {'python loop':>14} {'sql':>10} {'speedup':>8}")
+    for lots in args.sizes:
+        db_path = os.path.abspath(f"bench_{lots}.db")
+        with sqlite3.connect(main.DB_NAME) as src, sqlite3.connect(db_path) as dst:
+            src.backup(dst) # empty, fully migrated schema
+        populate(db_path, lots)
+
+        with sqlite3.connect(db_path) as conn:
+            legacy = legacy_aggregate(conn, main.dict_factory)
+            current = main.aggregate_open_positions(conn)
+            # holdings sums lots in insertion order, the loop in (symbol, buy_date)
+            # order; the float difference can flip a half-paisa rounding of avgPrice.
+            expected = sorted((r["symbol"], r["totalQty"], r["avgPrice"]) for r in legacy)
+            assert len(current) == len(expected)
+            for r, (symbol, total_qty, avg_price) in zip(current, expected):
+                assert (r["symbol"], r["totalQty"]) == (symbol, total_qty)
+                assert abs(r["avgPrice"] - avg_price) <= 0.011, (symbol, r["avgPrice"], avg_price)
+
+            legacy_ms = best_of(lambda: legacy_aggregate(conn, main.dict_factory), args.repeat)
+            sql_ms = best_of(lambda: main.aggregate_open_positions(conn), args.repeat)
+        print(f"{lots:>10} {len(current):>8} {legacy_ms:>11.1f} ms {sql_ms:>7.1f} ms {legacy_ms / sql_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main_cli()
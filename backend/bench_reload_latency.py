@@ -0,0 +1,144 @@
+# File: bench_reload_latency.py
+#
+# Measures GET /positions latency while /reload-excel-data runs in a loop.
+# Before the DB/Excel executors, every reload froze the event loop for the
+# whole pd.read_excel call, so p99 of /positions tracked the reload time.
+#
+# Usage (from the backend directory):
+#   python bench_reload_latency.py                      # synthetic 20k-row workbook
+#   python bench_reload_latency.py --rows 50000
+#   python bench_reload_latency.py --excel /path/to/factor9.xlsx
+#   python bench_reload_latency.py --mode incremental --sidecar
+#
+# Every reload is forced (the workbook never changes, so the fingerprint check
+# would otherwise skip it) and, unless --sidecar is given, the columnar sidecar
+# is cleared first so each reload pays for the full openpyxl parse.
+#
+# Runs against a throwaway database in a temp directory; portfolio.db is untouched.
+
+import argparse
+import asyncio
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def write_synthetic_workbook(path, rows):
+    """Writes a positions workbook shaped like factor9.xlsx."""
+    rng = np.random.default_rng(7)
+    symbols = [f"SYM{i:04d}" for i in range(max(rows // 10, 1))]
+    buy_price = rng.uniform(50, 5000, rows).round(2)
+    current_price = (buy_price * rng.uniform(0.7, 1.5, rows)).round(2)
+    qty = rng.integers(1, 500, rows)
+    df = pd.DataFrame({
+        "Symbol": rng.choice(symbols, rows),
+        "Ticker": "",
+        "Sector": rng.choice(["Energy", "Chemical", "Banking", "IT", "Pharma"], rows),
+        "Buy Date": pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 2000, rows), unit="D"),
+        "Avg Price": [f"₹{p:,.2f}" for p in buy_price],
+        "Qty": qty,
+        "Current Price": [f"₹{p:,.2f}" for p in current_price],
+        "Daily Change": rng.normal(0, 10, rows).round(2),
+        "Daily PnL": rng.normal(0, 500, rows).round(2),
+        "Tradevalue": (buy_price * qty).round(2),
+        "Market Value": (current_price * qty).round(2),
+        "Account": rng.choice(["Zerodha", "ICICI"], rows),
+        "Type": "BUY",
+    })
+    df.to_excel(path, index=False)
+
+
+def percentile(values, pct):
+    return float(np.percentile(values, pct)) * 1000 if values else 0.0
+
+
+async def measure_positions(client, duration):
+    """Issues back-to-back GET /positions for `duration` seconds and returns latencies."""
+    latencies = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        response = await client.get("/positions")
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+async def reload_loop(client, stop_event, reload_times, mode, sidecar_dir):
+    while not stop_event.is_set():
+        if sidecar_dir:
+            shutil.rmtree(sidecar_dir, ignore_errors=True)
+        started = time.perf_counter()
+        response = await client.post("/reload-excel-data", params={"mode": mode, "force": "true"})
+        response.raise_for_status()
+        reload_times.append(time.perf_counter() - started)
+
+
+def report(label, latencies):
+    print(f"{label:<28} n={len(latencies):<6} "
+          f"p50={percentile(latencies, 50):8.2f} ms  "
+          f"p95={percentile(latencies, 95):8.2f} ms  "
+          f"p99={percentile(latencies, 99):8.2f} ms  "
+          f"max={percentile(latencies, 100):8.2f} ms")
+
+
+async def run(args):
+    import httpx
+
+    # main.py logs every request; keep the report readable.
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        import main
+
+        main.POSITIONS_EXCEL_FILE = args.excel
+        main.load_raw_excel_data_into_db()
+
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            idle = await measure_positions(client, args.duration)
+
+            stop_event = asyncio.Event()
+            reload_times = []
+            sidecar_dir = None if args.sidecar else main.EXCEL_CACHE_DIR
+            reloader = asyncio.create_task(reload_loop(client, stop_event, reload_times, args.mode, sidecar_dir))
+            loaded = await measure_positions(client, args.duration)
+            stop_event.set()
+            await reloader
+
+    report("GET /positions (idle)", idle)
+    report("GET /positions (reloading)", loaded)
+    report("POST /reload-excel-data", reload_times)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="GET /positions latency during Excel reloads")
+    parser.add_argument("--excel", help="Positions workbook to reload (default: synthetic)")
+    parser.add_argument("--rows", type=int, default=20000, help="Rows in the synthetic workbook")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per measurement phase")
+    parser.add_argument("--mode", choices=["full", "incremental"], default="full",
+                        help="Reload mode; full rewrites every BUY row on each reload (default: full)")
+    parser.add_argument("--sidecar", action="store_true",
+                        help="Keep the columnar sidecar between reloads instead of re-parsing the workbook")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_reload_")
+    if not args.excel:
+        args.excel = os.path.join(workdir, "positions.xlsx")
+        print(f"Writing synthetic workbook with {args.rows} rows to {args.excel}...")
+        write_synthetic_workbook(args.excel, args.rows)
+
+    # main.py opens portfolio.db relative to the working directory at import time.
+    os.chdir(workdir)
+    sys.path.insert(0, BACKEND_DIR)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main_cli()
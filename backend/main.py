@@ -1,26 +1,155 @@
 # File: main.py
 
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, HTTPException, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field, validator
-from typing import Optional, List, Dict, Any
+from typing import Annotated, Optional, List, Dict, Any
 from datetime import date, datetime
 import sqlite3
 import uvicorn
 import pandas as pd
-from collections import defaultdict
+from collections import defaultdict, deque
 import numpy as np
 import os
+import sys
+import base64
+import csv
+import hashlib
+import io
+import json
+import threading
+import time
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Starts the Excel watcher and the /stream broadcaster, and stops them on shutdown."""
+    start_excel_watcher()
+    broadcaster.start()
+    try:
+        yield
+    finally:
+        broadcaster.stop()
+        stop_excel_watcher()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# --- Data Version ---
+# A counter in the data_version table (migration 10), bumped inside every write
+# transaction that changed rows (see ConnectionPool.write). Every process using
+# the database sees the same value, so read endpoints use it as a strong ETag:
+# the same version always serializes to the same bytes, and If-None-Match can be
+# answered with a 304 before any route code or SQL runs, including after writes
+# by other processes (`python main.py rebuild-index`, a second uvicorn worker).
+# VersionedCache and the PortfolioEngine are kept in step with it the same way.
+class DataVersion:
+    """The shared data version as last seen by this process, exposed as an ETag."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._probe = None # connection used only to poll PRAGMA data_version
+        self._probe_version = None
+        # Random per database file, so tags from a replaced database never match.
+        self.epoch = None
+        self.value = 0
+        self.listeners = [] # called after every new version, on the thread that saw it
+
+    @staticmethod
+    def read(conn):
+        """Returns the (epoch, value) stored in the database."""
+        return tuple(conn.execute("SELECT epoch, value FROM data_version WHERE id = 1").fetchone())
+
+    @staticmethod
+    def bump(conn):
+        """Increments the stored value inside the caller's write transaction; returns the new (epoch, value)."""
+        return tuple(conn.execute(
+            "UPDATE data_version SET value = value + 1 WHERE id = 1 RETURNING epoch, value"
+        ).fetchone())
+
+    def install(self, version):
+        """Adopts a version read from the database and notifies the listeners if it is newer."""
+        with self._lock:
+            epoch, value = version
+            if epoch == self.epoch and value <= self.value:
+                return False # a commit that finished late; a newer one was already seen
+            self.epoch, self.value = epoch, value
+        for listener in self.listeners:
+            listener()
+        return True
+
+    def refresh(self):
+        """
+        Catches up with commits made through other connections and returns the
+        current (epoch, value). PRAGMA data_version only changes when another
+        connection commits and reads the WAL index in shared memory, so the
+        stored counter is re-read only after a commit and this is cheap enough
+        to run on every request.
+        """
+        with self._lock:
+            if self._probe is None:
+                self._probe = db.open_dedicated()
+            probe_version = self._probe.execute("PRAGMA data_version").fetchone()[0]
+            changed, self._probe_version = probe_version != self._probe_version, probe_version
+            stored = self.read(self._probe) if changed else None
+        if stored is not None:
+            self.install(stored)
+        return self.current()
+
+    def current(self):
+        with self._lock:
+            return self.epoch, self.value
+
+    def etag(self):
+        epoch, value = self.refresh()
+        return f'"{epoch}-{value}"'
+
+
+data_version = DataVersion()
+
+ETAG_PATHS = {
+    "/positions", "/realised", "/trades", "/all_trades", "/portfolio-history",
+    "/portfolio-history/rollups", "/calculate-live-index", "/dividends", "/changes", "/analytics",
+}
+
+
+def etag_matches(if_none_match, etag):
+    """True if an If-None-Match header value matches etag (weak comparison, per RFC 9110)."""
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+@app.middleware("http")
+async def conditional_get(request, call_next):
+    """Adds ETags to the read endpoints and answers matching If-None-Match with 304."""
+    if request.method != "GET" or request.url.path not in ETAG_PATHS:
+        return await call_next(request)
+    # Taken before the handler runs: a write that lands meanwhile makes this tag
+    # stale, which only costs the client one extra full response.
+    etag = await run_in_executor(_db_executor, data_version.etag)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    response = await call_next(request)
+    if response.status_code == 200:
+        response.headers.update(headers)
+    return response
 
-app = FastAPI()
 
 # --- CORS ---
+# Added after conditional_get so it wraps it and 304s carry the CORS headers too.
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Next-Cursor", "ETag"],
 )
 
 # --- Database & File Paths ---
@@ -84,190 +213,1563 @@ def init_db():
             )
         """)
         conn.commit()
+        run_migrations(conn)
         print("init_db: Database initialization complete.")
 
+
+# --- Holdings Summary ---
+# holdings carries the per-symbol aggregates of open 'BUY' lots so that reads are
+# O(symbols) instead of O(lots). These statements are the bodies of the triggers
+# installed by migration 4 and of rebuild_holdings().
+HOLDINGS_ADD_LOT = """
+            INSERT INTO holdings (symbol, total_qty, total_cost, market_value, daily_pnl, first_buy_date, lot_count)
+            VALUES ({row}.symbol, {row}.qty, {row}.qty * COALESCE({row}.buy_price, 0.0),
+                    {row}.qty * COALESCE({row}.current_price, 0.0), COALESCE({row}.daily_pnl, 0.0),
+                    {row}.buy_date, 1)
+            ON CONFLICT (symbol) DO UPDATE SET
+                total_qty = total_qty + excluded.total_qty,
+                total_cost = total_cost + excluded.total_cost,
+                market_value = market_value + excluded.market_value,
+                daily_pnl = daily_pnl + excluded.daily_pnl,
+                first_buy_date = CASE
+                    WHEN first_buy_date IS NULL OR excluded.first_buy_date < first_buy_date
+                    THEN excluded.first_buy_date ELSE first_buy_date END,
+                lot_count = lot_count + 1;
+"""
+HOLDINGS_REMOVE_LOT = """
+            UPDATE holdings SET
+                total_qty = total_qty - {row}.qty,
+                total_cost = total_cost - {row}.qty * COALESCE({row}.buy_price, 0.0),
+                market_value = market_value - {row}.qty * COALESCE({row}.current_price, 0.0),
+                daily_pnl = daily_pnl - COALESCE({row}.daily_pnl, 0.0),
+                lot_count = lot_count - 1,
+                -- MIN cannot be decremented; re-read it from idx_positions_open_buy.
+                first_buy_date = (
+                    SELECT MIN(buy_date) FROM positions
+                    WHERE symbol = {row}.symbol AND sell_date IS NULL AND qty > 0 AND type = 'BUY'
+                )
+            WHERE symbol = {row}.symbol;
+            DELETE FROM holdings WHERE symbol = {row}.symbol AND lot_count <= 0;
+"""
+# True when an UPDATE moved a lot in or out of its holding (as opposed to only
+# repricing it); used by the update triggers installed in migration 6.
+HOLDINGS_LOT_CHANGED = """NOT (
+            OLD.symbol IS NEW.symbol AND OLD.qty IS NEW.qty AND OLD.buy_price IS NEW.buy_price
+            AND OLD.buy_date IS NEW.buy_date AND OLD.sell_date IS NEW.sell_date AND OLD.type IS NEW.type
+        )"""
+HOLDINGS_FROM_POSITIONS_SQL = """
+    SELECT
+        symbol,
+        SUM(qty),
+        SUM(qty * COALESCE(buy_price, 0.0)),
+        SUM(qty * COALESCE(current_price, 0.0)),
+        SUM(COALESCE(daily_pnl, 0.0)),
+        MIN(buy_date),
+        COUNT(*)
+    FROM positions
+    WHERE sell_date IS NULL AND qty > 0 AND type = 'BUY'
+    GROUP BY symbol
+"""
+HOLDINGS_COLUMNS = ['symbol', 'total_qty', 'total_cost', 'market_value', 'daily_pnl', 'first_buy_date', 'lot_count']
+
+
+def rebuild_holdings(conn):
+    """Recomputes the holdings table from positions. Runs in the caller's transaction."""
+    c = conn.cursor()
+    c.execute("DELETE FROM holdings")
+    c.execute("INSERT INTO holdings " + HOLDINGS_FROM_POSITIONS_SQL)
+    return c.rowcount
+
+
+def check_holdings(conn, tolerance=0.01):
+    """
+    Compares holdings with a fresh aggregate of positions and returns one
+    {"symbol", "column", "holdings", "positions"} entry per mismatch.
+    Running sums drift by float rounding, so numeric columns use `tolerance`.
+    """
+    c = conn.cursor()
+    c.execute(HOLDINGS_FROM_POSITIONS_SQL)
+    expected = {row[0]: row for row in c.fetchall()}
+    c.execute(f"SELECT {', '.join(HOLDINGS_COLUMNS)} FROM holdings")
+    actual = {row[0]: row for row in c.fetchall()}
+
+    mismatches = []
+    for symbol in sorted(expected.keys() | actual.keys(), key=lambda s: (s is None, s or '')):
+        exp_row, act_row = expected.get(symbol), actual.get(symbol)
+        if exp_row is None or act_row is None:
+            mismatches.append({
+                "symbol": symbol, "column": "*",
+                "holdings": "present" if act_row else "missing",
+                "positions": "present" if exp_row else "missing",
+            })
+            continue
+        for col, exp_val, act_val in zip(HOLDINGS_COLUMNS[1:], exp_row[1:], act_row[1:]):
+            if isinstance(exp_val, float) or isinstance(act_val, float):
+                same = abs((exp_val or 0.0) - (act_val or 0.0)) <= tolerance
+            else:
+                same = exp_val == act_val
+            if not same:
+                mismatches.append({"symbol": symbol, "column": col, "holdings": act_val, "positions": exp_val})
+    return mismatches
+
+
+# --- Change Log Retention ---
+# change_log (migration 5) is compacted past this window; see GET /changes.
+CHANGE_LOG_RETENTION_DAYS = 7
+
+
+def compact_change_log(conn, retention_days=CHANGE_LOG_RETENTION_DAYS):
+    """Deletes change_log entries older than the retention window. Runs in the caller's transaction."""
+    c = conn.cursor()
+    c.execute(
+        "SELECT MAX(seq) FROM change_log WHERE changed_at < strftime('%Y-%m-%dT%H:%M:%S', 'now', ?)",
+        (f"-{retention_days} days",)
+    )
+    cutoff = c.fetchone()[0]
+    if cutoff is None:
+        return 0
+    c.execute("DELETE FROM change_log WHERE seq <= ?", (cutoff,))
+    deleted = c.rowcount
+    c.execute("UPDATE change_log_state SET compacted_through = MAX(compacted_through, ?) WHERE id = 1", (cutoff,))
+    print(f"compact_change_log: Removed {deleted} change_log entries up to seq {cutoff}.")
+    return deleted
+
+
+# --- Snapshot Rollups ---
+# portfolio_rollups (migration 7) holds one OHLC-style row of the index per
+# week (Monday start) and per calendar month. take_snapshot refreshes only the
+# week and month of the day it writes; an index rebuild refreshes the periods
+# from its first changed day on.
+ROLLUP_PERIODS = {
+    # period: (first day of the period containing {d}, last day of that period)
+    "week": ("date({d}, 'weekday 0', '-6 days')", "date({d}, 'weekday 0')"),
+    "month": ("date({d}, 'start of month')", "date({d}, 'start of month', '+1 month', '-1 day')"),
+}
+PORTFOLIO_ROLLUP_SQL = """
+    INSERT INTO portfolio_rollups (
+        period, period_start, first_date, last_date, open, high, low, close,
+        market_value, net_cash_flow, snapshots
+    )
+    SELECT '{period}', period_start, MIN(date), MAX(date),
+           MAX(CASE WHEN first_rank = 1 THEN idx END), MAX(idx), MIN(idx),
+           MAX(CASE WHEN last_rank = 1 THEN idx END),
+           MAX(CASE WHEN last_rank = 1 THEN market_value END),
+           SUM(COALESCE(net_cash_flow_today, 0.0)), COUNT(*)
+    FROM (
+        SELECT {start} AS period_start, date, portfolio_index_value AS idx,
+               market_value, net_cash_flow_today,
+               ROW_NUMBER() OVER (PARTITION BY {start} ORDER BY date) AS first_rank,
+               ROW_NUMBER() OVER (PARTITION BY {start} ORDER BY date DESC) AS last_rank
+        FROM portfolio_snapshots
+        WHERE date >= {date_from} AND date <= {date_to}
+    )
+    GROUP BY period_start
+"""
+
+
+def portfolio_rollup_sql(period, date_from, date_to):
+    """PORTFOLIO_ROLLUP_SQL for every whole period overlapping [date_from, date_to] (SQL expressions)."""
+    start, end = ROLLUP_PERIODS[period]
+    return PORTFOLIO_ROLLUP_SQL.format(
+        period=period,
+        start=start.format(d="date"),
+        date_from=start.format(d=date_from),
+        date_to=end.format(d=date_to),
+    )
+
+
+def refresh_portfolio_rollups(conn, date_from, date_to):
+    """Recomputes the rollups of every period overlapping [date_from, date_to]. Runs in the caller's transaction."""
+    c = conn.cursor()
+    for period, (start, _) in ROLLUP_PERIODS.items():
+        c.execute(
+            f"DELETE FROM portfolio_rollups WHERE period = ? AND period_start BETWEEN {start.format(d='?')} AND {start.format(d='?')}",
+            (period, date_from, date_to)
+        )
+        c.execute(portfolio_rollup_sql(period, "?", "?"), (date_from, date_to))
+
+
+# The positions columns loaded from the workbook, in load order.
+EXCEL_SYNC_COLUMNS = [
+    'ticker', 'symbol', 'sector', 'buy_date', 'sell_date',
+    'buy_price', 'sell_price', 'qty', 'type', 'note', 'strategy',
+    'tradevalue', 'market_value', 'total_pnl', 'pct_pnl', 'tvm', 'pos_age',
+    'account', 'current_price', 'daily_change', 'daily_pnl'
+]
+
+
+# --- Schema Migrations ---
+# Each migration is (version, name, statements) and runs exactly once, in order.
+# Append new migrations to the end of the list; never edit one that has shipped.
+MIGRATIONS = [
+    (1, "positions hot-path indexes", [
+        # Open BUY lots by symbol, in FIFO order. Covers simulate/snapshot/live-index.
+        """
+        CREATE INDEX IF NOT EXISTS idx_positions_open_buy
+        ON positions (symbol, buy_date, qty, buy_price, current_price, daily_pnl)
+        WHERE sell_date IS NULL AND qty > 0 AND type = 'BUY'
+        """,
+        # Realised rows for /realised, newest first.
+        """
+        CREATE INDEX IF NOT EXISTS idx_positions_realised
+        ON positions (sell_date)
+        WHERE type IN ('SELL', 'CLOSED_FULL_SELL') AND qty = 0 AND sell_date IS NOT NULL
+        """,
+        # Full ledger ordering for /trades.
+        "CREATE INDEX IF NOT EXISTS idx_positions_buy_date ON positions (buy_date)",
+    ]),
+    (2, "positions row_hash for incremental Excel sync", [
+        "ALTER TABLE positions ADD COLUMN row_hash TEXT",
+    ]),
+    (3, "source file fingerprints", [
+        """
+        CREATE TABLE IF NOT EXISTS source_files (
+            path TEXT PRIMARY KEY,
+            mtime_ns INTEGER,
+            size INTEGER,
+            sha256 TEXT,
+            loaded_at TEXT
+        )
+        """,
+    ]),
+    (4, "holdings summary maintained by triggers", [
+        # One row per symbol with open 'BUY' lots. Kept in step with positions by
+        # the triggers below; rebuild_holdings() recomputes it from scratch.
+        """
+        CREATE TABLE IF NOT EXISTS holdings (
+            symbol TEXT PRIMARY KEY,
+            total_qty INTEGER NOT NULL,
+            total_cost REAL NOT NULL,
+            market_value REAL NOT NULL,
+            daily_pnl REAL NOT NULL,
+            first_buy_date TEXT,
+            lot_count INTEGER NOT NULL
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_holdings_insert
+        AFTER INSERT ON positions
+        WHEN NEW.sell_date IS NULL AND NEW.qty > 0 AND NEW.type = 'BUY'
+        BEGIN
+            %s
+        END
+        """ % HOLDINGS_ADD_LOT.format(row="NEW"),
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_holdings_delete
+        AFTER DELETE ON positions
+        WHEN OLD.sell_date IS NULL AND OLD.qty > 0 AND OLD.type = 'BUY'
+        BEGIN
+            %s
+        END
+        """ % HOLDINGS_REMOVE_LOT.format(row="OLD"),
+        # An update moves a lot out of its old holding and into its new one;
+        # either side is skipped when that version of the row is not an open lot.
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_holdings_update_old
+        AFTER UPDATE OF symbol, buy_date, sell_date, buy_price, qty, type, current_price, daily_pnl ON positions
+        WHEN OLD.sell_date IS NULL AND OLD.qty > 0 AND OLD.type = 'BUY'
+        BEGIN
+            %s
+        END
+        """ % HOLDINGS_REMOVE_LOT.format(row="OLD"),
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_holdings_update_new
+        AFTER UPDATE OF symbol, buy_date, sell_date, buy_price, qty, type, current_price, daily_pnl ON positions
+        WHEN NEW.sell_date IS NULL AND NEW.qty > 0 AND NEW.type = 'BUY'
+        BEGIN
+            %s
+        END
+        """ % HOLDINGS_ADD_LOT.format(row="NEW"),
+        "INSERT INTO holdings " + HOLDINGS_FROM_POSITIONS_SQL,
+    ]),
+    (5, "change log for delta sync", [
+        # Append-only feed of row keys touched by writes; GET /changes joins
+        # them back to the current rows. seq never goes backwards or is reused.
+        """
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_key TEXT NOT NULL,
+            op TEXT NOT NULL,
+            changed_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%S', 'now'))
+        )
+        """,
+        # Highest seq removed by compaction; clients behind it must resync.
+        """
+        CREATE TABLE IF NOT EXISTS change_log_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            compacted_through INTEGER NOT NULL
+        )
+        """,
+        "INSERT OR IGNORE INTO change_log_state (id, compacted_through) VALUES (1, 0)",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_change_log_positions_insert
+        AFTER INSERT ON positions
+        BEGIN
+            INSERT INTO change_log (table_name, row_key, op) VALUES ('positions', NEW.id, 'insert');
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_change_log_positions_update
+        AFTER UPDATE ON positions
+        BEGIN
+            INSERT INTO change_log (table_name, row_key, op) VALUES ('positions', NEW.id, 'update');
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_change_log_positions_delete
+        AFTER DELETE ON positions
+        BEGIN
+            INSERT INTO change_log (table_name, row_key, op) VALUES ('positions', OLD.id, 'delete');
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_change_log_portfolio_snapshots_insert
+        AFTER INSERT ON portfolio_snapshots
+        BEGIN
+            INSERT INTO change_log (table_name, row_key, op) VALUES ('portfolio_snapshots', NEW.date, 'insert');
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_change_log_portfolio_snapshots_update
+        AFTER UPDATE ON portfolio_snapshots
+        BEGIN
+            INSERT INTO change_log (table_name, row_key, op) VALUES ('portfolio_snapshots', NEW.date, 'update');
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_change_log_portfolio_snapshots_delete
+        AFTER DELETE ON portfolio_snapshots
+        BEGIN
+            INSERT INTO change_log (table_name, row_key, op) VALUES ('portfolio_snapshots', OLD.date, 'delete');
+        END
+        """,
+    ]),
+    (6, "cheaper price updates for change log and holdings", [
+        # POST /prices rewrites current_price/daily_* on every open lot many times
+        # a day; those reach dashboards over /stream. Only log updates that touch
+        # other columns (Excel syncs and edits still set them, so are still logged).
+        "DROP TRIGGER IF EXISTS trg_change_log_positions_update",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_change_log_positions_update
+        AFTER UPDATE OF ticker, symbol, sector, buy_date, sell_date, buy_price, sell_price,
+                        qty, type, note, strategy, tradevalue, tvm, pos_age, account ON positions
+        BEGIN
+            INSERT INTO change_log (table_name, row_key, op) VALUES ('positions', NEW.id, 'update');
+        END
+        """,
+        # Repricing an open lot only shifts its holding's market value and daily
+        # P&L, so it no longer goes through the remove/add pair (and its MIN re-read).
+        "DROP TRIGGER IF EXISTS trg_holdings_update_old",
+        "DROP TRIGGER IF EXISTS trg_holdings_update_new",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_holdings_update_old
+        AFTER UPDATE OF symbol, buy_date, sell_date, buy_price, qty, type, current_price, daily_pnl ON positions
+        WHEN OLD.sell_date IS NULL AND OLD.qty > 0 AND OLD.type = 'BUY' AND %s
+        BEGIN
+            %s
+        END
+        """ % (HOLDINGS_LOT_CHANGED, HOLDINGS_REMOVE_LOT.format(row="OLD")),
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_holdings_update_new
+        AFTER UPDATE OF symbol, buy_date, sell_date, buy_price, qty, type, current_price, daily_pnl ON positions
+        WHEN NEW.sell_date IS NULL AND NEW.qty > 0 AND NEW.type = 'BUY' AND %s
+        BEGIN
+            %s
+        END
+        """ % (HOLDINGS_LOT_CHANGED, HOLDINGS_ADD_LOT.format(row="NEW")),
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_holdings_update_price
+        AFTER UPDATE OF current_price, daily_pnl ON positions
+        WHEN NEW.sell_date IS NULL AND NEW.qty > 0 AND NEW.type = 'BUY' AND NOT %s
+        BEGIN
+            UPDATE holdings SET
+                market_value = market_value + NEW.qty * (COALESCE(NEW.current_price, 0.0) - COALESCE(OLD.current_price, 0.0)),
+                daily_pnl = daily_pnl + COALESCE(NEW.daily_pnl, 0.0) - COALESCE(OLD.daily_pnl, 0.0)
+            WHERE symbol = NEW.symbol;
+        END
+        """ % HOLDINGS_LOT_CHANGED,
+    ]),
+    (7, "weekly and monthly snapshot rollups", [
+        """
+        CREATE TABLE IF NOT EXISTS portfolio_rollups (
+            period TEXT NOT NULL,
+            period_start TEXT NOT NULL,
+            first_date TEXT NOT NULL,
+            last_date TEXT NOT NULL,
+            open REAL,
+            high REAL,
+            low REAL,
+            close REAL,
+            market_value REAL,
+            net_cash_flow REAL NOT NULL,
+            snapshots INTEGER NOT NULL,
+            PRIMARY KEY (period, period_start)
+        )
+        """,
+        *(
+            portfolio_rollup_sql(
+                period,
+                "(SELECT MIN(date) FROM portfolio_snapshots)",
+                "(SELECT MAX(date) FROM portfolio_snapshots)",
+            )
+            for period in ("week", "month")
+        ),
+    ]),
+    (8, "dividends table", [
+        # Imported from the dividends workbook by load_dividends_data(). Workbook
+        # columns beyond the known ones are kept as a JSON object in extra.
+        """
+        CREATE TABLE IF NOT EXISTS dividends (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ticker TEXT NOT NULL DEFAULT '',
+            sector TEXT NOT NULL DEFAULT '',
+            date_of_disbur TEXT NOT NULL DEFAULT '',
+            qty NUMERIC,
+            rs_per_share NUMERIC,
+            amount REAL NOT NULL DEFAULT 0.0,
+            extra TEXT,
+            row_hash TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_dividends_ticker ON dividends (ticker, date_of_disbur)",
+        # Tickers keep the workbook's case; the ticker filter range-scans upper(ticker).
+        "CREATE INDEX IF NOT EXISTS idx_dividends_ticker_upper ON dividends (upper(ticker))",
+        # Pages are ordered by (date_of_disbur, id) in either direction; an
+        # ascending index serves both.
+        "CREATE INDEX IF NOT EXISTS idx_dividends_date ON dividends (date_of_disbur)",
+    ]),
+    (9, "forget the Excel row hash of edited lots", [
+        # row_hash is the hash of the workbook row a lot was last synced from.
+        # Once anything else rewrites the lot (an edit, a sell, a price tick), it
+        # no longer matches that row, so the next incremental sync must rewrite
+        # it just as a full sync would. /prices clears it in its own UPDATE.
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_positions_clear_row_hash
+        AFTER UPDATE OF %s ON positions
+        WHEN NEW.row_hash IS NOT NULL AND NEW.row_hash IS OLD.row_hash
+        BEGIN
+            UPDATE positions SET row_hash = NULL WHERE id = NEW.id;
+        END
+        """ % ", ".join(EXCEL_SYNC_COLUMNS),
+        # Lots edited before this migration cannot be told apart; drop every
+        # hash once, so the next incremental sync rewrites the open lots.
+        "UPDATE positions SET row_hash = NULL",
+    ]),
+    (10, "shared data version", [
+        # One row, bumped by every write transaction that changes rows (see
+        # ConnectionPool.write), so ETags and caches agree across processes.
+        """
+        CREATE TABLE IF NOT EXISTS data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            epoch TEXT NOT NULL,
+            value INTEGER NOT NULL
+        )
+        """,
+        "INSERT OR IGNORE INTO data_version (id, epoch, value) VALUES (1, lower(hex(randomblob(4))), 0)",
+    ]),
+]
+
+
+def run_migrations(conn):
+    """Applies every migration newer than the recorded schema version."""
+    c = conn.cursor()
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT,
+            applied_at TEXT
+        )
+    """)
+    c.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    current_version = c.fetchone()[0]
+
+    for version, name, statements in MIGRATIONS:
+        if version <= current_version:
+            continue
+        print(f"run_migrations: Applying migration {version} ({name})...")
+        for statement in statements:
+            c.execute(statement)
+        c.execute(
+            "INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+            (version, name, datetime.now().isoformat(timespec='seconds'))
+        )
+        conn.commit()
+        current_version = version
+
+    print(f"run_migrations: Schema is at version {current_version}.")
+
+    for name, detail in check_query_plans(conn):
+        print(f"run_migrations: WARNING: hot query '{name}' scans the positions table: {detail}")
+
+
+# Queries served on every request; check_query_plans() asserts none of them
+# falls back to a full scan of the positions table.
+HOT_QUERIES = {
+    "open_positions": """
+        SELECT h.symbol, h.total_qty, p.ticker, p.sector
+        FROM holdings h
+        JOIN positions p ON p.id = (
+            SELECT id FROM positions
+            WHERE symbol = h.symbol AND sell_date IS NULL AND qty > 0 AND type = 'BUY'
+            ORDER BY buy_date, id
+            LIMIT 1
+        )
+        ORDER BY h.symbol
+    """,
+    "holdings_first_buy_date": """
+        SELECT MIN(buy_date) FROM positions
+        WHERE symbol = 'X' AND sell_date IS NULL AND qty > 0 AND type = 'BUY'
+    """,
+    "sell_fifo": """
+        SELECT id, ticker, symbol, sector, buy_date, buy_price, qty
+        FROM positions
+        WHERE symbol = 'X' AND sell_date IS NULL AND qty > 0 AND type = 'BUY'
+        ORDER BY buy_date ASC, id ASC
+    """,
+    "realised": """
+        SELECT * FROM positions
+        WHERE type IN ('SELL', 'CLOSED_FULL_SELL') AND qty = 0 AND sell_date IS NOT NULL
+        ORDER BY sell_date DESC
+    """,
+    "trades": "SELECT * FROM positions ORDER BY buy_date ASC, id ASC",
+    "trades_page": """
+        SELECT * FROM positions
+        WHERE (buy_date >= '2024-01-01' AND (buy_date > '2024-01-01' OR id > 1))
+        ORDER BY buy_date ASC, id ASC LIMIT 201
+    """,
+    "realised_page": """
+        SELECT * FROM positions
+        WHERE type IN ('SELL', 'CLOSED_FULL_SELL') AND qty = 0 AND sell_date IS NOT NULL
+          AND (sell_date <= '2024-01-01' AND (sell_date < '2024-01-01' OR id < 1))
+        ORDER BY sell_date DESC, id DESC LIMIT 201
+    """,
+}
+
+
+def check_query_plans(conn):
+    """
+    Runs EXPLAIN QUERY PLAN over HOT_QUERIES and returns (name, detail) for
+    every query whose plan contains a bare table scan of positions.
+    """
+    offenders = []
+    c = conn.cursor()
+    for name, sql in HOT_QUERIES.items():
+        c.execute("EXPLAIN QUERY PLAN " + sql)
+        for row in c.fetchall():
+            detail = row[-1]
+            if detail.startswith("SCAN positions") and "INDEX" not in detail:
+                offenders.append((name, detail))
+    return offenders
+
+
 init_db()
 
-_dividends_data = []
 
-def load_raw_excel_data_into_db():
+# --- Connection Pool ---
+# Applied to every pooled connection. journal_mode=WAL is persistent in the
+# database file; the rest are per-connection.
+SQLITE_PRAGMAS = [
+    "PRAGMA journal_mode = WAL",       # readers no longer block on /sell_trade writes
+    "PRAGMA synchronous = NORMAL",     # durable at checkpoint, safe with WAL
+    "PRAGMA cache_size = -32000",      # 32 MB page cache per connection
+    "PRAGMA mmap_size = 268435456",    # 256 MB memory-mapped reads
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+]
+
+
+class ConnectionPool:
     """
-    Loads all raw data from the Excel file into the SQLite database's positions table.
-    This function specifically manages 'BUY' type positions, ensuring the DB reflects
-    the current open positions from the Excel source, while preserving 'SELL' type records.
+    Keeps SQLite connections open for the life of the process.
+    Each worker thread gets its own persistent read connection; all writes go
+    through a single writer connection serialized by a lock, inside a
+    BEGIN IMMEDIATE transaction that commits on success and rolls back on error.
     """
-    print(f"load_raw_excel_data_into_db: Attempting to load positions data from Excel: {POSITIONS_EXCEL_FILE}")
-    try:
-        df = pd.read_excel(POSITIONS_EXCEL_FILE)
-        print(f"load_raw_excel_data_into_db: Excel file '{POSITIONS_EXCEL_FILE}' read successfully.")
-        df.columns = df.columns.str.lower().str.replace(' ', '_') # Normalize column names
-        print("load_raw_excel_data_into_db: Lowercased and underscored Columns (Positions Excel):", df.columns.tolist())
-
-        # Data cleaning and type conversion for DataFrame
-        df['symbol'] = df['symbol'].astype(str).str.upper().str.strip()
-        df['buy_date'] = pd.to_datetime(df['buy_date'], errors='coerce').dt.strftime('%Y-%m-%d')
-        df['qty'] = pd.to_numeric(df['qty'], errors='coerce').fillna(0).astype(int)
-
-        if 'sell_date' in df.columns:
-            df['sell_date'] = pd.to_datetime(df['sell_date'], errors='coerce').dt.strftime('%Y-%m-%d').replace({pd.NaT: None})
-        else:
-            df['sell_date'] = None
 
-        if 'type' not in df.columns:
-            df['type'] = 'BUY' # Default to BUY if type column is missing in Excel
-        df['type'] = df['type'].fillna('BUY').astype(str).str.upper().str.strip()
+    def __init__(self, db_name, on_begin=None, before_commit=None, on_commit=None):
+        self.db_name = db_name
+        self.on_begin = on_begin # on_begin(conn), right after BEGIN
+        self.before_commit = before_commit # before_commit(conn) -> token, before a COMMIT of changed rows
+        self.on_commit = on_commit # on_commit(token), after that commit, still under the write lock
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._writer = None
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            kind: {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "connections_opened": 0}
+            for kind in ("read", "write", "dedicated")
+        }
 
-        currency_like_cols = [
-            'current_price', 'avg_price', 'delta', 'daily_change', 'daily_pnl',
-            'tradevalue', 'market_value', 'total_pnl', 'pct_pnl', 'weight_tv', 'weight_mv', 'tvm', 'pos_age'
-        ]
-        for col in currency_like_cols:
-            if col in df.columns:
-                df[col] = df[col].astype(str).str.replace(r'[₹,]', '', regex=True)
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0.0)
-            else:
-                df[col] = 0.0
+    def _connect(self, kind):
+        conn = sqlite3.connect(self.db_name, isolation_level=None, check_same_thread=False)
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        with self._metrics_lock:
+            self._metrics[kind]["connections_opened"] += 1
+        return conn
+
+    def _record(self, kind, started):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._metrics_lock:
+            m = self._metrics[kind]
+            m["count"] += 1
+            m["total_ms"] += elapsed_ms
+            m["max_ms"] = max(m["max_ms"], elapsed_ms)
+
+    @contextmanager
+    def read(self):
+        """Yields this thread's read connection (autocommit, no transaction)."""
+        started = time.perf_counter()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect("read")
+        self._record("read", started)
+        yield conn
+
+    @contextmanager
+    def write(self):
+        """Yields the writer connection inside one BEGIN IMMEDIATE transaction."""
+        started = time.perf_counter()
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._connect("write")
+            self._record("write", started)
+            conn = self._writer
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self.on_begin:
+                    self.on_begin(conn)
+                changes_before = conn.total_changes
+                yield conn
+                changed = conn.total_changes != changes_before
+                token = self.before_commit(conn) if changed and self.before_commit else None
+                conn.execute("COMMIT")
+            except BaseException:
+                # Also reached when COMMIT itself fails (SQLITE_BUSY, I/O error, a
+                # deferred constraint), which leaves the transaction open.
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            if changed and self.on_commit:
+                self.on_commit(token)
+
+    def open_dedicated(self):
+        """
+        Opens a non-pooled read connection for long-lived work such as streaming
+        exports, which may be resumed on any thread. The caller must close it.
+        """
+        return self._connect("dedicated")
+
+    def metrics(self):
+        """Returns connection acquisition counters and timings per connection kind."""
+        with self._metrics_lock:
+            return {
+                kind: {
+                    "count": m["count"],
+                    "connections_opened": m["connections_opened"],
+                    "avg_acquire_ms": round(m["total_ms"] / m["count"], 4) if m["count"] else 0.0,
+                    "max_acquire_ms": round(m["max_ms"], 4),
+                }
+                for kind, m in self._metrics.items()
+            }
 
-        string_cols = ['sector', 'account', 'ticker', 'ms_ticker', 'note', 'strategy']
-        for col in string_cols:
-            if col in df.columns:
-                df[col] = df[col].fillna('').astype(str).str.strip()
-            else:
-                df[col] = ''
 
-        # --- CRITICAL CHANGE: Rename 'avg_price' from Excel to 'buy_price' for DB consistency ---
-        if 'avg_price' in df.columns:
-            df = df.rename(columns={'avg_price': 'buy_price'})
-            print("load_raw_excel_data_into_db: Renamed 'avg_price' to 'buy_price' in DataFrame for DB insertion.")
+def _begin_write(conn):
+    # Another process may have committed since the engine was last in step; it
+    # must be current before a write path applies its own changes to it.
+    engine.catch_up(conn)
+
+
+def _after_write(version):
+    # The transaction updated the engine as it went, so it is in step with the new version.
+    engine.version = version
+    data_version.install(version)
+
+
+db = ConnectionPool(DB_NAME, on_begin=_begin_write, before_commit=data_version.bump, on_commit=_after_write)
+
+
+# --- Executors ---
+# Route bodies that touch SQLite run on a dedicated thread pool (each thread
+# holding its own pooled read connection) so the event loop never blocks.
+# Excel parsing gets its own single thread so a slow reload cannot starve DB work.
+DB_WORKERS = 4
+_db_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="db")
+_excel_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="excel")
+
+
+async def run_in_executor(executor, func, *args, **kwargs):
+    """Awaits a blocking call on the given executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+
+def run_in_db_executor(func):
+    """
+    Wraps a blocking route body so FastAPI awaits it on the DB executor.
+    functools.wraps keeps the original signature for request parsing.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_in_executor(_db_executor, func, *args, **kwargs)
+    return wrapper
+
+
+# --- Source File Fingerprints ---
+# An Excel source is only re-parsed when its fingerprint (mtime, size, sha256)
+# differs from the one recorded at the last successful load. mtime+size are
+# checked first so an untouched file is never even hashed.
+def _hash_file(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def source_fingerprint(path):
+    """
+    Returns (fingerprint, unchanged) for an Excel source. `unchanged` is True when
+    the file matches the fingerprint recorded by record_source_fingerprint().
+    """
+    st = os.stat(path)
+    with db.read() as conn:
+        c = conn.cursor()
+        c.row_factory = dict_factory
+        c.execute("SELECT mtime_ns, size, sha256 FROM source_files WHERE path = ?", (path,))
+        known = c.fetchone()
+
+    if known and known['mtime_ns'] == st.st_mtime_ns and known['size'] == st.st_size:
+        return {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha256": known['sha256']}, True
+
+    fingerprint = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha256": _hash_file(path)}
+    # Touched but byte-identical (e.g. OneDrive re-downloading the same version).
+    unchanged = bool(known) and known['sha256'] == fingerprint['sha256']
+    if unchanged:
+        with db.write() as conn:
+            record_source_fingerprint(conn, path, fingerprint)
+    return fingerprint, unchanged
+
+
+def record_source_fingerprint(conn, path, fingerprint):
+    """Stores the fingerprint of a successfully loaded source inside the caller's transaction."""
+    conn.execute("""
+        INSERT OR REPLACE INTO source_files (path, mtime_ns, size, sha256, loaded_at)
+        VALUES (?, ?, ?, ?, ?)
+    """, (
+        path, fingerprint['mtime_ns'], fingerprint['size'], fingerprint['sha256'],
+        datetime.now().isoformat(timespec='seconds')
+    ))
+
+
+def _parse_positions_workbook(path):
+    """
+    Parses and cleans the positions workbook and returns the open 'BUY' rows,
+    typed and ordered as the positions table columns.
+    """
+    df = pd.read_excel(path)
+    print(f"load_raw_excel_data_into_db: Excel file '{path}' read successfully.")
+    df.columns = df.columns.str.lower().str.replace(' ', '_') # Normalize column names
+    print("load_raw_excel_data_into_db: Lowercased and underscored Columns (Positions Excel):", df.columns.tolist())
+
+    # Data cleaning and type conversion for DataFrame
+    df['symbol'] = df['symbol'].astype(str).str.upper().str.strip()
+    df['buy_date'] = pd.to_datetime(df['buy_date'], errors='coerce').dt.strftime('%Y-%m-%d')
+    df['qty'] = pd.to_numeric(df['qty'], errors='coerce').fillna(0).astype(int)
+
+    if 'sell_date' in df.columns:
+        df['sell_date'] = pd.to_datetime(df['sell_date'], errors='coerce').dt.strftime('%Y-%m-%d').replace({pd.NaT: None})
+    else:
+        df['sell_date'] = None
+
+    if 'type' not in df.columns:
+        df['type'] = 'BUY' # Default to BUY if type column is missing in Excel
+    df['type'] = df['type'].fillna('BUY').astype(str).str.upper().str.strip()
+
+    currency_like_cols = [
+        'current_price', 'avg_price', 'delta', 'daily_change', 'daily_pnl',
+        'tradevalue', 'market_value', 'total_pnl', 'pct_pnl', 'weight_tv', 'weight_mv', 'tvm', 'pos_age'
+    ]
+    for col in currency_like_cols:
+        if col in df.columns:
+            df[col] = df[col].astype(str).str.replace(r'[₹,]', '', regex=True)
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0.0)
         else:
-            print("load_raw_excel_data_into_db: Warning: 'avg_price' column not found in Excel data. Ensuring 'buy_price' exists.")
-            if 'buy_price' not in df.columns:
-                df['buy_price'] = 0.0 # Default if neither avg_price nor buy_price exists
+            df[col] = 0.0
+
+    string_cols = ['sector', 'account', 'ticker', 'ms_ticker', 'note', 'strategy']
+    for col in string_cols:
+        if col in df.columns:
+            df[col] = df[col].fillna('').astype(str).str.strip()
+        else:
+            df[col] = ''
+
+    # --- CRITICAL CHANGE: Rename 'avg_price' from Excel to 'buy_price' for DB consistency ---
+    if 'avg_price' in df.columns:
+        df = df.rename(columns={'avg_price': 'buy_price'})
+        print("load_raw_excel_data_into_db: Renamed 'avg_price' to 'buy_price' in DataFrame for DB insertion.")
+    else:
+        print("load_raw_excel_data_into_db: Warning: 'avg_price' column not found in Excel data. Ensuring 'buy_price' exists.")
+        if 'buy_price' not in df.columns:
+            df['buy_price'] = 0.0 # Default if neither avg_price nor buy_price exists
+
+
+    # Filter for only 'BUY' type positions from Excel that are considered 'open'
+    open_positions_from_excel = df[
+        (df['qty'] > 0) &
+        (df['sell_date'].isna()) & # Check for None/NaN in sell_date
+        (df['type'] == 'BUY')
+    ].copy() # Use .copy() to avoid SettingWithCopyWarning
+
+    db_cols = EXCEL_SYNC_COLUMNS
+
+    # Ensure all db_cols are present in open_positions_from_excel, fill with None/0.0 if not
+    for col in db_cols:
+        if col not in open_positions_from_excel.columns:
+            if col in ["buy_price", "sell_price", "qty", "tradevalue", "market_value", "total_pnl", "pct_pnl", "tvm", "current_price", "daily_change", "daily_pnl"]:
+                open_positions_from_excel[col] = 0.0
+            else:
+                open_positions_from_excel[col] = '' # Default for text columns
+
+    # Reorder columns to match the INSERT statement
+    return open_positions_from_excel[db_cols].reset_index(drop=True)
+
+
+# --- Columnar Sidecar Cache ---
+# The cleaned DataFrame of each workbook is persisted next to the database,
+# keyed by the workbook's sha256, so a re-load of a known version reads a
+# binary columnar file instead of running openpyxl and the string cleanup again.
+# Parquet needs pyarrow; without it there is no sidecar and every changed
+# workbook is parsed from Excel. Pickle is deliberately not a fallback: loading
+# one runs arbitrary code from a file anyone with access to the directory can write.
+EXCEL_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(DB_NAME)), ".excel_cache")
+
+try:
+    import pyarrow # noqa: F401
+    SIDECAR_ENABLED = True
+except ImportError:
+    SIDECAR_ENABLED = False
+
+
+def _sidecar_path(path, sha256):
+    return os.path.join(EXCEL_CACHE_DIR, f"{os.path.basename(path)}.{sha256[:16]}.parquet")
+
+
+def _read_sidecar(path, sha256):
+    sidecar = _sidecar_path(path, sha256)
+    if not SIDECAR_ENABLED or not os.path.exists(sidecar):
+        return None
+    return pd.read_parquet(sidecar)
+
+
+def _write_sidecar(path, sha256, df):
+    if not SIDECAR_ENABLED:
+        return None
+    os.makedirs(EXCEL_CACHE_DIR, exist_ok=True)
+    prefix = os.path.basename(path) + "."
+    # Only the current version of each workbook is kept.
+    for name in os.listdir(EXCEL_CACHE_DIR):
+        if name.startswith(prefix):
+            os.remove(os.path.join(EXCEL_CACHE_DIR, name))
+    sidecar = _sidecar_path(path, sha256)
+    tmp = sidecar + ".tmp"
+    try:
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, sidecar)
+        return sidecar
+    except Exception as e:
+        # e.g. mixed-type object columns parquet cannot encode; the workbook is simply re-parsed next time.
+        print(f"_write_sidecar: Could not write parquet sidecar for {path}: {type(e).__name__}: {e}")
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return None
+
+
+def read_excel_cached(path, fingerprint, parser):
+    """
+    Returns parser(path), reading the sidecar for this fingerprint when one exists
+    and writing it after a fresh parse otherwise.
+    """
+    started = time.perf_counter()
+    try:
+        df = _read_sidecar(path, fingerprint['sha256'])
+    except Exception as e:
+        print(f"read_excel_cached: Ignoring unreadable sidecar for {path}: {type(e).__name__}: {e}")
+        df = None
+    if df is not None:
+        print(f"read_excel_cached: Loaded {path} from sidecar in {(time.perf_counter() - started) * 1000:.1f} ms.")
+        return df
+
+    df = parser(path)
+    print(f"read_excel_cached: Parsed {path} in {(time.perf_counter() - started) * 1000:.1f} ms.")
+    try:
+        _write_sidecar(path, fingerprint['sha256'], df)
+    except OSError as e:
+        print(f"read_excel_cached: Could not write sidecar for {path}: {e}")
+    return df
+
 
+def load_raw_excel_data_into_db(mode="incremental", force=False):
+    """
+    Loads all raw data from the Excel file into the SQLite database's positions table.
+    This function specifically manages 'BUY' type positions, ensuring the DB reflects
+    the current open positions from the Excel source, while preserving 'SELL' type records.
 
-        # Filter for only 'BUY' type positions from Excel that are considered 'open'
-        open_positions_from_excel = df[
-            (df['qty'] > 0) &
-            (df['sell_date'].isna()) & # Check for None/NaN in sell_date
-            (df['type'] == 'BUY')
-        ].copy() # Use .copy() to avoid SettingWithCopyWarning
+    mode="incremental" applies only the inserted/updated/deleted rows and keeps row ids
+    stable; mode="full" deletes every 'BUY' row and re-inserts the workbook.
+    An unchanged workbook is skipped unless force=True or mode="full".
+    Returns the diff counts, or None if the workbook could not be loaded.
+    """
+    print(f"load_raw_excel_data_into_db: Attempting to load positions data from Excel: {POSITIONS_EXCEL_FILE}")
+    try:
+        fingerprint, unchanged = source_fingerprint(POSITIONS_EXCEL_FILE)
+        if unchanged and not force and mode != "full":
+            print("load_raw_excel_data_into_db: Workbook unchanged since last load. Skipping parse.")
+            return {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0, "skipped": True}
 
-        print(f"load_raw_excel_data_into_db: Found {len(open_positions_from_excel)} open 'BUY' positions in Excel to synchronize.")
+        df_to_insert = read_excel_cached(POSITIONS_EXCEL_FILE, fingerprint, _parse_positions_workbook)
+        print(f"load_raw_excel_data_into_db: Found {len(df_to_insert)} open 'BUY' positions in Excel to synchronize.")
 
         # Now, synchronize with SQLite
-        with sqlite3.connect(DB_NAME) as conn:
-            c = conn.cursor()
-            
-            # 1. Delete all existing 'BUY' type positions from the database
-            c.execute("DELETE FROM positions WHERE type = 'BUY'")
-            print("load_raw_excel_data_into_db: Cleared existing 'BUY' type positions from database.")
-
-            # 2. Insert the current 'open' positions from Excel into the database
-            db_cols = [
-                'ticker', 'symbol', 'sector', 'buy_date', 'sell_date',
-                'buy_price', 'sell_price', 'qty', 'type', 'note', 'strategy',
-                'tradevalue', 'market_value', 'total_pnl', 'pct_pnl', 'tvm', 'pos_age',
-                'account', 'current_price', 'daily_change', 'daily_pnl' # Include all columns
-            ]
-            
-            # Ensure all db_cols are present in open_positions_from_excel, fill with None/0.0 if not
-            for col in db_cols:
-                if col not in open_positions_from_excel.columns:
-                    if col in ["buy_price", "sell_price", "qty", "tradevalue", "market_value", "total_pnl", "pct_pnl", "tvm", "current_price", "daily_change", "daily_pnl"]:
-                        open_positions_from_excel[col] = 0.0
-                    else:
-                        open_positions_from_excel[col] = '' # Default for text columns
-
-            # Reorder columns to match the INSERT statement
-            df_to_insert = open_positions_from_excel[db_cols]
-
-            # Convert DataFrame to list of tuples for executemany
-            data_to_insert = [tuple(row) for row in df_to_insert.values]
-
-            c.executemany(f"""
-                INSERT INTO positions ({', '.join(db_cols)})
-                VALUES ({', '.join(['?'] * len(db_cols))})
-            """, data_to_insert)
-            conn.commit()
-            print(f"load_raw_excel_data_into_db: Inserted {len(data_to_insert)} current open positions from Excel into database.")
+        with db.write() as conn:
+            if mode == "full":
+                summary = _replace_open_positions(conn, df_to_insert)
+            else:
+                summary = _sync_open_positions(conn, df_to_insert)
+            record_source_fingerprint(conn, POSITIONS_EXCEL_FILE, fingerprint)
+            if summary["inserted"] or summary["updated"] or summary["deleted"]:
+                engine.rebuild(conn)
+                # Syncs are the largest producer of change_log entries.
+                compact_change_log(conn)
+        summary["skipped"] = False
+        print(f"load_raw_excel_data_into_db: Sync complete ({mode}): {summary}")
+        return summary
 
     except FileNotFoundError:
         print(f"load_raw_excel_data_into_db: ERROR: {POSITIONS_EXCEL_FILE} not found. Ensure the Excel file exists in the same directory as main.py.")
     except Exception as e:
         print(f"load_raw_excel_data_into_db: CRITICAL ERROR during load_raw_excel_data_into_db: {type(e).__name__}: {e}")
+    return None
 
-def load_dividends_data():
-    """Loads dividend data from the Excel file."""
-    global _dividends_data
-    print(f"load_dividends_data: Attempting to load dividend data from: {DIVIDENDS_EXCEL_FILE}")
-    if not os.path.exists(DIVIDENDS_EXCEL_FILE):
-        print(f"load_dividends_data: WARNING: {DIVIDENDS_EXCEL_FILE} not found. Skipping dividend data load.")
-        _dividends_data = []
-        return
 
-    try:
-        df = pd.read_excel(DIVIDENDS_EXCEL_FILE)
-        print(f"load_dividends_data: Dividend Excel file '{DIVIDENDS_EXCEL_FILE}' read successfully.")
-        print("load_dividends_data: Original Columns (before lowercasing/renaming):", df.columns.tolist())
-
-        # Step 1: Lowercase and replace spaces in all columns
-        df.columns = df.columns.str.lower().str.replace(' ', '_')
-        print("load_dividends_data: Columns after lowercasing and underscore replacement:", df.columns.tolist())
-
-        # Step 2: Define and apply specific renames for consistency with frontend
-        # This map should reflect the exact column names after step 1
-        rename_map = {}
-        if 'date_of_disbursment' in df.columns:
-            rename_map['date_of_disbursment'] = 'date_of_disbur'
-        if 'rs_per_share_' in df.columns:
-            rename_map['rs_per_share_'] = 'rs_per_share'
-
-        if rename_map:
-            df = df.rename(columns=rename_map)
-            print("load_dividends_data: Columns after specific renames:", df.columns.tolist())
-
-        # Step 3: Process numeric columns
-        # Now, 'rs_per_share' should be the target name if it was renamed
-        numeric_cols = ['amount', 'rs_per_share', 'qty']
-        for col in numeric_cols:
-            if col in df.columns:
-                df[col] = df[col].astype(str).str.replace(r'[₹,]', '', regex=True)
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-
-        # Step 4: Process date column (now expecting 'date_of_disbur')
-        if 'date_of_disbur' in df.columns:
-            df['date_of_disbur'] = pd.to_datetime(df['date_of_disbur'], format='%d-%b-%y', errors='coerce').dt.strftime('%Y-%m-%d')
+# --- Excel Sync ---
+# Excel rows are matched to DB 'BUY' rows on this natural key. Repeated keys
+# (the same lot bought twice at the same price on the same day) are told apart
+# by their order of appearance.
+NATURAL_KEY_COLS = ['symbol', 'account', 'buy_date', 'buy_price']
+
+
+def _natural_keys(df):
+    """Returns one hashable key per row: the natural key plus an occurrence ordinal."""
+    keys = pd.DataFrame({
+        'symbol': df['symbol'].fillna('').astype(str),
+        'account': df['account'].fillna('').astype(str),
+        'buy_date': df['buy_date'].fillna('').astype(str),
+        'buy_price': pd.to_numeric(df['buy_price'], errors='coerce').fillna(0.0).round(4),
+    })
+    keys['ordinal'] = keys.groupby(NATURAL_KEY_COLS, sort=False).cumcount()
+    return list(keys.itertuples(index=False, name=None))
+
+
+def _row_hashes(df):
+    """Content hash of every row, used to skip rows that did not change."""
+    # read_excel types a column int64 when every value in it happens to be whole,
+    # so the same row could hash differently between workbooks; hash numbers as floats.
+    numeric = [col for col in df.columns if pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col])]
+    df = df.astype({col: float for col in numeric})
+    return pd.util.hash_pandas_object(df, index=False).map('{:016x}'.format).tolist()
+
+
+def _replace_open_positions(conn, df_to_insert):
+    """Legacy full refresh: delete every 'BUY' row and insert the workbook."""
+    c = conn.cursor()
+    c.execute("SELECT COUNT(*) FROM positions WHERE type = 'BUY'")
+    deleted = c.fetchone()[0]
+    # 1. Delete all existing 'BUY' type positions from the database
+    c.execute("DELETE FROM positions WHERE type = 'BUY'")
+    print("load_raw_excel_data_into_db: Cleared existing 'BUY' type positions from database.")
+
+    # 2. Insert the current 'open' positions from Excel into the database
+    db_cols = list(df_to_insert.columns)
+    data_to_insert = [tuple(row) + (h,) for row, h in zip(df_to_insert.values, _row_hashes(df_to_insert))]
+    c.executemany(f"""
+        INSERT INTO positions ({', '.join(db_cols)}, row_hash)
+        VALUES ({', '.join(['?'] * (len(db_cols) + 1))})
+    """, data_to_insert)
+    print(f"load_raw_excel_data_into_db: Inserted {len(data_to_insert)} current open positions from Excel into database.")
+    return {"inserted": len(data_to_insert), "updated": 0, "deleted": deleted, "unchanged": 0}
+
+
+def _sync_open_positions(conn, df_to_insert):
+    """
+    Diffs the workbook against the DB 'BUY' rows by natural key and content hash,
+    then applies only the inserts, updates and deletes. Runs inside the caller's
+    write transaction, so the whole sync commits or rolls back as one.
+    """
+    c = conn.cursor()
+    c.execute(f"""
+        SELECT id, {', '.join(NATURAL_KEY_COLS)}, row_hash
+        FROM positions
+        WHERE type = 'BUY'
+        ORDER BY id
+    """)
+    existing = pd.DataFrame(c.fetchall(), columns=['id'] + NATURAL_KEY_COLS + ['row_hash'])
+    existing_by_key = {
+        key: (row_id, row_hash)
+        for key, row_id, row_hash in zip(_natural_keys(existing), existing['id'], existing['row_hash'])
+    }
+
+    db_cols = list(df_to_insert.columns)
+    inserts, updates = [], []
+    unchanged = 0
+    for key, row, row_hash in zip(_natural_keys(df_to_insert), df_to_insert.values, _row_hashes(df_to_insert)):
+        match = existing_by_key.pop(key, None)
+        if match is None:
+            inserts.append(tuple(row) + (row_hash,))
+        elif match[1] != row_hash:
+            updates.append(tuple(row) + (row_hash, int(match[0])))
+        else:
+            unchanged += 1
+    # Whatever is left in the DB no longer exists in the workbook.
+    deletes = [(int(row_id),) for row_id, _ in existing_by_key.values()]
+
+    if deletes:
+        c.executemany("DELETE FROM positions WHERE id = ?", deletes)
+    if updates:
+        c.executemany(f"""
+            UPDATE positions
+            SET {', '.join(f'{col} = ?' for col in db_cols)}, row_hash = ?
+            WHERE id = ?
+        """, updates)
+    if inserts:
+        c.executemany(f"""
+            INSERT INTO positions ({', '.join(db_cols)}, row_hash)
+            VALUES ({', '.join(['?'] * (len(db_cols) + 1))})
+        """, inserts)
+
+    return {"inserted": len(inserts), "updated": len(updates), "deleted": len(deletes), "unchanged": unchanged}
+
+
+def _parse_dividends_workbook(path):
+    """Parses and cleans the dividends workbook."""
+    df = pd.read_excel(path)
+    print(f"load_dividends_data: Dividend Excel file '{path}' read successfully.")
+    print("load_dividends_data: Original Columns (before lowercasing/renaming):", df.columns.tolist())
+
+    # Step 1: Lowercase and replace spaces in all columns
+    df.columns = df.columns.str.lower().str.replace(' ', '_')
+    print("load_dividends_data: Columns after lowercasing and underscore replacement:", df.columns.tolist())
+
+    # Step 2: Define and apply specific renames for consistency with frontend
+    # This map should reflect the exact column names after step 1
+    rename_map = {}
+    if 'date_of_disbursment' in df.columns:
+        rename_map['date_of_disbursment'] = 'date_of_disbur'
+    if 'rs_per_share_' in df.columns:
+        rename_map['rs_per_share_'] = 'rs_per_share'
+
+    if rename_map:
+        df = df.rename(columns=rename_map)
+        print("load_dividends_data: Columns after specific renames:", df.columns.tolist())
+
+    # Step 3: Process numeric columns
+    # Now, 'rs_per_share' should be the target name if it was renamed
+    numeric_cols = ['amount', 'rs_per_share', 'qty']
+    for col in numeric_cols:
+        if col in df.columns:
+            df[col] = df[col].astype(str).str.replace(r'[₹,]', '', regex=True)
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    # Step 4: Process date column (now expecting 'date_of_disbur')
+    if 'date_of_disbur' in df.columns:
+        df['date_of_disbur'] = pd.to_datetime(df['date_of_disbur'], format='%d-%b-%y', errors='coerce').dt.strftime('%Y-%m-%d')
+    else:
+        df['date_of_disbur'] = None # Ensure the column exists even if not in original data
+
+    # Step 5: Process string columns
+    for col in ['ticker', 'sector']:
+        if col in df.columns:
+            df[col] = df[col].fillna('').astype(str).str.strip()
         else:
-            df['date_of_disbur'] = None # Ensure the column exists even if not in original data
+            df[col] = ''
+
+    # Step 6: Final NaN handling for all columns to ensure JSON compliance
+    for col in df.columns:
+        if pd.api.types.is_float_dtype(df[col]):
+            df[col] = df[col].fillna(0.0)
+        elif pd.api.types.is_object_dtype(df[col]):
+            df[col] = df[col].fillna('')
+    return df
+
+
+# Dividend rows have no natural key, so the import matches them on their content
+# hash: rows whose hash is new are inserted, rows whose hash disappeared from
+# the workbook are deleted, and a changed row is one of each.
+DIVIDEND_COLUMNS = ['ticker', 'sector', 'date_of_disbur', 'qty', 'rs_per_share', 'amount']
+
+
+def _dividend_rows(df):
+    """Yields (row_hash, insert params) for every workbook row, in workbook order."""
+    df = df.copy()
+    for col, default in (('qty', None), ('rs_per_share', None), ('amount', 0.0), ('date_of_disbur', '')):
+        if col not in df.columns:
+            df[col] = default
+    df['date_of_disbur'] = df['date_of_disbur'].fillna('') # unparseable dates sort last, as before
+    df = df.astype(object).where(df.notna(), None) # NaN -> NULL; numpy scalars -> Python
+    extra_cols = [col for col in df.columns if col not in DIVIDEND_COLUMNS]
+    extras = (
+        [json.dumps(extra, default=str) for extra in df[extra_cols].to_dict(orient='records')]
+        if extra_cols else [None] * len(df)
+    )
+    known = df[DIVIDEND_COLUMNS]
+    for row_hash, values, extra in zip(_row_hashes(df), known.itertuples(index=False, name=None), extras):
+        yield row_hash, values + (extra, row_hash)
+
+
+def _sync_dividends(conn, df):
+    """Applies the workbook to the dividends table. Runs inside the caller's write transaction."""
+    c = conn.cursor()
+    c.execute("SELECT id, row_hash FROM dividends ORDER BY id")
+    existing = defaultdict(list)
+    for row_id, row_hash in c.fetchall():
+        existing[row_hash].append(row_id)
+
+    inserts = []
+    unchanged = 0
+    for row_hash, params in _dividend_rows(df):
+        if existing.get(row_hash):
+            existing[row_hash].pop()
+            unchanged += 1
+        else:
+            inserts.append(params)
+    deletes = [(row_id,) for ids in existing.values() for row_id in ids]
 
-        # Step 5: Process string columns
-        for col in ['ticker', 'sector']:
-            if col in df.columns:
-                df[col] = df[col].fillna('').astype(str).str.strip()
-            else:
-                df[col] = ''
+    if deletes:
+        c.executemany("DELETE FROM dividends WHERE id = ?", deletes)
+    if inserts:
+        c.executemany(f"""
+            INSERT INTO dividends ({', '.join(DIVIDEND_COLUMNS)}, extra, row_hash)
+            VALUES ({', '.join(['?'] * (len(DIVIDEND_COLUMNS) + 2))})
+        """, inserts)
+    return {"inserted": len(inserts), "deleted": len(deletes), "unchanged": unchanged}
 
-        # Step 6: Final NaN handling for all columns to ensure JSON compliance
-        for col in df.columns:
-            if pd.api.types.is_float_dtype(df[col]):
-                df[col] = df[col].fillna(0.0)
-            elif pd.api.types.is_object_dtype(df[col]):
-                df[col] = df[col].fillna('')
 
-        _dividends_data = df.to_dict(orient='records')
-        print(f"load_dividends_data: Dividend data loaded into memory: {len(_dividends_data)} records.")
+def load_dividends_data(force=False):
+    """
+    Imports the dividends workbook into the dividends table, applying only the
+    rows that changed. An unchanged workbook is skipped unless force=True.
+    Returns the diff counts, or None if the workbook could not be loaded; the
+    table keeps its previous contents in that case.
+    """
+    print(f"load_dividends_data: Attempting to load dividend data from: {DIVIDENDS_EXCEL_FILE}")
+    if not os.path.exists(DIVIDENDS_EXCEL_FILE):
+        print(f"load_dividends_data: WARNING: {DIVIDENDS_EXCEL_FILE} not found. Skipping dividend data load.")
+        return None
+
+    try:
+        fingerprint, unchanged = source_fingerprint(DIVIDENDS_EXCEL_FILE)
+        if unchanged and not force:
+            with db.read() as conn:
+                imported = conn.execute("SELECT EXISTS (SELECT 1 FROM dividends)").fetchone()[0]
+            # A fingerprint recorded before the table existed must not skip the first import.
+            if imported:
+                print("load_dividends_data: Workbook unchanged since last load. Skipping parse.")
+                return {"inserted": 0, "deleted": 0, "unchanged": 0, "skipped": True}
+
+        df = read_excel_cached(DIVIDENDS_EXCEL_FILE, fingerprint, _parse_dividends_workbook)
+        try:
+            with db.write() as conn:
+                summary = _sync_dividends(conn, df)
+                record_source_fingerprint(conn, DIVIDENDS_EXCEL_FILE, fingerprint)
+                if summary["inserted"] or summary["deleted"]:
+                    # Swapped in before the commit bumps data_version, so a
+                    # response carrying the new ETag always has the new rollups.
+                    dividend_rollups.replace(compute_dividend_rollups(conn))
+        except Exception:
+            dividend_rollups.invalidate() # may hold rollups of the rolled-back import
+            raise
+        summary["skipped"] = False
+        print(f"load_dividends_data: Dividend import complete: {summary}")
+        return summary
 
     except FileNotFoundError:
         print(f"load_dividends_data: CRITICAL ERROR: {DIVIDENDS_EXCEL_FILE} not found. Ensure the Excel file exists.")
-        _dividends_data = []
     except Exception as e:
         print(f"load_dividends_data: CRITICAL ERROR during load_dividends_data: {type(e).__name__}: {e}")
-        _dividends_data = []
+    return None
+
+
+# --- Dividend Rollups ---
+# The dividends table only changes through load_dividends_data(), so its
+# aggregates are computed once per import (one pandas groupby per rollup) and
+# served from memory. The import rebuilds them inside its write transaction;
+# nothing else writes dividends.
+DIVIDEND_ROLLUP_KEYS = {
+    "ticker": ["ticker"],
+    "sector": ["sector"],
+    "year": ["year"],
+    "month": ["month"],
+    "ticker_year": ["ticker", "year"],
+}
+
+
+def compute_dividend_rollups(conn):
+    """Returns {"records", "total", <rollup name>: [{<keys>, total_amount, count}]}, each sorted by key."""
+    df = pd.read_sql_query("SELECT ticker, sector, date_of_disbur, amount FROM dividends", conn)
+    dates = pd.to_datetime(df["date_of_disbur"], format="%Y-%m-%d", errors="coerce")
+    df["year"] = dates.dt.year
+    df["month"] = dates.dt.strftime("%Y-%m")
+    df["amount"] = df["amount"].fillna(0.0)
+
+    rollups = {"records": len(df), "total": float(df["amount"].sum())}
+    for name, keys in DIVIDEND_ROLLUP_KEYS.items():
+        grouped = (
+            df.dropna(subset=keys) # undated rows have no year or month
+            .groupby(keys, sort=True)["amount"]
+            .agg(total_amount="sum", count="size")
+            .reset_index()
+        )
+        if "year" in keys:
+            grouped["year"] = grouped["year"].astype(int)
+        rollups[name] = grouped.to_dict(orient="records")
+    return rollups
+
+
+class DividendRollupCache:
+    """The dividend rollups, replaced by each import and built on first use otherwise."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rollups = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self):
+        with self._lock:
+            if self._rollups is not None:
+                self.hits += 1
+                return self._rollups
+            self.misses += 1
+            # Built under the lock so concurrent misses share one build.
+            with db.read() as conn:
+                self._rollups = compute_dividend_rollups(conn)
+            return self._rollups
+
+    def replace(self, rollups):
+        with self._lock:
+            self._rollups = rollups
+
+    def invalidate(self):
+        with self._lock:
+            self._rollups = None
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "cached": self._rollups is not None}
+
+
+dividend_rollups = DividendRollupCache()
+
+
+# --- In-Memory Portfolio Engine ---
+# Open 'BUY' lots are mirrored in memory, one FIFO deque per symbol, so the
+# simulate and sell pre-checks never touch SQLite. SQLite stays the source of
+# truth: every write path updates the engine inside its write transaction (so
+# engine updates are serialized exactly like the DB writes), and the engine is
+# rebuilt from the DB at startup, after each Excel sync, and whenever another
+# process has committed since it was last in step (see catch_up).
+OPEN_LOTS_SQL = """
+    SELECT id, symbol, buy_date, buy_price, qty
+    FROM positions
+    WHERE sell_date IS NULL AND qty > 0 AND type = 'BUY'
+"""
+
+
+class Lot:
+    """One open 'BUY' lot."""
+    __slots__ = ('id', 'buy_date', 'buy_price', 'qty')
+
+    def __init__(self, id, buy_date, buy_price, qty):
+        self.id = id
+        self.buy_date = buy_date
+        self.buy_price = buy_price or 0.0
+        self.qty = qty
+
+    def fifo_key(self):
+        # Same order as the SQL FIFO: buy_date ASC (NULLs first), then id.
+        return (self.buy_date is not None, self.buy_date or '', self.id)
+
+
+class SymbolBook:
+    """The open lots of one symbol in FIFO order, with running totals."""
+    __slots__ = ('lots', 'qty', 'cost')
+
+    def __init__(self):
+        self.lots = deque()
+        self.qty = 0
+        self.cost = 0.0
+
+    def add(self, lot):
+        key = lot.fifo_key()
+        if not self.lots or self.lots[-1].fifo_key() <= key:
+            self.lots.append(lot) # the usual case: the newest lot
+        else:
+            index = len(self.lots) - 1
+            while index > 0 and self.lots[index - 1].fifo_key() > key:
+                index -= 1
+            self.lots.insert(index, lot)
+        self.qty += lot.qty
+        self.cost += lot.qty * lot.buy_price
+
+    def consume(self, qty):
+        """Removes qty units from the oldest lots first; returns the ids of closed lots."""
+        closed = []
+        while qty > 0 and self.lots:
+            lot = self.lots[0]
+            taken = min(qty, lot.qty)
+            lot.qty -= taken
+            self.qty -= taken
+            self.cost -= taken * lot.buy_price
+            qty -= taken
+            if lot.qty == 0:
+                closed.append(self.lots.popleft().id)
+        return closed
+
+
+class PortfolioEngine:
+    """Per-symbol FIFO books of open 'BUY' lots, kept in step with positions."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._books = {}
+        self._lot_symbols = {} # lot id -> symbol, for write-through by id
+        self.rebuilt_at = None
+        self.version = None # data version the books are in step with
+
+    def rebuild(self, conn):
+        """Reloads every open lot from the DB."""
+        started = time.perf_counter()
+        # Read first: a commit landing before the lots are read only makes the
+        # books look older than they are, which costs one redundant rebuild.
+        version = data_version.read(conn)
+        c = conn.cursor()
+        c.execute(OPEN_LOTS_SQL + " ORDER BY symbol, buy_date, id")
+        books, lot_symbols = {}, {}
+        for lot_id, symbol, buy_date, buy_price, qty in c.fetchall():
+            book = books.get(symbol)
+            if book is None:
+                book = books[symbol] = SymbolBook()
+            book.lots.append(Lot(lot_id, buy_date, buy_price, qty))
+            book.qty += qty
+            book.cost += qty * (buy_price or 0.0)
+            lot_symbols[lot_id] = symbol
+        with self._lock:
+            self._books, self._lot_symbols = books, lot_symbols
+            self.version = version
+            self.rebuilt_at = datetime.now().isoformat(timespec='seconds')
+        print(f"PortfolioEngine.rebuild: Loaded {len(lot_symbols)} open lots across {len(books)} symbols "
+              f"in {(time.perf_counter() - started) * 1000:.1f} ms.")
+
+    def catch_up(self, conn):
+        """Rebuilds the books if the database has moved past their version. Runs under the write lock."""
+        if self.version != data_version.read(conn):
+            self.rebuild(conn)
+
+    def ensure_current(self):
+        """
+        Catches up with commits made by other processes before the books answer
+        a read. The rebuild goes through an empty write transaction (see
+        _begin_write) so it cannot interleave with a write updating the books.
+        """
+        if self.version != data_version.refresh():
+            with db.write():
+                pass
+
+    def totals(self, symbol):
+        """Returns (qty, cost) of the symbol's open lots."""
+        with self._lock:
+            book = self._books.get(symbol)
+            return (book.qty, book.cost) if book else (0, 0.0)
+
+    def add_lot(self, symbol, lot_id, buy_date, buy_price, qty):
+        with self._lock:
+            book = self._books.get(symbol)
+            if book is None:
+                book = self._books[symbol] = SymbolBook()
+            book.add(Lot(lot_id, buy_date, buy_price, qty))
+            self._lot_symbols[lot_id] = symbol
+
+    def consume(self, symbol, qty):
+        """Mirrors a FIFO sell of qty units."""
+        with self._lock:
+            book = self._books.get(symbol)
+            if book is None:
+                return
+            for lot_id in book.consume(qty):
+                del self._lot_symbols[lot_id]
+            if not book.lots:
+                del self._books[symbol]
+
+    def refresh_lot(self, conn, lot_id):
+        """Re-reads one lot from the DB after an arbitrary update."""
+        with self._lock:
+            old_symbol = self._lot_symbols.pop(lot_id, None)
+            if old_symbol is not None:
+                self._remove_lot(old_symbol, lot_id)
+            c = conn.cursor()
+            c.execute(OPEN_LOTS_SQL + " AND id = ?", (lot_id,))
+            row = c.fetchone()
+            if row:
+                self.add_lot(row[1], row[0], row[2], row[3], row[4])
+
+    def refresh_symbol(self, conn, symbol):
+        """Re-reads every open lot of one symbol, e.g. after a failed write."""
+        with self._lock:
+            book = self._books.pop(symbol, None)
+            if book:
+                for lot in book.lots:
+                    self._lot_symbols.pop(lot.id, None)
+            c = conn.cursor()
+            c.execute(OPEN_LOTS_SQL + " AND symbol = ?", (symbol,))
+            for lot_id, symbol, buy_date, buy_price, qty in c.fetchall():
+                self.add_lot(symbol, lot_id, buy_date, buy_price, qty)
+
+    def load_lots_after(self, conn, last_id):
+        """Adds the open lots inserted with ids above last_id, e.g. by a bulk import."""
+        c = conn.cursor()
+        c.execute(OPEN_LOTS_SQL + " AND id > ? ORDER BY id", (last_id,))
+        rows = c.fetchall()
+        with self._lock:
+            for lot_id, symbol, buy_date, buy_price, qty in rows:
+                book = self._books.get(symbol)
+                if book is None:
+                    book = self._books[symbol] = SymbolBook()
+                book.add(Lot(lot_id, buy_date, buy_price, qty))
+                self._lot_symbols[lot_id] = symbol
+
+    def _remove_lot(self, symbol, lot_id):
+        book = self._books.get(symbol)
+        if book is None:
+            return
+        for lot in book.lots:
+            if lot.id == lot_id:
+                book.lots.remove(lot)
+                book.qty -= lot.qty
+                book.cost -= lot.qty * lot.buy_price
+                break
+        if not book.lots:
+            del self._books[symbol]
+
+    def verify(self, conn):
+        """
+        Compares the engine with the open lots in the DB and returns one
+        {"symbol", "engine", "db"} entry per symbol whose FIFO lots differ.
+        """
+        c = conn.cursor()
+        c.execute(OPEN_LOTS_SQL + " ORDER BY symbol, buy_date, id")
+        expected = defaultdict(list)
+        for lot_id, symbol, _, _, qty in c.fetchall():
+            expected[symbol].append((lot_id, qty))
+        with self._lock:
+            actual = {symbol: [(lot.id, lot.qty) for lot in book.lots] for symbol, book in self._books.items()}
+        return [
+            {"symbol": symbol, "engine": actual.get(symbol), "db": expected.get(symbol)}
+            for symbol in sorted(expected.keys() | actual.keys(), key=lambda s: s or '')
+            if actual.get(symbol) != expected.get(symbol)
+        ]
+
+    def stats(self):
+        with self._lock:
+            return {"symbols": len(self._books), "lots": len(self._lot_symbols), "rebuilt_at": self.rebuilt_at}
+
+
+engine = PortfolioEngine()
 
 
 # --- Initial Load ---
 load_raw_excel_data_into_db()
 load_dividends_data()
+with db.read() as conn:
+    engine.rebuild(conn)
+with db.write() as conn:
+    compact_change_log(conn)
+
+
+# --- Excel File Watcher ---
+# Opt-in (EXCEL_WATCH=1). Polls the workbooks and reloads once a change has
+# settled: OneDrive rewrites a file in several steps while syncing, so a reload
+# only fires after mtime/size have stayed the same for EXCEL_WATCH_DEBOUNCE seconds.
+EXCEL_WATCH_ENABLED = os.environ.get("EXCEL_WATCH", "0") == "1"
+EXCEL_WATCH_INTERVAL = 2.0
+EXCEL_WATCH_DEBOUNCE = 5.0
+
+
+class ExcelWatcher(threading.Thread):
+    """Background thread that reloads Excel sources after they change on disk."""
+
+    def __init__(self, sources, interval=EXCEL_WATCH_INTERVAL, debounce=EXCEL_WATCH_DEBOUNCE):
+        super().__init__(name="excel-watcher", daemon=True)
+        self.sources = sources # [(path_getter, loader)]; getters pick up reassigned paths
+        self.interval = interval
+        self.debounce = debounce
+        self._stop_event = threading.Event()
+        self._state = {} # path -> {"stat": (mtime_ns, size), "changed_at": float, "pending": bool}
+
+    def _stat(self, path):
+        try:
+            st = os.stat(path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None # Missing or locked mid-sync; treat as still changing
+
+    def poll(self):
+        now = time.monotonic()
+        for get_path, loader in self.sources:
+            path = get_path()
+            current = self._stat(path)
+            state = self._state.get(path)
+            if state is None:
+                self._state[path] = {"stat": current, "changed_at": now, "pending": False}
+                continue
+            if current != state["stat"]:
+                state.update(stat=current, changed_at=now, pending=True)
+            elif state["pending"] and current is not None and now - state["changed_at"] >= self.debounce:
+                state["pending"] = False
+                print(f"ExcelWatcher: {path} settled after change. Reloading.")
+                # Same single-thread executor as the reload endpoints, so reloads never overlap.
+                _excel_executor.submit(loader)
+
+    def run(self):
+        print(f"ExcelWatcher: Watching {len(self.sources)} Excel sources every {self.interval}s.")
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"ExcelWatcher: ERROR while polling: {type(e).__name__}: {e}")
+
+    def stop(self):
+        self._stop_event.set()
+
+
+_excel_watcher = None
+
+
+def start_excel_watcher():
+    global _excel_watcher
+    if EXCEL_WATCH_ENABLED and _excel_watcher is None:
+        _excel_watcher = ExcelWatcher([
+            (lambda: POSITIONS_EXCEL_FILE, load_raw_excel_data_into_db),
+            (lambda: DIVIDENDS_EXCEL_FILE, load_dividends_data),
+        ])
+        _excel_watcher.start()
+
+
+def stop_excel_watcher():
+    global _excel_watcher
+    if _excel_watcher is not None:
+        _excel_watcher.stop()
+        _excel_watcher = None
 
 
 # --- Schema ---
@@ -305,13 +1807,24 @@ class PortfolioSnapshotRequest(BaseModel):
     net_cash_flow_today: float = 0.0
 
 
+class PriceTick(BaseModel):
+    symbol: str
+    price: float = Field(..., gt=0)
+    prev_close: Optional[float] = Field(None, gt=0)
+
+    @validator("symbol")
+    def uppercase_symbol(cls, v):
+        return v.strip().upper()
+
+
 # --- Endpoints ---
 
 @app.post("/positions")
-async def add_position(trade: TradeInput):
+@run_in_db_executor
+def add_position(trade: TradeInput):
     """Adds a new buy position to the database."""
     try:
-        with sqlite3.connect(DB_NAME) as conn:
+        with db.write() as conn:
             c = conn.cursor()
             c.execute("""
                 INSERT INTO positions (
@@ -344,17 +1857,18 @@ async def add_position(trade: TradeInput):
                 '',  # pos_age
                 ''   # account
             ))
-            conn.commit()
+            engine.refresh_lot(conn, c.lastrowid)
         return {"status": "success", "id": c.lastrowid}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.put("/positions/{position_id}")
-async def update_position(position_id: int, trade: TradeInput):
+@run_in_db_executor
+def update_position(position_id: int, trade: TradeInput):
     """Updates an existing position in the database."""
     try:
-        with sqlite3.connect(DB_NAME) as conn:
+        with db.write() as conn:
             c = conn.cursor()
             c.execute("""
                 UPDATE positions
@@ -375,9 +1889,9 @@ async def update_position(position_id: int, trade: TradeInput):
                 trade.strategy,
                 position_id
             ))
-            conn.commit()
             if c.rowcount == 0:
                 raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Position not found")
+            engine.refresh_lot(conn, position_id)
         return {"status": "updated"}
     except HTTPException as he:
         raise he
@@ -385,149 +1899,202 @@ async def update_position(position_id: int, trade: TradeInput):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# --- FIFO Sells ---
+def _precheck_sells(sell_records):
+    """
+    Rejects sells that exceed the open quantity, using the in-memory books so a
+    bad request never takes the write lock. Quantities are summed per symbol.
+    """
+    requested = defaultdict(int)
+    for record in sell_records:
+        requested[record.symbol] += record.qty
+    engine.ensure_current()
+    for symbol, qty in requested.items():
+        available_qty, _ = engine.totals(symbol)
+        if available_qty == 0:
+            raise HTTPException(status_code=404, detail=f"No open positions found for symbol {symbol}.")
+        if qty > available_qty:
+            raise HTTPException(status_code=400, detail=f"Cannot sell {qty} units. Only {available_qty} units available for {symbol}.")
+
+
+def execute_fifo_sells(conn, sell_records):
+    """
+    Applies the sells in order inside the caller's write transaction.
+    Every FIFO allocation is planned in memory first: one SELECT loads the open
+    lots of all symbols involved, then the lot updates and the realised 'SELL'
+    rows are written with executemany. Returns per-symbol results:
+    {symbol: {"qty_sold", "cash_generated", "realised_pnl"}}.
+    """
+    c = conn.cursor()
+    symbols = sorted({record.symbol for record in sell_records})
+    c.execute(f"""
+        SELECT id, ticker, symbol, sector, buy_date, buy_price, qty
+        FROM positions
+        WHERE symbol IN ({', '.join(['?'] * len(symbols))})
+          AND sell_date IS NULL AND qty > 0 AND type = 'BUY'
+        ORDER BY symbol, buy_date ASC, id ASC
+    """, symbols)
+    columns = [col[0] for col in c.description]
+    lots_by_symbol = defaultdict(list)
+    for row in c.fetchall():
+        lot = dict(zip(columns, row))
+        lots_by_symbol[lot['symbol']].append(lot)
+
+    touched_lots = {} # lot id -> lot, for every lot a sell drew from
+    closed_lots = {} # lot id -> (sell_date, sell_price)
+    realised_rows = []
+    results = {}
+    for record in sell_records:
+        open_lots = [lot for lot in lots_by_symbol[record.symbol] if lot['qty'] > 0]
+        if not open_lots:
+            raise HTTPException(status_code=404, detail=f"No open positions found for symbol {record.symbol}.")
+        available_qty = sum(lot['qty'] for lot in open_lots)
+        if record.qty > available_qty:
+            raise HTTPException(status_code=400, detail=f"Cannot sell {record.qty} units. Only {available_qty} units available for {record.symbol}.")
+
+        result = results.setdefault(record.symbol, {"qty_sold": 0, "cash_generated": 0.0, "realised_pnl": 0.0})
+        remaining_qty = record.qty
+        for lot in open_lots:
+            if remaining_qty <= 0:
+                break # All requested quantity has been sold
+
+            qty_from_this_lot = min(remaining_qty, lot['qty'])
+
+            # P&L for the portion sold from this lot
+            cost = lot['buy_price'] * qty_from_this_lot
+            revenue = record.sell_price * qty_from_this_lot
+            pnl = revenue - cost
+            pct_pnl = (pnl / cost) * 100 if cost else 0.0
+
+            lot['qty'] -= qty_from_this_lot
+            touched_lots[lot['id']] = lot
+            if lot['qty'] == 0:
+                closed_lots[lot['id']] = (record.sell_date.isoformat(), round(record.sell_price, 2))
+
+            # Realised (sold) portion; qty is 0 for realised trades
+            realised_rows.append((
+                lot['ticker'],
+                lot['symbol'],
+                lot['sector'],
+                lot['buy_date'], # Original buy date of the lot
+                record.sell_date.isoformat(),
+                round(lot['buy_price'], 2), # Buy price of the lot
+                round(record.sell_price, 2),
+                0,
+                "SELL",
+                record.note or f"Sold {qty_from_this_lot} units from {lot['symbol']} (Lot from {lot['buy_date']})",
+                round(cost, 2),
+                round(revenue, 2),
+                round(pnl, 2),
+                round(pct_pnl, 2)
+            ))
+
+            result["qty_sold"] += qty_from_this_lot
+            result["cash_generated"] += revenue
+            result["realised_pnl"] += pnl
+            remaining_qty -= qty_from_this_lot
+
+    c.executemany("""
+        UPDATE positions
+        SET qty = 0, sell_date = ?, sell_price = ?, type = 'CLOSED_FULL_SELL'
+        WHERE id = ?
+    """, [(sell_date, sell_price, lot_id) for lot_id, (sell_date, sell_price) in closed_lots.items()])
+    c.executemany("UPDATE positions SET qty = ? WHERE id = ?", [
+        (lot['qty'], lot_id) for lot_id, lot in touched_lots.items() if lot_id not in closed_lots
+    ])
+    c.executemany("""
+        INSERT INTO positions (
+            ticker, symbol, sector, buy_date, sell_date,
+            buy_price, sell_price, qty, type, note,
+            tradevalue, market_value, total_pnl, pct_pnl
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, realised_rows)
+
+    for record in sell_records:
+        engine.consume(record.symbol, record.qty)
+    return results
+
+
+def _refresh_engine_symbols(symbols):
+    """Re-reads the engine books of symbols whose write transaction rolled back."""
+    with db.read() as conn:
+        for symbol in symbols:
+            engine.refresh_symbol(conn, symbol)
+
+
 @app.post("/sell_trade")
-async def record_sell_trade(sell_record: SellTradeRecord):
+@run_in_db_executor
+def record_sell_trade(sell_record: SellTradeRecord):
     """
     Records a sell trade, handling partial sells using FIFO logic.
     Updates existing open positions and inserts new 'SELL' records for realized portions.
-    This version uses a more robust method to convert fetched rows to dictionaries.
     """
+    _precheck_sells([sell_record])
     try:
-        with sqlite3.connect(DB_NAME) as conn:
-            c = conn.cursor()
-            
-            qty_to_sell = sell_record.qty
-            total_cash_generated = 0.0
-            total_pnl_realized = 0.0
-            remaining_qty_to_sell_overall = qty_to_sell # Track how much still needs to be sold
-
-            # 1. Find all existing open positions for the symbol, ordered by buy_date (FIFO)
-            c.execute("""
-                SELECT id, ticker, symbol, sector, buy_date, buy_price, qty
-                FROM positions
-                WHERE symbol = ? AND sell_date IS NULL AND qty > 0 AND type = 'BUY'
-                ORDER BY buy_date ASC
-            """, (sell_record.symbol,))
-
-            # CRITICAL FIX: Manually create a list of dictionaries from the fetched rows
-            # This is more robust and prevents the "cannot convert dictionary update" error
-            rows = c.fetchall()
-            columns = [col[0] for col in c.description]
-            open_positions = [dict(zip(columns, row)) for row in rows]
-            
-            if not open_positions:
-                raise HTTPException(status_code=404, detail=f"No open positions found for symbol {sell_record.symbol}.")
-
-            current_total_available_qty = sum(pos['qty'] for pos in open_positions)
-            if qty_to_sell > current_total_available_qty:
-                raise HTTPException(status_code=400, detail=f"Cannot sell {qty_to_sell} units. Only {current_total_available_qty} units available for {sell_record.symbol}.")
-
-
-            for pos in open_positions:
-                if remaining_qty_to_sell_overall <= 0:
-                    break # All requested quantity has been sold
-
-                pos_id = pos['id']
-                pos_ticker = pos['ticker']
-                pos_symbol = pos['symbol']
-                pos_sector = pos['sector']
-                pos_buy_date = pos['buy_date']
-                pos_buy_price = pos['buy_price']
-                pos_current_qty = pos['qty']
-
-                qty_from_this_lot = min(remaining_qty_to_sell_overall, pos_current_qty)
-
-                # Calculate P&L for the portion sold from this lot
-                cost_of_sold_qty_from_this_lot = pos_buy_price * qty_from_this_lot
-                revenue_from_sale_from_this_lot = sell_record.sell_price * qty_from_this_lot
-                pnl_for_sold_qty_from_this_lot = revenue_from_sale_from_this_lot - cost_of_sold_qty_from_this_lot
-                pct_pnl_for_sold_qty_from_this_lot = (pnl_for_sold_qty_from_this_lot / cost_of_sold_qty_from_this_lot) * 100 if cost_of_sold_qty_from_this_lot else 0.0
-
-                total_cash_generated += revenue_from_sale_from_this_lot
-                total_pnl_realized += pnl_for_sold_qty_from_this_lot
-
-                new_qty_for_this_lot = pos_current_qty - qty_from_this_lot
-
-                # Update the original position
-                if new_qty_for_this_lot == 0:
-                    c.execute("""
-                        UPDATE positions
-                        SET qty = ?, sell_date = ?, sell_price = ?, type = 'CLOSED_FULL_SELL'
-                        WHERE id = ?
-                    """, (
-                        0, # Qty is now 0
-                        sell_record.sell_date.isoformat(),
-                        round(sell_record.sell_price, 2),
-                        pos_id
-                    ))
-                else:
-                    c.execute("""
-                        UPDATE positions
-                        SET qty = ?
-                        WHERE id = ?
-                    """, (new_qty_for_this_lot, pos_id))
-
-                # Insert a new record for the realized (sold) portion
-                c.execute("""
-                    INSERT INTO positions (
-                        ticker, symbol, sector, buy_date, sell_date,
-                        buy_price, sell_price, qty, type, note,
-                        tradevalue, market_value, total_pnl, pct_pnl
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    pos_ticker,
-                    pos_symbol,
-                    pos_sector,
-                    pos_buy_date, # Original buy date of the lot
-                    sell_record.sell_date.isoformat(),
-                    round(pos_buy_price, 2), # Buy price of the lot
-                    round(sell_record.sell_price, 2),
-                    0, # Quantity for realized trade is 0
-                    "SELL", # Mark as a SELL trade
-                    sell_record.note or f"Sold {qty_from_this_lot} units from {pos_symbol} (Lot from {pos_buy_date})",
-                    round(cost_of_sold_qty_from_this_lot, 2),
-                    round(revenue_from_sale_from_this_lot, 2),
-                    round(pnl_for_sold_qty_from_this_lot, 2),
-                    round(pct_pnl_for_sold_qty_from_this_lot, 2)
-                ))
-
-                remaining_qty_to_sell_overall -= qty_from_this_lot
-
-            conn.commit()
+        with db.write() as conn:
+            result = execute_fifo_sells(conn, [sell_record])[sell_record.symbol]
 
         return {
             "status": "sell trade recorded successfully",
-            "cash_generated": round(total_cash_generated, 2),
-            "remaining_qty_overall_for_symbol": remaining_qty_to_sell_overall # Should be 0 if all requested qty was sold
+            "cash_generated": round(result["cash_generated"], 2),
+            "remaining_qty_overall_for_symbol": sell_record.qty - result["qty_sold"] # Should be 0 if all requested qty was sold
         }
     except HTTPException as he:
         raise he
     except Exception as e:
         print(f"Error during sell trade: {e}")
+        _refresh_engine_symbols([sell_record.symbol])
         raise HTTPException(status_code=500, detail=f"Failed to record sell trade: {e}")
 
 
+@app.post("/sell_trades")
+@run_in_db_executor
+def record_sell_trades(sell_records: List[SellTradeRecord]):
+    """
+    Records many FIFO sells in one transaction, in request order. Any error
+    rolls back the whole batch. Returns realised P&L and cash per symbol.
+    """
+    if not sell_records:
+        raise HTTPException(status_code=400, detail="At least one sell trade is required.")
+    _precheck_sells(sell_records)
+    try:
+        with db.write() as conn:
+            results = execute_fifo_sells(conn, sell_records)
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        print(f"record_sell_trades: Error during batch sell: {e}")
+        _refresh_engine_symbols({record.symbol for record in sell_records})
+        raise HTTPException(status_code=500, detail=f"Failed to record sell trades: {e}")
+
+    print(f"record_sell_trades: Recorded {len(sell_records)} sells across {len(results)} symbols.")
+    return {
+        "status": "sell trades recorded successfully",
+        "trades": len(sell_records),
+        "cash_generated": round(sum(r["cash_generated"] for r in results.values()), 2),
+        "realised_pnl": round(sum(r["realised_pnl"] for r in results.values()), 2),
+        "symbols": {
+            symbol: {
+                "qty_sold": r["qty_sold"],
+                "cash_generated": round(r["cash_generated"], 2),
+                "realised_pnl": round(r["realised_pnl"], 2),
+            }
+            for symbol, r in results.items()
+        },
+    }
+
+
 @app.post("/simulate")
-async def simulate_trade(trade: TradeInput):
+@run_in_db_executor
+def simulate_trade(trade: TradeInput):
     """Simulates a buy trade to calculate average price and total quantity."""
     try:
         if not trade.symbol:
             raise HTTPException(status_code=400, detail="Symbol is required for simulation")
 
-        existing_qty = 0
-        existing_cost = 0.0
-
-        with sqlite3.connect(DB_NAME) as conn:
-            conn.row_factory = dict_factory
-            c = conn.cursor()
-            # Fetch only open 'BUY' positions for simulation
-            c.execute("""
-                SELECT qty, buy_price FROM positions
-                WHERE symbol = ? AND sell_date IS NULL AND qty > 0 AND type = 'BUY'
-            """, (trade.symbol,))
-            for row in c.fetchall():
-                existing_qty += row["qty"]
-                existing_cost += row["qty"] * row["buy_price"]
+        # Open 'BUY' totals for the symbol, answered from the in-memory books
+        engine.ensure_current()
+        existing_qty, existing_cost = engine.totals(trade.symbol)
 
         new_qty = trade.qty
         new_cost = trade.qty * trade.buy_price
@@ -545,207 +2112,707 @@ async def simulate_trade(trade: TradeInput):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# --- Bulk Import ---
+# POST /positions/bulk validates a whole body of trades column-by-column with
+# pandas (the same rules as TradeInput), reports the rejected rows, and inserts
+# the rest with one executemany in one transaction.
+BULK_FORMATS = {"application/json": "json", "application/x-ndjson": "ndjson", "text/csv": "csv"}
+BULK_TEXT_COLS = ['ticker', 'sector', 'note', 'strategy']
+BULK_MAX_QTY = 2**53 # quantities are validated as float64, which holds every integer up to here exactly
+BULK_INSERT_COLS = [
+    'ticker', 'symbol', 'sector', 'buy_date', 'sell_date',
+    'buy_price', 'sell_price', 'qty', 'type', 'note', 'strategy', 'tradevalue',
+]
+# Same defaults as add_position, inlined so executemany binds only the columns above.
+BULK_INSERT_SQL = f"""
+    INSERT INTO positions (
+        {', '.join(BULK_INSERT_COLS)},
+        current_price, daily_change, daily_pnl, market_value, total_pnl, pct_pnl, tvm, pos_age, account
+    ) VALUES ({', '.join(['?'] * len(BULK_INSERT_COLS))}, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, '', '')
+"""
+
+
+def _parse_bulk_body(body, fmt):
+    """
+    Parses a JSON array, NDJSON or CSV body into a DataFrame, one row per trade.
+    Returns (df, malformed): an NDJSON line that is not valid JSON, or an item
+    that is not an object, becomes an empty row and is listed in malformed as
+    {row: message}, so it is rejected on its own instead of failing the body.
+    """
+    if fmt == "csv":
+        return pd.read_csv(io.BytesIO(body), dtype=str, keep_default_na=False), {}
+    malformed = {}
+    if fmt == "ndjson":
+        records = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError as e:
+                malformed[len(records)] = f"not valid JSON: {e}"
+                records.append({})
+    else:
+        records = json.loads(body)
+        if not isinstance(records, list):
+            raise ValueError("JSON body must be an array of trades")
+    for row, record in enumerate(records):
+        if not isinstance(record, dict):
+            malformed[row] = "trade must be a JSON object"
+            records[row] = {}
+    return pd.DataFrame.from_records(records, index=pd.RangeIndex(len(records))), malformed
+
+
+def _bulk_column(df, name):
+    """The named column with blanks as missing values; all-missing if absent."""
+    if name not in df:
+        return pd.Series(None, index=df.index, dtype=object)
+    col = df[name].astype(object)
+    return col.where(col.notna() & (col != ''), None)
+
+
+def validate_bulk_positions(df, malformed=None):
+    """
+    Applies the TradeInput rules to every row at once.
+    malformed ({row: message}, from _parse_bulk_body) marks rows that are rejected
+    without being checked further.
+    Returns (rows, errors): rows is a DataFrame of valid rows in BULK_INSERT_COLS
+    order, errors is [{"row": position in the body, "errors": [...]}].
+    """
+    problems = defaultdict(list)
+    for row, message in (malformed or {}).items():
+        problems[row].append(message)
+
+    def reject(mask, message):
+        for row in np.flatnonzero(mask.to_numpy()):
+            if int(row) not in (malformed or {}):
+                problems[int(row)].append(message)
+
+    raw_symbol = _bulk_column(df, 'symbol')
+    symbol = raw_symbol.fillna('').astype(str)
+    reject(raw_symbol.isna(), "symbol is required")
+    reject(raw_symbol.notna() & ~symbol.str.fullmatch(r"[a-zA-Z0-9]+"), "symbol must be alphanumeric")
+
+    numbers = {}
+    for name, required in (('buy_price', True), ('qty', True), ('sell_price', False)):
+        raw = _bulk_column(df, name)
+        parsed = pd.to_numeric(raw, errors='coerce')
+        # JSON true/false would otherwise count as 1/0, and inf is not a price or a quantity.
+        numbers[name] = parsed.where(~raw.map(type).eq(bool) & np.isfinite(parsed))
+        if required:
+            reject(raw.isna(), f"{name} is required")
+        reject(raw.notna() & numbers[name].isna(), f"{name} must be a number")
+    qty = numbers['qty']
+    reject(qty.notna() & (qty != qty.round()), "qty must be a whole number")
+    reject(qty.abs() > BULK_MAX_QTY, f"qty must be between -{BULK_MAX_QTY} and {BULK_MAX_QTY}")
+    numbers['qty'] = qty = qty.where(qty.abs() <= BULK_MAX_QTY)
+
+    dates = {}
+    for name in ('buy_date', 'sell_date'):
+        raw = _bulk_column(df, name)
+        parsed = pd.to_datetime(raw, format='%Y-%m-%d', errors='coerce')
+        reject(raw.notna() & parsed.isna(), f"{name} must be a YYYY-MM-DD date")
+        dates[name] = parsed.dt.strftime('%Y-%m-%d').astype(object).where(parsed.notna(), None)
+
+    valid = pd.Series(True, index=df.index)
+    valid.iloc[list(problems)] = False
+
+    rows = pd.DataFrame({
+        'ticker': _bulk_column(df, 'ticker'),
+        'symbol': symbol.str.strip().str.upper(),
+        'sector': _bulk_column(df, 'sector'),
+        'buy_date': dates['buy_date'],
+        'sell_date': dates['sell_date'],
+        'buy_price': numbers['buy_price'].round(2),
+        'sell_price': numbers['sell_price'].round(2),
+        'qty': qty,
+        'type': _bulk_column(df, 'type').fillna('BUY'),
+        'note': _bulk_column(df, 'note'),
+        'strategy': _bulk_column(df, 'strategy'),
+        'tradevalue': (numbers['buy_price'] * qty).round(2),
+    })[valid]
+    rows['qty'] = rows['qty'].astype('int64')
+    rows = rows.astype(object).where(rows.notna(), None)
+
+    errors = [{"row": row, "errors": messages} for row, messages in sorted(problems.items())]
+    return rows, errors
+
+
+def import_positions(body, fmt):
+    """Validates and inserts a bulk body. Returns the import summary."""
+    started = time.perf_counter()
+    try:
+        df, malformed = _parse_bulk_body(body, fmt)
+    except (ValueError, pd.errors.ParserError) as e:
+        raise HTTPException(status_code=400, detail=f"Could not parse {fmt} body: {e}")
+
+    rows, errors = validate_bulk_positions(df, malformed)
+    if len(rows):
+        with db.write() as conn:
+            c = conn.cursor()
+            c.execute("SELECT COALESCE(MAX(id), 0) FROM positions")
+            last_id = c.fetchone()[0]
+            c.executemany(BULK_INSERT_SQL, rows.itertuples(index=False, name=None))
+            engine.load_lots_after(conn, last_id)
+
+    elapsed = time.perf_counter() - started
+    print(f"import_positions: Inserted {len(rows)} of {len(df)} rows ({len(errors)} rejected) in {elapsed * 1000:.1f} ms.")
+    return {
+        "status": "bulk import complete",
+        "received": len(df),
+        "inserted": len(rows),
+        "rejected": len(errors),
+        "errors": errors,
+    }
+
+
+@app.post("/positions/bulk")
+async def bulk_import_positions(request: Request):
+    """
+    Imports many trades in one transaction. The body is a JSON array of TradeInput
+    objects, NDJSON (Content-Type: application/x-ndjson) or CSV (text/csv) with a
+    header row. Invalid rows are reported and skipped; valid rows are inserted.
+    """
+    content_type = request.headers.get("content-type", "application/json").split(";")[0].strip()
+    fmt = BULK_FORMATS.get(content_type)
+    if fmt is None:
+        raise HTTPException(status_code=415, detail=f"Content-Type must be one of {sorted(BULK_FORMATS)}")
+    body = await request.body()
+    return await run_in_executor(_db_executor, import_positions, body, fmt)
+
+
+# --- Open Positions Aggregation ---
+# Per-symbol totals come straight from the holdings table. The display attributes
+# (ticker, sector, prices, ...) are those of each symbol's first lot in FIFO order,
+# found with one seek into idx_positions_open_buy per symbol.
+OPEN_POSITIONS_AGGREGATE_SQL = """
+    SELECT
+        h.symbol,
+        h.total_qty,
+        h.total_cost,
+        h.first_buy_date AS buy_date_first,
+        COALESCE(p.ticker, '') AS ticker,
+        COALESCE(TRIM(p.sector), '') AS sector,
+        COALESCE(TRIM(p.pos_age), '') AS pos_age,
+        COALESCE(TRIM(p.account), '') AS account,
+        COALESCE(p.current_price, 0.0) AS current_price,
+        COALESCE(p.daily_change, 0.0) AS daily_change,
+        COALESCE(p.daily_pnl, 0.0) AS daily_pnl,
+        COALESCE(p.tradevalue, 0.0) AS tradevalue,
+        COALESCE(p.market_value, 0.0) AS market_value,
+        COALESCE(p.total_pnl, 0.0) AS total_pnl,
+        COALESCE(p.pct_pnl, 0.0) AS pct_pnl,
+        COALESCE(p.tvm, 0.0) AS tvm
+    FROM holdings h
+    JOIN positions p ON p.id = (
+        SELECT id FROM positions
+        WHERE symbol = h.symbol AND sell_date IS NULL AND qty > 0 AND type = 'BUY'
+        ORDER BY buy_date, id -- same-day lots: the first one booked, as in the FIFO books
+        LIMIT 1
+    )
+    WHERE h.symbol != ''
+    ORDER BY h.symbol
+"""
+
+
+def format_open_position(data):
+    """Builds the /positions entry for one aggregated symbol row."""
+    calculated_avg_buy_price = round(data["total_cost"] / data["total_qty"], 2)
+    current_price = round(data["current_price"], 2)
+
+    market_value = round(current_price * data["total_qty"], 2)
+    pnl = round(market_value - data["total_cost"], 2)
+    pct_pnl = round((pnl / data["total_cost"]) * 100, 2) if data["total_cost"] else 0.0
+
+    return {
+        "symbol": data["symbol"],
+        "ticker": data["ticker"],
+        "avgPrice": calculated_avg_buy_price,
+        "totalQty": data["total_qty"],
+        "costValue": round(data["total_cost"], 2),
+        "currentPrice": current_price,
+        "marketValue": market_value,
+        "pnl": pnl,
+        "pct_pnl": pct_pnl,
+        "sector": data["sector"],
+        "daily_change": data["daily_change"],
+        "daily_pnl": round(data["daily_pnl"], 2),
+        "tradevalue": round(data["tradevalue"], 2),
+        "total_pnl": round(data["total_pnl"], 2),
+        "pos_age": data["pos_age"],
+        "account": data["account"],
+        "tvm": round(data["tvm"], 2),
+        "fallback": False,
+        "original_buy_date": data["buy_date_first"],
+        "original_buy_price": calculated_avg_buy_price,
+        "excel_tradevalue": round(data["tradevalue"], 2),
+        "excel_market_value": round(data["market_value"], 2),
+        "excel_total_pnl": round(data["pct_pnl"], 2),
+        "excel_pct_pnl": round(data["pct_pnl"], 2),
+        "excel_tvm": round(data["tvm"], 2),
+        "excel_pos_age": data["pos_age"]
+    }
+
+
+def aggregate_open_positions(conn):
+    """Returns the /positions payload: one entry per symbol with open 'BUY' lots."""
+    c = conn.cursor()
+    c.row_factory = dict_factory
+    c.execute(OPEN_POSITIONS_AGGREGATE_SQL)
+    return [format_open_position(row) for row in c.fetchall()]
+
+
+def fetch_open_totals(conn):
+    """Returns (market_value, cost_value, daily_pnl) summed over all open 'BUY' lots."""
+    c = conn.cursor()
+    c.execute("""
+        SELECT COALESCE(SUM(market_value), 0.0), COALESCE(SUM(total_cost), 0.0), COALESCE(SUM(daily_pnl), 0.0)
+        FROM holdings
+    """)
+    return c.fetchone()
+
+
 @app.get("/positions")
-async def get_open_positions():
+@run_in_db_executor
+def get_open_positions():
     """
     Fetches and aggregates open positions from the SQLite database.
     This ensures the frontend always reflects the current state of positions in the DB.
     """
     print("GET /positions endpoint called.")
     # Ensure database is populated from Excel if it's empty (initial run)
-    with sqlite3.connect(DB_NAME) as conn:
+    with db.read() as conn:
         c = conn.cursor()
-        c.execute("SELECT COUNT(*) FROM positions WHERE type = 'BUY'") # Check for BUY positions
-        if c.fetchone()[0] == 0:
+        # Check for open BUY positions (one row in holdings per open symbol)
+        c.execute("SELECT EXISTS (SELECT 1 FROM holdings)")
+        if not c.fetchone()[0]:
             print("get_open_positions: No 'BUY' positions found in database. Attempting to populate from Excel via load_raw_excel_data_into_db().")
             load_raw_excel_data_into_db() # This will insert into DB if empty or only contains SELL records
 
-    # Now, fetch data directly from the SQLite database
-    open_positions_from_db = []
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = dict_factory
-        print(f"get_open_positions: Row factory for connection is: {conn.row_factory}")
-        c = conn.cursor()
-        # Fetch all columns needed for aggregation and display
-        c.execute("""
-            SELECT
-                id, ticker, symbol, sector, buy_date, buy_price, qty,
-                current_price, daily_change, daily_pnl, tradevalue,
-                market_value, total_pnl, pct_pnl, pos_age, account, tvm
-            FROM positions
-            WHERE sell_date IS NULL AND qty > 0 AND type = 'BUY'
-            ORDER BY symbol, buy_date ASC
-        """)
-        open_positions_from_db = c.fetchall()
-    
-    print(f"get_open_positions: Fetched {len(open_positions_from_db)} open positions from database.")
-
-
-    grouped_by_symbol = defaultdict(lambda: {
-        "symbol": "",
-        "totalQty": 0,
-        "totalCost": 0.0,
-        "currentPrice": 0.0,
-        "sector": "",
-        "daily_change": 0.0,
-        "daily_pnl": 0.0,
-        "tradevalue": 0.0,
-        "market_value": 0.0,
-        "total_pnl": 0.0,
-        "pct_pnl": 0.0,
-        "pos_age": "",
-        "account": "",
-        "tvm": 0.0,
-        "buy_date_first": None, # This will store the buy_date of the earliest open lot for this symbol
-        "avg_price_excel": 0.0,
-        "ticker": ""
-    })
-
-    print(f"get_open_positions: Processing {len(open_positions_from_db)} DB entries for grouping.")
-    for row in open_positions_from_db:
-        try:
-            sym = row.get('symbol', '').upper()
-            qty = row.get('qty', 0)
-            ticker = str(row.get('ticker', '')) if not pd.isna(row.get('ticker')) else ""
-            buy_date = row.get('buy_date')
-            buy_price = row.get('buy_price', 0.0)
-
-            # Ensure numeric values are floats
-            for k in [
-                'current_price', 'daily_change', 'daily_pnl',
-                'tradevalue', 'market_value', 'total_pnl', 'pct_pnl', 'tvm'
-            ]:
-                row[k] = float(row.get(k, 0.0))
-
-            # Ensure string values are stripped
-            for k in ['sector', 'pos_age', 'account']:
-                row[k] = str(row.get(k, '')).strip()
-
-            if sym and qty > 0: # Already filtered for sell_date IS NULL and type = 'BUY'
-                if grouped_by_symbol[sym]["totalQty"] == 0:
-                    grouped_by_symbol[sym]["symbol"] = sym
-                    grouped_by_symbol[sym]["ticker"] = ticker
-                    grouped_by_symbol[sym]["sector"] = row.get('sector', '')
-                    grouped_by_symbol[sym]["currentPrice"] = row.get('current_price', 0.0)
-                    grouped_by_symbol[sym]["daily_change"] = row.get('daily_change', 0.0)
-                    grouped_by_symbol[sym]["daily_pnl"] = row.get('daily_pnl', 0.0)
-                    grouped_by_symbol[sym]["tradevalue"] = row.get('tradevalue', 0.0)
-                    grouped_by_symbol[sym]["market_value"] = row.get('market_value', 0.0)
-                    grouped_by_symbol[sym]["total_pnl"] = row.get('total_pnl', 0.0)
-                    grouped_by_symbol[sym]["pct_pnl"] = row.get('pct_pnl', 0.0)
-                    grouped_by_symbol[sym]["pos_age"] = row.get('pos_age', '')
-                    grouped_by_symbol[sym]["account"] = row.get('account', '')
-                    grouped_by_symbol[sym]["tvm"] = row.get('tvm', 0.0)
-                    grouped_by_symbol[sym]["buy_date_first"] = buy_date # Set initial buy date
-
-                # Update buy_date_first if current lot's buy_date is earlier
-                if buy_date and (grouped_by_symbol[sym]["buy_date_first"] is None or buy_date < grouped_by_symbol[sym]["buy_date_first"]):
-                    grouped_by_symbol[sym]["buy_date_first"] = buy_date
-
-                grouped_by_symbol[sym]["totalQty"] += qty
-                grouped_by_symbol[sym]["totalCost"] += qty * buy_price # Use buy_price from DB record
-
-        except Exception as entry_error:
-            print(f"get_open_positions: ERROR: Problem creating final entry for symbol '{sym}': {entry_error}")
-            continue
-
-    result_list = []
-    for sym, data in grouped_by_symbol.items():
-        try:
-            if data["totalQty"] > 0:
-                calculated_avg_buy_price = round(data["totalCost"] / data["totalQty"], 2)
-                current_price = round(data["currentPrice"], 2)
-
-                market_value = round(current_price * data["totalQty"], 2)
-                pnl = round(market_value - data["totalCost"], 2)
-                pct_pnl = round((pnl / data["totalCost"]) * 100, 2) if data["totalCost"] else 0.0
-
-                entry = {
-                    "symbol": sym,
-                    "ticker": data["ticker"],
-                    "avgPrice": calculated_avg_buy_price,
-                    "totalQty": data["totalQty"],
-                    "costValue": round(data["totalCost"], 2),
-                    "currentPrice": current_price,
-                    "marketValue": market_value,
-                    "pnl": pnl,
-                    "pct_pnl": pct_pnl,
-                    "sector": data["sector"],
-                    "daily_change": data["daily_change"],
-                    "daily_pnl": round(data["daily_pnl"], 2),
-                    "tradevalue": round(data["tradevalue"], 2),
-                    "total_pnl": round(data["total_pnl"], 2),
-                    "pos_age": data["pos_age"],
-                    "account": data["account"],
-                    "tvm": round(data["tvm"], 2),
-                    "fallback": False,
-                    "original_buy_date": data["buy_date_first"],
-                    "original_buy_price": calculated_avg_buy_price,
-                    "excel_tradevalue": round(data["tradevalue"], 2),
-                    "excel_market_value": round(data["market_value"], 2),
-                    "excel_total_pnl": round(data["pct_pnl"], 2),
-                    "excel_pct_pnl": round(data["pct_pnl"], 2),
-                    "excel_tvm": round(data["tvm"], 2),
-                    "excel_pos_age": data["pos_age"]
-                }
-                result_list.append(entry)
-        except Exception as entry_error:
-            print(f"get_open_positions: ERROR: Problem creating final entry for symbol '{sym}': {entry_error}")
-            continue
+    # Now, read the per-symbol aggregates from holdings
+    with db.read() as conn:
+        result_list = aggregate_open_positions(conn)
 
     print(f"get_open_positions: Successfully processed {len(result_list)} open positions from DB.")
     return result_list
 
 
-@app.get("/realised")
-async def get_closed_positions():
-    """Fetches realised positions from SQLite."""
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = dict_factory
+# --- Ledger Pagination ---
+# /trades and /realised page with a keyset cursor on (date, id) instead of OFFSET,
+# so fetching page N costs the same as page 1. Rounding happens in SQL.
+MAX_PAGE_SIZE = 1000
+LEDGER_COLUMNS = """
+    id, ticker, symbol, sector, buy_date, sell_date,
+    ROUND(buy_price, 2) AS buy_price, ROUND(sell_price, 2) AS sell_price,
+    qty, type, note, strategy,
+    ROUND(tradevalue, 2) AS tradevalue, ROUND(market_value, 2) AS market_value,
+    ROUND(total_pnl, 2) AS total_pnl, ROUND(pct_pnl, 2) AS pct_pnl, ROUND(tvm, 2) AS tvm,
+    pos_age, account, current_price, daily_change, daily_pnl
+"""
+REALISED_WHERE = "type IN ('SELL', 'CLOSED_FULL_SELL') AND qty = 0 AND sell_date IS NOT NULL"
+
+
+def encode_cursor(sort_value, row_id):
+    raw = json.dumps([sort_value, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return sort_value, int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _ledger_filters(symbol, sector, account, strategy, date_col, date_from, date_to):
+    clauses, params = [], []
+    for col, value in (('symbol', symbol.strip().upper() if symbol else None),
+                       ('sector', sector), ('account', account), ('strategy', strategy)):
+        if value:
+            clauses.append(f"{col} = ?")
+            params.append(value)
+    if date_from:
+        clauses.append(f"{date_col} >= ?")
+        params.append(date_from.isoformat())
+    if date_to:
+        clauses.append(f"{date_col} <= ?")
+        params.append(date_to.isoformat())
+    return clauses, params
+
+
+def _keyset_clause(sort_col, descending, cursor):
+    """WHERE fragment selecting rows strictly after the cursor in (sort_col, id) order."""
+    sort_value, row_id = decode_cursor(cursor)
+    if sort_value is None:
+        # NULL dates sort first ascending; continue within the NULLs, then everything else.
+        return f"(({sort_col} IS NULL AND id > ?) OR {sort_col} IS NOT NULL)", [row_id]
+    if descending:
+        return f"({sort_col} <= ? AND ({sort_col} < ? OR id < ?))", [sort_value, sort_value, row_id]
+    return f"({sort_col} >= ? AND ({sort_col} > ? OR id > ?))", [sort_value, sort_value, row_id]
+
+
+def fetch_ledger_page(response, base_where, sort_col, descending, limit, cursor, filters, with_total=False):
+    """
+    Returns one page of positions rows ordered by (sort_col, id) and sets the
+    X-Next-Cursor header. limit=None returns every matching row.
+    X-Total-Count is set on the first page only (or on any page with with_total):
+    counting scans every matching row, so cursor pages stay a pure keyset query.
+    """
+    filter_clauses, filter_params = filters
+    where = ([base_where] if base_where else []) + filter_clauses
+    direction = "DESC" if descending else "ASC"
+
+    with db.read() as conn:
         c = conn.cursor()
-        c.execute("""
-            SELECT * FROM positions
-            WHERE type IN ('SELL', 'CLOSED_FULL_SELL') AND qty = 0 AND sell_date IS NOT NULL
-            ORDER BY sell_date DESC
-        """)
+        if not cursor or with_total:
+            c.execute(
+                "SELECT COUNT(*) FROM positions" + (f" WHERE {' AND '.join(where)}" if where else ""),
+                filter_params
+            )
+            response.headers["X-Total-Count"] = str(c.fetchone()[0])
+
+        page_where, page_params = list(where), list(filter_params)
+        if cursor:
+            clause, params = _keyset_clause(sort_col, descending, cursor)
+            page_where.append(clause)
+            page_params += params
+        sql = f"SELECT {LEDGER_COLUMNS} FROM positions"
+        if page_where:
+            sql += f" WHERE {' AND '.join(page_where)}"
+        sql += f" ORDER BY {sort_col} {direction}, id {direction}"
+        if limit:
+            sql += " LIMIT ?"
+            page_params.append(limit + 1) # one extra row tells us whether a next page exists
+
+        c.row_factory = dict_factory
+        c.execute(sql, page_params)
         rows = c.fetchall()
-        for row in rows:
-            for key in ['buy_price', 'sell_price', 'tradevalue', 'market_value', 'total_pnl', 'pct_pnl', 'tvm']:
-                if row.get(key) is not None:
-                    row[key] = round(row[key], 2)
-        return rows
+
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(rows[-1][sort_col], rows[-1]['id'])
+    return rows
+
+
+@app.get("/realised")
+@run_in_db_executor
+def get_closed_positions(
+    response: Response,
+    limit: Annotated[Optional[int], Query(ge=1, le=MAX_PAGE_SIZE)] = None,
+    cursor: Optional[str] = None,
+    symbol: Optional[str] = None,
+    sector: Optional[str] = None,
+    account: Optional[str] = None,
+    strategy: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    with_total: bool = False,
+):
+    """
+    Fetches realised positions from SQLite, newest sell_date first.
+    Pass limit (and the previous page's X-Next-Cursor as cursor) to page; date_from/date_to filter on sell_date.
+    X-Total-Count comes with the first page, or with any page if with_total=true.
+    """
+    filters = _ledger_filters(symbol, sector, account, strategy, 'sell_date', date_from, date_to)
+    return fetch_ledger_page(response, REALISED_WHERE, 'sell_date', True, limit, cursor, filters, with_total)
 
 
 @app.get("/trades")
-async def get_all_trades():
-    """Fetches all trade entries from SQLite (both buys and sells)."""
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = dict_factory
+@app.get("/all_trades")
+@run_in_db_executor
+def get_all_trades(
+    response: Response,
+    limit: Annotated[Optional[int], Query(ge=1, le=MAX_PAGE_SIZE)] = None,
+    cursor: Optional[str] = None,
+    symbol: Optional[str] = None,
+    sector: Optional[str] = None,
+    account: Optional[str] = None,
+    strategy: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    with_total: bool = False,
+):
+    """
+    Fetches all trade entries from SQLite (both buys and sells), oldest buy_date first.
+    Pass limit (and the previous page's X-Next-Cursor as cursor) to page; date_from/date_to filter on buy_date.
+    X-Total-Count comes with the first page, or with any page if with_total=true.
+    """
+    filters = _ledger_filters(symbol, sector, account, strategy, 'buy_date', date_from, date_to)
+    return fetch_ledger_page(response, None, 'buy_date', False, limit, cursor, filters, with_total)
+
+
+# --- Ledger Export ---
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _iter_ledger_export(fmt, filters):
+    """
+    Yields the ledger in EXPORT_BATCH_SIZE chunks straight off a cursor, so memory
+    stays flat regardless of ledger size and the first chunk goes out immediately.
+    """
+    filter_clauses, filter_params = filters
+    sql = f"SELECT {LEDGER_COLUMNS} FROM positions"
+    if filter_clauses:
+        sql += f" WHERE {' AND '.join(filter_clauses)}"
+    sql += " ORDER BY buy_date ASC, id ASC"
+
+    conn = db.open_dedicated()
+    try:
         c = conn.cursor()
+        c.execute(sql, filter_params)
+        columns = [col[0] for col in c.description]
+        if fmt == "csv":
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerow(columns)
+            yield buf.getvalue()
+        while True:
+            rows = c.fetchmany(EXPORT_BATCH_SIZE)
+            if not rows:
+                break
+            if fmt == "csv":
+                buf = io.StringIO()
+                csv.writer(buf).writerows(rows)
+                yield buf.getvalue()
+            else:
+                yield "".join(json.dumps(dict(zip(columns, row))) + "\n" for row in rows)
+    finally:
+        conn.close()
+
+
+@app.get("/trades/export")
+async def export_trades(
+    format: str = "ndjson",
+    symbol: Optional[str] = None,
+    sector: Optional[str] = None,
+    account: Optional[str] = None,
+    strategy: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+):
+    """Streams the full trade ledger as NDJSON (default) or CSV, ordered by buy_date."""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {sorted(EXPORT_FORMATS)}")
+    filters = _ledger_filters(symbol, sector, account, strategy, 'buy_date', date_from, date_to)
+    filename = f"trades_{datetime.now().strftime('%Y%m%d')}.{format}"
+    return StreamingResponse(
+        _iter_ledger_export(format, filters),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+# --- Change Feed ---
+# change_log (migration 5) records the key of every row inserted, updated or
+# deleted in positions and portfolio_snapshots. GET /changes?since=<seq> returns
+# the latest change per key after seq together with the row's current contents,
+# so a client holding a copy can upsert/delete instead of refetching everything.
+# POST /prices logs one 'prices' entry per repriced symbol instead of one per
+# lot (see apply_price_ticks); /changes expands it into an update of each of the
+# symbol's open lots, so clients only ever see positions and snapshot rows.
+CHANGE_FEED_TABLES = {
+    # table -> (select list, key column, key type)
+    'positions': (LEDGER_COLUMNS, 'id', int),
+    'portfolio_snapshots': ('*', 'date', str),
+}
+
+
+@app.get("/changes")
+@run_in_db_executor
+def get_changes(
+    since: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = MAX_PAGE_SIZE,
+):
+    """
+    Returns the changes after seq `since`, one entry per row (its latest change),
+    ordered by seq. Pass the returned `next` as `since` until `has_more` is false.
+    `limit` counts log entries; a repriced symbol is one entry that expands to an
+    update of each of its open lots.
+    `reset` means `since` predates the retained log and the client must refetch.
+    """
+    with db.read() as conn:
+        c = conn.cursor()
+        c.execute("SELECT compacted_through FROM change_log_state WHERE id = 1")
+        compacted_through = c.fetchone()[0]
+        c.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log")
+        latest_seq = max(c.fetchone()[0], compacted_through)
+        if since < compacted_through:
+            return {"since": since, "next": latest_seq, "has_more": False, "reset": True, "changes": []}
+
+        # op is a bare column next to MAX(seq), so it comes from the latest change of each key.
         c.execute("""
-            SELECT * FROM positions
-            ORDER BY buy_date ASC
-        """)
-        rows = c.fetchall()
-        for row in rows:
-            for key in ['buy_price', 'sell_price', 'tradevalue', 'market_value', 'total_pnl', 'pct_pnl', 'tvm']:
-                if row.get(key) is not None:
-                    row[key] = round(row[key], 2)
-        return rows
+            SELECT table_name, row_key, op, MAX(seq) AS seq
+            FROM change_log
+            WHERE seq > ?
+            GROUP BY table_name, row_key
+            ORDER BY seq
+            LIMIT ?
+        """, (since, limit + 1))
+        entries = c.fetchall()
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+
+        rows = {}
+        c.row_factory = dict_factory
+        for table, (columns, key_col, key_type) in CHANGE_FEED_TABLES.items():
+            keys = [key_type(row_key) for table_name, row_key, op, _ in entries if table_name == table and op != 'delete']
+            for start in range(0, len(keys), 500): # stay under SQLite's bound-parameter limit
+                chunk = keys[start:start + 500]
+                c.execute(
+                    f"SELECT {columns} FROM {table} WHERE {key_col} IN ({', '.join(['?'] * len(chunk))})",
+                    chunk
+                )
+                for row in c.fetchall():
+                    rows[(table, str(row[key_col]))] = row
+
+        # Lots already in this page carry their current row; the rest of each
+        # repriced symbol's open lots are sent as updates at the 'prices' seq.
+        repriced = defaultdict(list)
+        symbols = [row_key for table_name, row_key, _, _ in entries if table_name == 'prices']
+        for start in range(0, len(symbols), 500):
+            chunk = symbols[start:start + 500]
+            c.execute(
+                f"SELECT {LEDGER_COLUMNS} FROM positions "
+                f"WHERE symbol IN ({', '.join(['?'] * len(chunk))}) AND sell_date IS NULL AND qty > 0 AND type = 'BUY' "
+                "ORDER BY symbol, buy_date, id",
+                chunk
+            )
+            for row in c.fetchall():
+                if ('positions', str(row['id'])) not in rows:
+                    repriced[row['symbol']].append(row)
+
+    changes = []
+    for table_name, row_key, op, seq in entries:
+        if table_name == 'prices':
+            changes.extend(
+                {"seq": seq, "table": "positions", "op": "update", "key": row['id'], "row": row}
+                for row in repriced[row_key]
+            )
+            continue
+        changes.append({
+            "seq": seq,
+            "table": table_name,
+            "op": op,
+            "key": CHANGE_FEED_TABLES[table_name][2](row_key),
+            "row": rows.get((table_name, row_key)) if op != 'delete' else None,
+        })
+    if has_more:
+        next_seq = entries[-1][3]
+    else:
+        next_seq = max([latest_seq] + [entry[3] for entry in entries[-1:]])
+    return {"since": since, "next": next_seq, "has_more": has_more, "reset": False, "changes": changes}
+
+
+@app.post("/changes/compact")
+@run_in_db_executor
+def post_changes_compact(retention_days: Annotated[int, Query(ge=0)] = CHANGE_LOG_RETENTION_DAYS):
+    """Drops change_log entries older than retention_days."""
+    with db.write() as conn:
+        deleted = compact_change_log(conn, retention_days)
+    return {"status": "change log compacted", "deleted": deleted}
+
+
+# --- Price Ingestion ---
+# POST /prices revalues every open lot of the ticked symbols with one set-based
+# UPDATE ... FROM a temp table of ticks. Derived columns follow the workbook:
+# daily_change is price - prev_close, daily_pnl is qty * daily_change, and
+# pct_pnl is a percentage of cost, as on realised trades. A tick without
+# prev_close keeps the day's base already on the lot (current_price -
+# daily_change); a lot that has never been priced (current_price 0, e.g. added
+# through POST /positions) has no base yet, so its first such tick becomes the
+# base and its daily change starts at 0.
+TICK_DAY_BASE_SQL = """
+    COALESCE(t.prev_close, CASE WHEN positions.current_price > 0
+                                THEN positions.current_price - COALESCE(positions.daily_change, 0.0)
+                                ELSE t.price END)
+"""
+REVALUE_OPEN_LOTS_SQL = """
+    UPDATE positions
+    SET current_price = t.price,
+        row_hash = NULL, -- the lot no longer matches its workbook row (migration 9)
+        daily_change = t.price - %(base)s,
+        daily_pnl = positions.qty * (t.price - %(base)s),
+        market_value = positions.qty * t.price,
+        total_pnl = positions.qty * (t.price - positions.buy_price),
+        pct_pnl = CASE WHEN positions.buy_price > 0
+                       THEN (t.price - positions.buy_price) * 100.0 / positions.buy_price ELSE 0.0 END
+    FROM temp.price_ticks AS t
+    WHERE positions.symbol = t.symbol
+      AND positions.symbol IN (SELECT symbol FROM temp.price_ticks) -- drive the update from the ticks
+      AND positions.sell_date IS NULL AND positions.qty > 0 AND positions.type = 'BUY'
+""" % {"base": TICK_DAY_BASE_SQL.strip()}
+
+
+def apply_price_ticks(conn, ticks):
+    """Applies (symbol, price, prev_close) ticks inside the caller's write transaction."""
+    c = conn.cursor()
+    c.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS price_ticks (
+            symbol TEXT PRIMARY KEY,
+            price REAL NOT NULL,
+            prev_close REAL
+        )
+    """)
+    c.execute("DELETE FROM temp.price_ticks")
+    # A symbol ticked twice in one batch keeps its last tick.
+    c.executemany("INSERT OR REPLACE INTO temp.price_ticks (symbol, price, prev_close) VALUES (?, ?, ?)", ticks)
+    c.execute(REVALUE_OPEN_LOTS_SQL)
+    lots_updated = c.rowcount
+    # Price columns are not logged by the positions trigger (migration 6); one
+    # entry per symbol stands in for all of its repriced lots in GET /changes.
+    c.execute("""
+        INSERT INTO change_log (table_name, row_key, op)
+        SELECT 'prices', t.symbol, 'update' FROM temp.price_ticks AS t
+        WHERE EXISTS (SELECT 1 FROM holdings AS h WHERE h.symbol = t.symbol)
+        ORDER BY t.symbol
+    """)
+    c.execute("""
+        SELECT symbol FROM temp.price_ticks AS t
+        WHERE NOT EXISTS (SELECT 1 FROM holdings AS h WHERE h.symbol = t.symbol)
+        ORDER BY symbol
+    """)
+    unknown = [row[0] for row in c.fetchall()]
+    return lots_updated, unknown
+
+
+@app.post("/prices")
+@run_in_db_executor
+def ingest_prices(ticks: List[PriceTick]):
+    """Updates current price, market value and P&L of every open lot of the ticked symbols."""
+    if not ticks:
+        raise HTTPException(status_code=400, detail="At least one price tick is required.")
+    with db.write() as conn:
+        lots_updated, unknown = apply_price_ticks(
+            conn, [(tick.symbol, tick.price, tick.prev_close) for tick in ticks]
+        )
+    return {
+        "status": "prices applied",
+        "ticks": len(ticks),
+        "lots_updated": lots_updated,
+        "unknown_symbols": unknown,
+    }
 
-@app.get("/all_trades")
-async def get_all_trades_alias():
-    return await get_all_trades()
 
 @app.post("/reload-excel-data")
-async def reload_excel_data():
-    """Endpoint to manually trigger a reload of Excel data."""
-    # This will now re-read Excel and re-populate the 'BUY' positions in DB
-    load_raw_excel_data_into_db()
-    return {"status": "Excel data reloaded successfully"}
+async def reload_excel_data(mode: str = "incremental", force: bool = False):
+    """
+    Endpoint to manually trigger a reload of Excel data.
+    mode=incremental (default) applies only the changed rows; mode=full rewrites all 'BUY' rows.
+    An unchanged workbook is not re-parsed unless force=true.
+    """
+    if mode not in ("incremental", "full"):
+        raise HTTPException(status_code=400, detail="mode must be 'incremental' or 'full'")
+    # The parse runs on the Excel executor so other requests keep being served.
+    summary = await run_in_executor(_excel_executor, load_raw_excel_data_into_db, mode, force)
+    if summary is None:
+        raise HTTPException(status_code=500, detail="Failed to reload Excel data. Check the server log.")
+    return {"status": "Excel data reloaded successfully", "mode": mode, "changes": summary}
 
 @app.post("/snapshot")
-async def take_snapshot(request: PortfolioSnapshotRequest):
+@run_in_db_executor
+def take_snapshot(request: PortfolioSnapshotRequest):
     today_str = datetime.now().strftime('%Y-%m-%d')
     today_date_obj = datetime.strptime(today_str, '%Y-%m-%d').date()
 
@@ -757,29 +2824,17 @@ async def take_snapshot(request: PortfolioSnapshotRequest):
     total_cost_value = 0.0
     daily_pnl_sum = 0.0
 
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = dict_factory
-        c = conn.cursor()
-        c.execute("""
-            SELECT current_price, qty, buy_price, daily_pnl
-            FROM positions
-            WHERE sell_date IS NULL AND qty > 0 AND type = 'BUY'
-        """)
-        open_positions_for_snapshot = c.fetchall()
-
-        for pos in open_positions_for_snapshot:
-            current_market_value += pos['current_price'] * pos['qty']
-            total_cost_value += pos['buy_price'] * pos['qty']
-            daily_pnl_sum += pos['daily_pnl']
+    with db.read() as conn:
+        current_market_value, total_cost_value, daily_pnl_sum = fetch_open_totals(conn)
 
     total_pnl = current_market_value - total_cost_value
 
     portfolio_index_value = 0.0
     message = ""
 
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = dict_factory # ⚡️ FIX: Set row factory once at the start ⚡️
+    with db.write() as conn:
         c = conn.cursor()
+        c.row_factory = dict_factory
         c.execute("SELECT * FROM portfolio_snapshots ORDER BY date DESC LIMIT 1")
         last_snapshot = c.fetchone() # ⚡️ FIX: Fetch once and get a dictionary ⚡️
 
@@ -827,7 +2882,7 @@ async def take_snapshot(request: PortfolioSnapshotRequest):
             round(portfolio_index_value, 2),
             round(request.net_cash_flow_today, 2)
         ))
-        conn.commit()
+        refresh_portfolio_rollups(conn, today_str, today_str)
 
     return {
         "message": message, "snapshot": {
@@ -840,137 +2895,759 @@ async def take_snapshot(request: PortfolioSnapshotRequest):
         "net_cash_flow_today": round(request.net_cash_flow_today, 2)
     }}
 
+def lttb_indices(x, y, max_points):
+    """
+    Largest-Triangle-Three-Buckets downsampling: returns the indices of at most
+    max_points points of (x, y) that keep the visual shape of the line. The
+    first and last points are always kept.
+    """
+    n = len(x)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+    # max_points - 2 buckets between the fixed first and last points.
+    edges = np.linspace(1, n - 1, max_points - 1).astype(int)
+    selected = np.empty(max_points, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(max_points - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        if i + 2 < len(edges):
+            next_lo, next_hi = hi, max(edges[i + 2], hi + 1)
+            avg_x, avg_y = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        # Twice the area of the triangle (point a, candidate, next bucket's average).
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
 @app.get("/portfolio-history")
-async def get_portfolio_history():
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = dict_factory
+@run_in_db_executor
+def get_portfolio_history(
+    date_from: Annotated[Optional[date], Query(alias="from")] = None,
+    date_to: Annotated[Optional[date], Query(alias="to")] = None,
+    max_points: Annotated[Optional[int], Query(ge=3)] = None,
+):
+    """
+    Snapshots in date order, optionally limited to [from, to] (a range seek on
+    the date primary key). With max_points, longer histories are downsampled
+    with LTTB on the index value; the first and last snapshot are always kept.
+    """
+    clauses, params = [], []
+    if date_from:
+        clauses.append("date >= ?")
+        params.append(date_from.isoformat())
+    if date_to:
+        clauses.append("date <= ?")
+        params.append(date_to.isoformat())
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    with db.read() as conn:
         c = conn.cursor()
-        c.execute("SELECT * FROM portfolio_snapshots ORDER BY date ASC")
+        c.row_factory = dict_factory
+        c.execute(f"SELECT * FROM portfolio_snapshots {where} ORDER BY date ASC", params)
         rows = c.fetchall()
-        return rows
-
-@app.get("/calculate-live-index")
-async def calculate_live_index(
-    net_cash_flow_today: float = 0.0
+    if max_points and len(rows) > max_points:
+        x = np.array([row["date"] for row in rows], dtype="datetime64[D]").astype(float)
+        y = np.nan_to_num(np.array([row["portfolio_index_value"] for row in rows], dtype=float))
+        rows = [rows[i] for i in lttb_indices(x, y, max_points)]
+    return rows
+
+
+@app.get("/portfolio-history/rollups")
+@run_in_db_executor
+def get_portfolio_rollups(
+    period: str = "week",
+    date_from: Annotated[Optional[date], Query(alias="from")] = None,
+    date_to: Annotated[Optional[date], Query(alias="to")] = None,
 ):
-    today_str = datetime.now().strftime('%Y-%m-%d')
+    """Weekly or monthly open/high/low/close of the index, oldest first; from/to bound period_start."""
+    if period not in ROLLUP_PERIODS:
+        raise HTTPException(status_code=400, detail="period must be 'week' or 'month'")
+    clauses, params = ["period = ?"], [period]
+    if date_from:
+        clauses.append("period_start >= ?")
+        params.append(date_from.isoformat())
+    if date_to:
+        clauses.append("period_start <= ?")
+        params.append(date_to.isoformat())
+    with db.read() as conn:
+        c = conn.cursor()
+        c.row_factory = dict_factory
+        c.execute(f"SELECT * FROM portfolio_rollups WHERE {' AND '.join(clauses)} ORDER BY period_start ASC", params)
+        return c.fetchall()
+
+
+# --- Index Rebuild ---
+# take_snapshot chains today's index from the stored previous snapshot, so a
+# corrected market value or cash flow leaves every later index value stale.
+# The rebuild uses the same branches as take_snapshot:
+#   denominator > 0                -> index = prev * (1 + Modified-Dietz return)
+#   else market value and flow > 0 -> index resets to 100
+#   else                           -> index = prev (a zero index stays zero)
+# The daily factors are computed for all snapshots at once, the third branch
+# being a factor of 1. Chaining them stays a per-day loop: take_snapshot
+# stores each day rounded to paise and chains from that rounded value, and a
+# cumulative product of exact factors drifts away from it by whole index points
+# over a few years. The oldest snapshot keeps its stored value as the base.
+def index_factors(market_value, net_cash_flow):
+    """Returns (daily factor, reset mask) for snapshots in date order; the first row is a reset."""
+    prev_market_value = np.concatenate(([0.0], market_value[:-1]))
+    denominator = prev_market_value + 0.5 * net_cash_flow
+    chained = denominator > 0
+    reset = ~chained & (market_value > 0) & (net_cash_flow > 0)
+    reset[0] = True
+    chained &= ~reset
+
+    factor = np.ones_like(market_value)
+    np.divide(market_value - prev_market_value - net_cash_flow, denominator, out=factor, where=chained)
+    factor[chained] += 1.0
+    return factor, reset
+
+
+def compute_index_series(market_value, net_cash_flow, base=100.0):
+    """
+    Returns the index for snapshots in date order, starting from `base` and
+    rounded every day exactly as take_snapshot stores it.
+    """
+    market_value = np.asarray(market_value, dtype=float)
+    net_cash_flow = np.asarray(net_cash_flow, dtype=float)
+    if market_value.size == 0:
+        return market_value
+    factor, reset = index_factors(market_value, net_cash_flow)
+    index = np.empty_like(market_value)
+    value = base
+    for i, (day_factor, day_reset) in enumerate(zip(factor.tolist(), reset.tolist())):
+        if i:
+            value = 100.0 if day_reset else round(value * day_factor, 2)
+        index[i] = value
+    return index
+
+
+def rebuild_portfolio_index(conn, dry_run=False):
+    """
+    Recomputes portfolio_index_value from the first snapshot whose stored value
+    does not follow from its predecessor, and rewrites the rows that change.
+    Runs in the caller's write transaction.
 
-    current_market_value = 0.0
-    total_cost_value = 0.0
-    daily_pnl_sum = 0.0
+    The check is local (stored previous value times the day's factor, rounded
+    like take_snapshot), so an untouched history is left exactly as stored, and
+    the rows after a correction are what taking those snapshots again would store.
+    """
+    c = conn.cursor()
+    c.execute("""
+        SELECT date, market_value, net_cash_flow_today, portfolio_index_value
+        FROM portfolio_snapshots ORDER BY date ASC
+    """)
+    rows = c.fetchall()
+    if not rows:
+        return {"snapshots": 0, "updated": 0, "first_changed": None}
+    dates, market_value, net_cash_flow, stored = zip(*rows)
+    market_value = np.nan_to_num(np.array(market_value, dtype=float))
+    net_cash_flow = np.nan_to_num(np.array(net_cash_flow, dtype=float))
+    stored = np.nan_to_num(np.array(stored, dtype=float))
+
+    factor, reset = index_factors(market_value, net_cash_flow)
+    expected = np.round(np.where(reset, 100.0, np.concatenate(([0.0], stored[:-1])) * factor), 2)
+    expected[0] = stored[0]
+    # A one-paisa flip is rounding: the snapshot was taken from unrounded live totals.
+    broken = np.flatnonzero(~np.isclose(expected, stored, rtol=0.0, atol=0.0101))
+    if not len(broken):
+        return {"snapshots": len(dates), "updated": 0, "first_changed": None}
+
+    start = broken[0] - 1
+    rebuilt = compute_index_series(market_value[start:], net_cash_flow[start:], base=stored[start])
+    changed = start + np.flatnonzero(~np.isclose(rebuilt, stored[start:], rtol=0.0, atol=0.001))
+    if not dry_run and len(changed):
+        c.executemany(
+            "UPDATE portfolio_snapshots SET portfolio_index_value = ? WHERE date = ?",
+            [(float(rebuilt[i - start]), dates[i]) for i in changed],
+        )
+        refresh_portfolio_rollups(conn, dates[changed[0]], dates[-1])
+    return {
+        "snapshots": len(dates),
+        "updated": len(changed),
+        "first_changed": dates[changed[0]] if len(changed) else None,
+    }
 
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = dict_factory
-        c = conn.cursor()
-        c.execute("""
-            SELECT current_price, qty, buy_price, daily_pnl
-            FROM positions
-            WHERE sell_date IS NULL AND qty > 0 AND type = 'BUY'
-        """)
-        open_positions_for_live_calc = c.fetchall()
 
-        for pos in open_positions_for_live_calc:
-            current_market_value += pos['current_price'] * pos['qty']
-            total_cost_value += pos['buy_price'] * pos['qty']
-            daily_pnl_sum += pos['daily_pnl']
+@app.post("/portfolio-history/rebuild-index")
+@run_in_db_executor
+def post_rebuild_portfolio_index(dry_run: bool = False):
+    """Recomputes the chained index over all snapshots; dry_run only reports what would change."""
+    with db.write() as conn:
+        result = rebuild_portfolio_index(conn, dry_run=dry_run)
+    print(f"post_rebuild_portfolio_index: {result['updated']} of {result['snapshots']} snapshots "
+          f"{'would change' if dry_run else 'updated'}.")
+    return {"status": "dry run" if dry_run else "index rebuilt", **result}
+
+def fetch_live_index_inputs(conn):
+    """Everything the live index needs from SQLite: open totals and the latest snapshot."""
+    current_market_value, total_cost_value, daily_pnl_sum = fetch_open_totals(conn)
+    c = conn.cursor()
+    c.row_factory = dict_factory
+    c.execute("SELECT * FROM portfolio_snapshots ORDER BY date DESC LIMIT 1")
+    return {
+        "current_market_value": current_market_value,
+        "total_cost_value": total_cost_value,
+        "daily_pnl_sum": daily_pnl_sum,
+        "last_snapshot": c.fetchone(),
+    }
+
+
+def compute_live_index(inputs, net_cash_flow_today):
+    """Modified-Dietz index for today, chained from the latest snapshot."""
+    current_market_value = inputs["current_market_value"]
+    total_cost_value = inputs["total_cost_value"]
+    last_snapshot = inputs["last_snapshot"]
 
     total_pnl = current_market_value - total_cost_value
 
+    if not last_snapshot:
+        live_portfolio_index_value = 100.0
+    else:
+        pmv_yesterday = last_snapshot['market_value']
+        index_yesterday = last_snapshot['portfolio_index_value']
 
-    live_portfolio_index_value = 0.0
+        denominator = pmv_yesterday + (0.5 * net_cash_flow_today)
 
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = dict_factory
-        c = conn.cursor()
-        c.execute("SELECT * FROM portfolio_snapshots ORDER BY date DESC LIMIT 1")
-        last_snapshot = c.fetchone() # ⚡️ FIX: Fetch the dictionary directly ⚡️
-        
-        if not last_snapshot:
+        if denominator > 0:
+            daily_return_rate = (current_market_value - pmv_yesterday - net_cash_flow_today) / denominator
+            live_portfolio_index_value = index_yesterday * (1 + daily_return_rate)
+        elif current_market_value > 0 and net_cash_flow_today > 0:
             live_portfolio_index_value = 100.0
         else:
-            # ⚡️ FIX: Use 'last_snapshot' dictionary directly ⚡️
-            pmv_yesterday = last_snapshot['market_value']
-            index_yesterday = last_snapshot['portfolio_index_value']
-
-            denominator = pmv_yesterday + (0.5 * net_cash_flow_today)
-
-            if denominator > 0:
-                daily_return_rate = (current_market_value - pmv_yesterday - net_cash_flow_today) / denominator
-                live_portfolio_index_value = index_yesterday * (1 + daily_return_rate)
-            elif current_market_value > 0 and net_cash_flow_today > 0:
-                live_portfolio_index_value = 100.0
+            if index_yesterday == 0 and current_market_value == 0:
+                 live_portfolio_index_value = 0.0
             else:
-                if index_yesterday == 0 and current_market_value == 0:
-                     live_portfolio_index_value = 0.0
-                else:
-                    live_portfolio_index_value = index_yesterday
+                live_portfolio_index_value = index_yesterday
 
     return {
         "live_portfolio_index_value": round(live_portfolio_index_value, 2),
         "current_market_value": round(current_market_value, 2),
         "total_cost_value": round(total_cost_value, 2),
         "total_pnl": round(total_pnl, 2),
-        "daily_pnl_sum": round(daily_pnl_sum, 2)
+        "daily_pnl_sum": round(inputs["daily_pnl_sum"], 2)
     }
 
-@app.get("/dividends")
-async def get_dividends():
-    """Returns raw and aggregated dividend data."""
-    global _dividends_data # Keep global for dividends as it's not DB-backed yet
-    if not _dividends_data:
-        load_dividends_data()
-        if not _dividends_data:
-            raise HTTPException(status_code=500, detail="Failed to load dividend data.")
-
-    total_amount_by_ticker = defaultdict(float)
-    total_dividend_earned = 0.0
-    dividends_by_year = defaultdict(float)
-
-    for record in _dividends_data:
-        ticker = record.get('ticker', 'N/A')
-        amount = record.get('amount', 0.0)
-        date_str = record.get('date_of_disbur')
-
-        total_dividend_earned += amount
-        total_amount_by_ticker[ticker] += amount
-
-        if date_str:
-            try:
-                year = datetime.strptime(date_str, '%Y-%m-%d').year
-                dividends_by_year[year] += amount
-            except ValueError:
-                print(f"WARNING: Could not parse date '{date_str}' for yearly aggregation.")
-
-    sorted_raw_data = sorted(
-        _dividends_data,
-        key=lambda x: x.get('date_of_disbur', '0000-00-00'),
-        reverse=True
-    )
 
-    chart_data = []
-    for k, v in total_amount_by_ticker.items():
-        if k.upper() != 'HISTDIVIDENDS':
-            chart_data.append({"ticker": k, "total_amount": v})
-    chart_data.sort(key=lambda x: x['total_amount'], reverse=True)
+# --- Live Index Cache ---
+# The live index inputs (open totals and the latest snapshot) only change when a
+# write commits, and every commit bumps data_version. They are cached against
+# the version they were read at, so a poll between writes is answered from
+# memory without SQL. The first poll after a write, by this process or another,
+# re-reads them; the /stream broadcaster also stores what it loads.
+class VersionedCache:
+    """A value computed from SQLite, keyed by data version, with hit/miss counters."""
+
+    def __init__(self, loader):
+        self._loader = loader # loader(conn) -> value
+        self._lock = threading.Lock()
+        self._version = None
+        self._value = None
+        self.hits = 0
+        self.misses = 0
+
+    def peek(self):
+        """
+        Returns the cached value if it is still current, else None. Only called on
+        ETAG_PATHS, whose middleware has just refreshed data_version for this request.
+        """
+        current = data_version.current()
+        with self._lock:
+            if self._version == current:
+                self.hits += 1
+                return self._value
+            return None
+
+    def store(self, version, value):
+        # Readers can finish out of order; never replace a newer value with an older one.
+        with self._lock:
+            if self._version is None or version[0] != self._version[0] or version[1] >= self._version[1]:
+                self._version, self._value = version, value
+
+    def load(self):
+        """Computes the value from SQLite and caches it. Runs on the DB executor."""
+        # Taken before the read: a write committing meanwhile bumps past it.
+        version = data_version.refresh()
+        with db.read() as conn:
+            value = self._loader(conn)
+        with self._lock:
+            self.misses += 1
+        self.store(version, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "version": self._version and self._version[1]}
+
+
+live_index_cache = VersionedCache(fetch_live_index_inputs)
 
-    yearly_chart_data = [{"year": year, "total_amount": amount} for year, amount in dividends_by_year.items()]
-    yearly_chart_data.sort(key=lambda x: x['year'])
+
+@app.get("/calculate-live-index")
+async def calculate_live_index(
+    net_cash_flow_today: float = 0.0
+):
+    inputs = live_index_cache.peek()
+    if inputs is None:
+        inputs = await run_in_executor(_db_executor, live_index_cache.load)
+    return compute_live_index(inputs, net_cash_flow_today)
+
+
+# --- Analytics ---
+# GET /analytics serves the Analysis page's charts in one payload: the open
+# position charts are bucketed over the /positions entries (one per symbol,
+# as the page showed them) and the closed charts over the realised rows, each
+# with one pandas pass. The result is cached per data version.
+POSITION_AGE_BUCKETS = ["<= 90 Days", "91-180 Days", "181-365 Days", "> 365 Days", "Unknown/Invalid Age"]
+TVM_GRADES = ["Excellent", "Good", "Fair", "Poor", "N/A"]
+
+
+def _category_counts(categories, order):
+    counts = pd.Series(categories).value_counts()
+    return [{"name": name, "value": int(counts[name])} for name in order if name in counts.index]
+
+
+def _sum_by(df, key, value, rounded=False):
+    """[{"name", "value"}] of df[value] summed per df[key]; blank keys are 'Uncategorized'."""
+    keys = df[key].fillna('').astype(str).str.strip().replace('', 'Uncategorized')
+    sums = df[value].groupby(keys, sort=True).sum()
+    return [{"name": name, "value": round(total, 2) if rounded else total} for name, total in sums.items()]
+
+
+def compute_analytics(conn):
+    """Builds the /analytics payload."""
+    open_df = pd.DataFrame(
+        aggregate_open_positions(conn),
+        columns=["symbol", "sector", "account", "marketValue", "pnl", "pos_age", "tvm"],
+    )
+    age = pd.to_numeric(open_df["pos_age"], errors="coerce")
+    age = age.where(age >= 0).to_numpy(dtype=float)
+    age_bucket = np.select(
+        [age <= 90, age <= 180, age <= 365, age > 365],
+        POSITION_AGE_BUCKETS[:4],
+        default=POSITION_AGE_BUCKETS[4], # NaN and negative ages
+    )
+    tvm = pd.to_numeric(open_df["tvm"], errors="coerce").to_numpy(dtype=float)
+    tvm_grade = np.select(
+        [tvm >= 10, tvm >= 5, tvm >= 1, tvm < 1],
+        TVM_GRADES[:4],
+        default=TVM_GRADES[4],
+    )
+
+    closed_df = pd.read_sql_query(
+        f"SELECT symbol, sector, COALESCE(total_pnl, 0.0) AS total_pnl FROM positions WHERE {REALISED_WHERE}",
+        conn,
+    )
+    closed_by_symbol = closed_df.groupby("symbol", sort=False)["total_pnl"].sum().round(2).sort_values(ascending=False)
 
     return {
-        "raw_data": sorted_raw_data,
-        "chart_data": chart_data,
-        "total_dividend_earned": round(total_dividend_earned, 2),
-        "dividends_by_year": yearly_chart_data
+        "open_pnl": open_df[["symbol", "pnl"]].to_dict(orient="records"),
+        "sector_market_value": _sum_by(open_df, "sector", "marketValue"),
+        "account_market_value": _sum_by(open_df, "account", "marketValue"),
+        "position_age": _category_counts(age_bucket, POSITION_AGE_BUCKETS),
+        "tvm_grades": _category_counts(tvm_grade, TVM_GRADES),
+        "closed_pnl": [{"symbol": symbol, "pnl": pnl} for symbol, pnl in closed_by_symbol.items()],
+        "closed_sector_pnl": _sum_by(closed_df, "sector", "total_pnl", rounded=True),
     }
 
+
+analytics_cache = VersionedCache(compute_analytics)
+
+
+@app.get("/analytics")
+async def get_analytics():
+    """Open and closed position breakdowns for the Analysis page."""
+    analytics = analytics_cache.peek()
+    if analytics is None:
+        analytics = await run_in_executor(_db_executor, analytics_cache.load)
+    return analytics
+
+
+# --- Live Push ---
+# GET /stream is a server-sent events channel for dashboards. Every committed
+# write bumps data_version, which wakes the broadcaster (commits by other
+# processes are picked up by polling it every STREAM_POLL seconds while clients
+# are connected); after a short debounce
+# it reloads the per-symbol positions and the live index inputs once, diffs them
+# against the previous broadcast, and fans the same encoded diff out to every
+# client. A connecting client's snapshot is that same broadcast state, so every
+# client holds the state the next diff starts from. Each client has a bounded
+# queue: a client that falls behind has its backlog dropped and is sent a full
+# snapshot instead.
+STREAM_QUEUE_SIZE = 16
+STREAM_DEBOUNCE = 0.25
+STREAM_KEEPALIVE = 15.0
+STREAM_POLL = 1.0
+STREAM_RESYNC = object() # queued in place of a dropped backlog
+
+
+def load_live_state():
+    """Returns ({symbol: /positions entry}, live index inputs) read in one go."""
+    version = data_version.refresh()
+    with db.read() as conn:
+        positions = {entry["symbol"]: entry for entry in aggregate_open_positions(conn)}
+        inputs = fetch_live_index_inputs(conn)
+    live_index_cache.store(version, inputs)
+    return positions, inputs
+
+
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+class LiveBroadcaster:
+    """Computes each live update once and fans it out to the /stream clients."""
+
+    def __init__(self):
+        self._subscribers = {} # asyncio.Queue -> net_cash_flow_today
+        self._positions = {} # state of the last broadcast, the baseline for the next diff
+        self._inputs = None
+        self._version = None
+        self._stale = True # baseline skipped updates while nobody was listening
+        self._state_lock = None # serializes baseline changes with the snapshots read from it
+        self._loop = None
+        self._wakeup = None
+        self._task = None
+        self.dropped = 0 # backlogs discarded for slow clients
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._state_lock = asyncio.Lock()
+        self._task = self._loop.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    def notify(self):
+        """Thread-safe: called after every data_version bump."""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def subscribe(self, net_cash_flow_today):
+        queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        self._subscribers[queue] = net_cash_flow_today
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.pop(queue, None)
+
+    async def _load(self):
+        positions, inputs = await run_in_executor(_db_executor, load_live_state)
+        return positions, inputs, data_version.value
+
+    async def snapshot(self, net_cash_flow_today):
+        """
+        The "snapshot" event for a client: the state of the last broadcast, which
+        every later diff starts from. A state fresher than that would be wrong,
+        as a diff from an older baseline cannot express changes made in between
+        (e.g. a symbol opened and closed again). Reloaded first if stale.
+        """
+        async with self._state_lock:
+            if self._stale:
+                self._positions, self._inputs, self._version = await self._load()
+                self._stale = False
+            return self._snapshot_event(net_cash_flow_today)
+
+    def _snapshot_event(self, net_cash_flow_today):
+        return sse_event("snapshot", {
+            "version": self._version,
+            "positions": list(self._positions.values()),
+            "index": compute_live_index(self._inputs, net_cash_flow_today),
+        })
+
+    def _publish(self, queue, message):
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Slow client: a diff applied on top of a gap would be wrong, so
+            # drop the backlog and let the client resync from a snapshot.
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(STREAM_RESYNC)
+            self.dropped += 1
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=STREAM_POLL)
+            except asyncio.TimeoutError:
+                if self._subscribers:
+                    # A newer version notifies the listeners, which sets _wakeup.
+                    await run_in_executor(_db_executor, data_version.refresh)
+                continue
+            await asyncio.sleep(STREAM_DEBOUNCE) # coalesce bursts of commits
+            self._wakeup.clear()
+            try:
+                await self._broadcast()
+            except Exception as e:
+                print(f"LiveBroadcaster: ERROR while broadcasting: {type(e).__name__}: {e}")
+
+    async def _broadcast(self):
+        async with self._state_lock:
+            if not self._subscribers:
+                # Nobody to tell; the next client's snapshot re-seeds the baseline.
+                self._stale = True
+                return
+            positions, inputs, version = await self._load()
+            if self._stale:
+                # Clients subscribed while the baseline was stale may hold any
+                # state, so nothing can be diffed: everyone gets a full snapshot.
+                self._positions, self._inputs, self._version = positions, inputs, version
+                self._stale = False
+                self._fan_out(self._snapshot_event)
+                return
+
+            previous, self._positions = self._positions, positions
+            previous_inputs, self._inputs = self._inputs, inputs
+            self._version = version
+            changed = [entry for symbol, entry in positions.items() if previous.get(symbol) != entry]
+            removed = [symbol for symbol in previous if symbol not in positions]
+            if not changed and not removed and inputs == previous_inputs:
+                return
+            diff = {"version": version, "changed": changed, "removed": removed}
+            self._fan_out(lambda net_cash_flow_today: sse_event(
+                "diff", dict(diff, index=compute_live_index(inputs, net_cash_flow_today))
+            ))
+
+    def _fan_out(self, encode):
+        encoded = {} # net_cash_flow_today -> message; one encoding per distinct value
+        for queue, net_cash_flow_today in list(self._subscribers.items()):
+            message = encoded.get(net_cash_flow_today)
+            if message is None:
+                message = encoded[net_cash_flow_today] = encode(net_cash_flow_today)
+            self._publish(queue, message)
+
+    def stats(self):
+        return {"clients": len(self._subscribers), "dropped_backlogs": self.dropped}
+
+
+broadcaster = LiveBroadcaster()
+data_version.listeners.append(broadcaster.notify)
+
+
+@app.get("/stream")
+async def stream_live_updates(net_cash_flow_today: float = 0.0):
+    """
+    Server-sent events: a "snapshot" event with every open position and the live
+    index, then a "diff" event ({changed, removed, index}) after each change.
+    """
+    queue = broadcaster.subscribe(net_cash_flow_today)
+
+    async def events():
+        try:
+            yield await broadcaster.snapshot(net_cash_flow_today)
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if message is STREAM_RESYNC:
+                    # Diffs queued behind the marker predate the snapshot about to be loaded.
+                    while not queue.empty():
+                        queue.get_nowait()
+                    message = await broadcaster.snapshot(net_cash_flow_today)
+                yield message
+        finally:
+            broadcaster.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+def _dividend_record(row):
+    """A dividends row in the shape of the workbook record: known columns plus the extra ones."""
+    extra = row.pop('extra')
+    del row['id'], row['row_hash']
+    if extra:
+        row.update(json.loads(extra))
+    return row
+
+
+# GET /dividends filters, groups and pages on the server. Filters use
+# idx_dividends_ticker_upper (case-insensitive ticker prefix) and
+# idx_dividends_date (year range); raw pages use the same keyset cursor as the
+# ledgers. Without filters the summary and groups come straight from the cached
+# rollups.
+DIVIDEND_SORTS = {"date": "date_of_disbur", "amount": "amount", "ticker": "ticker"}
+DIVIDEND_GROUPS = {
+    "ticker": "ticker",
+    "sector": "sector",
+    "year": "CAST(substr(date_of_disbur, 1, 4) AS INTEGER)",
+    "month": "substr(date_of_disbur, 1, 7)",
+}
+
+
+def _dividend_filters(ticker, sector, year_from, year_to):
+    clauses, params = [], []
+    if ticker and ticker.strip():
+        prefix = ticker.strip().upper()
+        # A range on idx_dividends_ticker_upper; LIKE could not use the index.
+        clauses.append("upper(ticker) >= ? AND upper(ticker) < ?")
+        params += [prefix, prefix + "\U0010ffff"]
+    if sector:
+        clauses.append("sector = ?")
+        params.append(sector)
+    if year_from is not None:
+        clauses.append("date_of_disbur >= ?")
+        params.append(f"{year_from:04d}-01-01")
+    if year_to is not None:
+        clauses.append("date_of_disbur != '' AND date_of_disbur < ?")
+        params.append(f"{year_to + 1:04d}-01-01")
+    return clauses, params
+
+
+@app.get("/dividends")
+@run_in_db_executor
+def get_dividends(
+    ticker: Optional[str] = None,
+    sector: Optional[str] = None,
+    year_from: Annotated[Optional[int], Query(ge=1900, le=9998)] = None,
+    year_to: Annotated[Optional[int], Query(ge=1900, le=9998)] = None,
+    group_by: str = "none",
+    sort: str = "-date",
+    limit: Annotated[Optional[int], Query(ge=1, le=MAX_PAGE_SIZE)] = None,
+    cursor: Optional[str] = None,
+):
+    """
+    Returns the dividends matching the filters: one page of raw records (or,
+    with group_by, one row per group), their summary, and the cached
+    whole-portfolio charts and rollups. ticker is a prefix; sort is date,
+    amount or ticker, '-' for descending. Pass limit, then each response's
+    next_cursor as cursor, to page.
+    """
+    if group_by != "none" and group_by not in DIVIDEND_GROUPS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of: none, {', '.join(DIVIDEND_GROUPS)}")
+    descending = sort.startswith("-")
+    sort_col = DIVIDEND_SORTS.get(sort.lstrip("-"))
+    if sort_col is None:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(DIVIDEND_SORTS)} (prefix '-' for descending)")
+
+    rollups = dividend_rollups.get() # an empty table gives empty rollups and a zero total
+    where, params = _dividend_filters(ticker, sector, year_from, year_to)
+    raw_data, groups, next_cursor = [], None, None
+    with db.read() as conn:
+        c = conn.cursor()
+        c.row_factory = dict_factory
+        if where:
+            c.execute(
+                f"SELECT COUNT(*) AS count, COALESCE(SUM(amount), 0.0) AS total_amount FROM dividends WHERE {' AND '.join(where)}",
+                params
+            )
+            summary = c.fetchone()
+        else:
+            summary = {"count": rollups["records"], "total_amount": rollups["total"]}
+
+        if group_by != "none":
+            if where:
+                key = DIVIDEND_GROUPS[group_by]
+                group_where = where + (["date_of_disbur != ''"] if group_by in ("year", "month") else [])
+                c.execute(f"""
+                    SELECT {key} AS {group_by}, SUM(amount) AS total_amount, COUNT(*) AS count
+                    FROM dividends
+                    WHERE {' AND '.join(group_where)}
+                    GROUP BY 1
+                    ORDER BY 1
+                """, params)
+                groups = c.fetchall()
+            else:
+                groups = rollups[group_by]
+        else:
+            page_where, page_params = list(where), list(params)
+            if cursor:
+                clause, clause_params = _keyset_clause(sort_col, descending, cursor)
+                page_where.append(clause)
+                page_params += clause_params
+            direction = "DESC" if descending else "ASC"
+            sql = "SELECT * FROM dividends"
+            if page_where:
+                sql += f" WHERE {' AND '.join(page_where)}"
+            sql += f" ORDER BY {sort_col} {direction}, id {direction}"
+            if limit:
+                sql += " LIMIT ?"
+                page_params.append(limit + 1) # one extra row tells us whether a next page exists
+            c.execute(sql, page_params)
+            rows = c.fetchall()
+            if limit and len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_cursor(rows[-1][sort_col], rows[-1]['id'])
+            raw_data = [_dividend_record(row) for row in rows]
+
+    chart_data = [r for r in rollups["ticker"] if r["ticker"].upper() != "HISTDIVIDENDS"]
+    response = {
+        "raw_data": raw_data,
+        "next_cursor": next_cursor,
+        "summary": {"count": summary["count"], "total_amount": round(summary["total_amount"], 2)},
+        "chart_data": sorted(chart_data, key=lambda x: x['total_amount'], reverse=True),
+        "total_dividend_earned": round(rollups["total"], 2),
+        "dividends_by_year": rollups["year"],
+        "rollups": {name: rollups[name] for name in DIVIDEND_ROLLUP_KEYS},
+    }
+    if groups is not None:
+        response["groups"] = groups
+    return response
+
 @app.post("/reload-dividends-data")
-async def reload_dividends_data():
-    """Endpoint to manually trigger a reload of dividend Excel data."""
-    load_dividends_data()
-    return {"status": "Dividend data reloaded successfully"}
+async def reload_dividends_data(force: bool = False):
+    """Endpoint to manually trigger an import of the dividend Excel data."""
+    summary = await run_in_executor(_excel_executor, load_dividends_data, force)
+    if summary is None:
+        raise HTTPException(status_code=500, detail="Failed to reload dividend data. Check the server log.")
+    return {"status": "Dividend data reloaded successfully", "changes": summary}
+
+
+@app.get("/holdings/check")
+@run_in_db_executor
+def get_holdings_check():
+    """Compares the holdings table with a fresh aggregate of positions."""
+    with db.read() as conn:
+        mismatches = check_holdings(conn)
+    return {"consistent": not mismatches, "mismatches": mismatches}
+
+
+@app.post("/holdings/rebuild")
+@run_in_db_executor
+def post_holdings_rebuild():
+    """Recomputes the holdings table from positions."""
+    with db.write() as conn:
+        symbols = rebuild_holdings(conn)
+    print(f"post_holdings_rebuild: Rebuilt holdings for {symbols} symbols.")
+    return {"status": "holdings rebuilt", "symbols": symbols}
+
+
+@app.get("/engine/check")
+@run_in_db_executor
+def get_engine_check():
+    """Compares the in-memory lot books with the open lots in SQLite."""
+    engine.ensure_current() # books behind another process's commits are stale, not wrong
+    with db.read() as conn:
+        mismatches = engine.verify(conn)
+    return {"consistent": not mismatches, "mismatches": mismatches, **engine.stats()}
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Returns internal performance counters."""
+    return {
+        "db_pool": db.metrics(),
+        "data_version": data_version.current()[1],
+        "stream": broadcaster.stats(),
+        "live_index_cache": live_index_cache.stats(),
+        "analytics_cache": analytics_cache.stats(),
+        "dividend_rollups": dividend_rollups.stats(),
+    }
 
 
 # --- Run ---
+# `python main.py rebuild-index [--dry-run]` recomputes the snapshot index without starting the server.
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    if sys.argv[1:2] == ["rebuild-index"]:
+        with db.write() as conn:
+            print(rebuild_portfolio_index(conn, dry_run="--dry-run" in sys.argv[2:]))
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
 
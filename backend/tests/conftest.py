@@ -0,0 +1,41 @@
+# File: conftest.py
+#
+# main.py opens portfolio.db in the working directory when it is imported, so
+# the tests import it from a throwaway directory; the real database is never
+# touched. The workbooks are absent there, so the app starts with empty tables.
+
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="session")
+def main(tmp_path_factory):
+    """The backend module, imported against an empty database in a temp directory."""
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("backend"))
+    sys.path.insert(0, BACKEND_DIR)
+    try:
+        import main as backend
+        yield backend
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture()
+def client(main):
+    from fastapi.testclient import TestClient
+
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture()
+def empty_positions(main):
+    """Clears the ledger and the lot books before a test."""
+    with main.db.write() as conn:
+        conn.execute("DELETE FROM positions")
+        main.engine.rebuild(conn)
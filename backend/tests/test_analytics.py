@@ -0,0 +1,73 @@
+# File: test_analytics.py
+
+LOTS = [
+    # symbol, sector, account, buy_date, buy_price, qty, current_price, pos_age, tvm
+    ("AAA", "Energy", "Zerodha", "2024-01-02", 100.0, 10, 110.0, "30", 12.0),
+    ("AAA", "Energy", "Zerodha", "2024-03-01", 120.0, 5, 110.0, "5", 1.0),
+    ("BBB", "Banking", "ICICI", "2023-06-01", 50.0, 20, 40.0, "150", 6.0),
+    ("CCC", "Energy", "ICICI", "2022-01-01", 10.0, 100, 12.5, "700", 0.5),
+    ("DDD", "", "", "2024-05-01", 200.0, 1, 180.0, "", -3.0),
+    ("EEE", "IT", "Zerodha", "2024-05-01", 20.0, 3, 30.0, "-4", None),
+]
+CLOSED = [
+    # symbol, sector, sell_date, total_pnl
+    ("AAA", "Energy", "2024-02-01", 40.0),
+    ("AAA", "Energy", "2024-04-01", -15.5),
+    ("ZZZ", "Pharma", "2024-04-02", 7.25),
+]
+
+
+def _seed(main):
+    with main.db.write() as conn:
+        conn.executemany("""
+            INSERT INTO positions (ticker, symbol, sector, account, buy_date, buy_price, qty, type,
+                                   current_price, market_value, pos_age, tvm, daily_change, daily_pnl, tradevalue)
+            VALUES ('', ?, ?, ?, ?, ?, ?, 'BUY', ?, ? * ?, ?, ?, 0.0, 0.0, ? * ?)
+        """, [
+            (symbol, sector, account, buy_date, buy_price, qty, price, price, qty, age, tvm, buy_price, qty)
+            for symbol, sector, account, buy_date, buy_price, qty, price, age, tvm in LOTS
+        ])
+        conn.executemany("""
+            INSERT INTO positions (ticker, symbol, sector, buy_date, sell_date, buy_price, sell_price, qty, type, total_pnl)
+            VALUES ('', ?, ?, '2024-01-01', ?, 1.0, 1.0, 0, 'SELL', ?)
+        """, CLOSED)
+        main.engine.rebuild(conn)
+
+
+def _as_dict(entries):
+    return {entry["name"]: entry["value"] for entry in entries}
+
+
+def test_analytics_buckets_and_totals(main, client, empty_positions):
+    _seed(main)
+
+    response = client.get("/analytics")
+    assert response.status_code == 200
+    analytics = response.json()
+
+    # Market value is the first lot's price times the symbol's open quantity.
+    assert _as_dict(analytics["sector_market_value"]) == {
+        "Banking": 800.0, "Energy": 1650.0 + 1250.0, "IT": 90.0, "Uncategorized": 180.0,
+    }
+    assert _as_dict(analytics["account_market_value"]) == {
+        "ICICI": 800.0 + 1250.0, "Uncategorized": 180.0, "Zerodha": 1650.0 + 90.0,
+    }
+    # Age and TVM come from each symbol's first lot.
+    assert analytics["position_age"] == [
+        {"name": "<= 90 Days", "value": 1},
+        {"name": "91-180 Days", "value": 1},
+        {"name": "> 365 Days", "value": 1},
+        {"name": "Unknown/Invalid Age", "value": 2},
+    ]
+    assert _as_dict(analytics["tvm_grades"]) == {"Excellent": 1, "Good": 1, "Poor": 3}
+    assert {entry["symbol"]: entry["pnl"] for entry in analytics["open_pnl"]} == {
+        "AAA": 1650.0 - 1600.0, "BBB": -200.0, "CCC": 250.0, "DDD": -20.0, "EEE": 30.0,
+    }
+    assert analytics["closed_pnl"] == [{"symbol": "AAA", "pnl": 24.5}, {"symbol": "ZZZ", "pnl": 7.25}]
+    assert _as_dict(analytics["closed_sector_pnl"]) == {"Energy": 24.5, "Pharma": 7.25}
+
+
+def test_analytics_with_no_positions(main, client, empty_positions):
+    analytics = client.get("/analytics").json()
+    assert analytics["open_pnl"] == [] and analytics["closed_pnl"] == []
+    assert analytics["position_age"] == [] and analytics["sector_market_value"] == []
@@ -0,0 +1,104 @@
+# File: test_bulk_import.py
+
+import json
+
+import pytest
+
+
+def _import(client, body, content_type="application/json"):
+    if not isinstance(body, (str, bytes)):
+        body = json.dumps(body)
+    res = client.post("/positions/bulk", content=body, headers={"Content-Type": content_type})
+    assert res.status_code == 200, res.text
+    return res.json()
+
+
+def _errors(summary):
+    return {error["row"]: error["errors"] for error in summary["errors"]}
+
+
+def _open_qty(main, symbol):
+    with main.db.read() as conn:
+        return conn.execute(
+            "SELECT COALESCE(SUM(qty), 0) FROM positions WHERE symbol = ? AND type = 'BUY'", (symbol,)
+        ).fetchone()[0]
+
+
+def test_valid_rows_are_inserted_and_invalid_rows_reported(main, client, empty_positions):
+    summary = _import(client, [
+        {"symbol": "aaa", "buy_price": 10.456, "qty": 3, "buy_date": "2024-01-02"},
+        {"symbol": "A-B", "buy_price": 1, "qty": 1},
+        {"symbol": "BBB", "qty": 1},
+        {"symbol": "CCC", "buy_price": "abc", "qty": 1, "buy_date": "02/01/2024"},
+        {"symbol": "DDD", "buy_price": "5", "qty": "4"},
+    ])
+
+    assert (summary["received"], summary["inserted"], summary["rejected"]) == (5, 2, 3)
+    assert _errors(summary) == {
+        1: ["symbol must be alphanumeric"],
+        2: ["buy_price is required"],
+        3: ["buy_price must be a number", "buy_date must be a YYYY-MM-DD date"],
+    }
+    assert _open_qty(main, "AAA") == 3
+    assert _open_qty(main, "DDD") == 4
+    assert main.engine.totals("AAA") == (3, pytest.approx(31.38))
+    assert client.get("/engine/check").json()["consistent"]
+
+
+def test_qty_must_be_an_integral_in_range_number(main, client, empty_positions):
+    summary = _import(client, [
+        {"symbol": "QTY", "buy_price": 1, "qty": 1e30},
+        {"symbol": "QTY", "buy_price": 1, "qty": 10**30},
+        {"symbol": "QTY", "buy_price": 1, "qty": True},
+        {"symbol": "QTY", "buy_price": 1, "qty": 2.5},
+        {"symbol": "QTY", "buy_price": False, "qty": 2},
+        {"symbol": "QTY", "buy_price": 1, "qty": "inf"},
+        {"symbol": "QTY", "buy_price": 1, "qty": 7.0},
+    ])
+
+    out_of_range = [f"qty must be between -{main.BULK_MAX_QTY} and {main.BULK_MAX_QTY}"]
+    assert _errors(summary) == {
+        0: out_of_range,
+        1: out_of_range,
+        2: ["qty must be a number"],
+        3: ["qty must be a whole number"],
+        4: ["buy_price must be a number"],
+        5: ["qty must be a number"],
+    }
+    assert _open_qty(main, "QTY") == 7
+
+
+def test_malformed_ndjson_lines_are_rejected_on_their_own(main, client, empty_positions):
+    body = "\n".join([
+        '{"symbol": "NDJ", "buy_price": 1, "qty": 1}',
+        '{"symbol": "NDJ", "buy_price": 1,',
+        "",
+        "[1, 2]",
+        '{"symbol": "NDJ", "buy_price": 1, "qty": 2}',
+    ])
+    summary = _import(client, body, "application/x-ndjson")
+
+    errors = _errors(summary)
+    assert (summary["received"], summary["inserted"]) == (4, 2)
+    # Rows count the trades in the body; blank lines are not trades.
+    assert sorted(errors) == [1, 2]
+    assert errors[1][0].startswith("not valid JSON")
+    assert errors[2] == ["trade must be a JSON object"]
+    assert _open_qty(main, "NDJ") == 3
+
+
+def test_csv_body(main, client, empty_positions):
+    body = "symbol,buy_price,qty,buy_date,note\nCSV,12.5,4,2024-03-01,\"a, b\"\nCSV,12.5,1e30,,\n"
+    summary = _import(client, body, "text/csv")
+
+    assert (summary["inserted"], summary["rejected"]) == (1, 1)
+    with main.db.read() as conn:
+        assert conn.execute("SELECT qty, note, tradevalue FROM positions WHERE symbol = 'CSV'").fetchall() == [
+            (4, "a, b", 50.0),
+        ]
+
+
+def test_unparseable_bodies_and_content_types(client, empty_positions):
+    assert client.post("/positions/bulk", content="[{", headers={"Content-Type": "application/json"}).status_code == 400
+    assert client.post("/positions/bulk", content="{}", headers={"Content-Type": "application/json"}).status_code == 400
+    assert client.post("/positions/bulk", content="x", headers={"Content-Type": "text/plain"}).status_code == 415
@@ -0,0 +1,123 @@
+# File: test_changes.py
+
+import random
+
+
+def _add_lot(client, symbol, qty, buy_price, buy_date="2024-01-02"):
+    response = client.post("/positions", json={
+        "symbol": symbol, "qty": qty, "buy_price": buy_price, "buy_date": buy_date, "type": "BUY",
+    })
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def _latest_seq(client):
+    feed = {"next": 0, "has_more": True}
+    while feed["has_more"]:
+        feed = client.get("/changes", params={"since": feed["next"]}).json()
+    return feed["next"]
+
+
+def _pull(client, since, limit):
+    """Every change after since, following has_more; returns (changes, next)."""
+    changes = []
+    while True:
+        feed = client.get("/changes", params={"since": since, "limit": limit}).json()
+        assert not feed["reset"]
+        changes += feed["changes"]
+        since = feed["next"]
+        if not feed["has_more"]:
+            return changes, since
+
+
+def _apply(replica, changes):
+    for change in changes:
+        if change["table"] != "positions":
+            continue
+        if change["op"] == "delete":
+            replica.pop(change["key"], None)
+        else:
+            replica[change["key"]] = change["row"]
+
+
+def test_one_entry_per_row_with_its_latest_change(main, client, empty_positions):
+    since = _latest_seq(client)
+    kept = _add_lot(client, "CHG", 5, 10.0)
+    edited = _add_lot(client, "CHG", 3, 11.0)
+    gone = _add_lot(client, "CHG", 1, 12.0)
+    client.put(f"/positions/{edited}", json={"symbol": "CHG", "qty": 4, "buy_price": 11.0, "type": "BUY"})
+    with main.db.write() as conn:
+        conn.execute("DELETE FROM positions WHERE id = ?", (gone,))
+        main.engine.rebuild(conn)
+
+    feed = client.get("/changes", params={"since": since}).json()
+    entries = [(change["key"], change["op"]) for change in feed["changes"] if change["table"] == "positions"]
+    assert entries == [(kept, "insert"), (edited, "update"), (gone, "delete")]
+    rows = {change["key"]: change["row"] for change in feed["changes"]}
+    assert rows[edited]["qty"] == 4
+    assert rows[gone] is None
+    assert client.get("/changes", params={"since": feed["next"]}).json()["changes"] == []
+
+
+def test_replaying_the_feed_reproduces_the_ledger(main, client, empty_positions):
+    """A client holding a copy of /trades stays equal to it by applying the feed alone."""
+    rng = random.Random(3)
+    for i in range(6):
+        _add_lot(client, rng.choice(["AAA", "BBB"]), rng.randint(2, 9), 10.0 + i, f"2024-01-{i + 1:02d}")
+    replica = {row["id"]: row for row in client.get("/trades").json()}
+    since = _latest_seq(client)
+
+    for step in range(40):
+        action = rng.choice(["add", "edit", "sell", "prices", "delete"])
+        ids = [row["id"] for row in client.get("/trades").json() if row["type"] == "BUY" and row["qty"] > 0]
+        if action == "add" or not ids:
+            _add_lot(client, rng.choice(["AAA", "BBB", "CCC"]), rng.randint(1, 9), rng.uniform(5, 50))
+        elif action == "edit":
+            lot_id = rng.choice(ids)
+            client.put(f"/positions/{lot_id}", json={
+                "symbol": rng.choice(["AAA", "BBB"]), "qty": rng.randint(1, 9), "buy_price": 20.0, "type": "BUY",
+            })
+        elif action == "sell":
+            symbol = rng.choice(["AAA", "BBB", "CCC"])
+            qty = main.engine.totals(symbol)[0]
+            if qty:
+                client.post("/sell_trade", json={
+                    "symbol": symbol, "qty": rng.randint(1, qty), "sell_date": "2025-01-02", "sell_price": 30.0,
+                })
+        elif action == "prices":
+            client.post("/prices", json=[{"symbol": "AAA", "price": round(rng.uniform(5, 50), 2)}])
+        else:
+            with main.db.write() as conn:
+                conn.execute("DELETE FROM positions WHERE id = ?", (rng.choice(ids),))
+                main.engine.rebuild(conn)
+
+        if step % 7 == 0:
+            changes, since = _pull(client, since, limit=3)
+            _apply(replica, changes)
+
+    changes, since = _pull(client, since, limit=3)
+    _apply(replica, changes)
+    assert replica == {row["id"]: row for row in client.get("/trades").json()}
+
+
+def test_pages_split_on_limit_and_resume_at_next(main, client, empty_positions):
+    since = _latest_seq(client)
+    ids = [_add_lot(client, "PAGE", 1, 1.0) for _ in range(5)]
+
+    first = client.get("/changes", params={"since": since, "limit": 2}).json()
+    assert first["has_more"]
+    assert [change["key"] for change in first["changes"]] == ids[:2]
+    changes, _ = _pull(client, first["next"], limit=2)
+    assert [change["key"] for change in changes] == ids[2:]
+
+
+def test_since_before_the_compacted_log_asks_for_a_refetch(main, client, empty_positions):
+    since = _latest_seq(client)
+    _add_lot(client, "OLD", 1, 1.0)
+    with main.db.write() as conn:
+        conn.execute("UPDATE change_log SET changed_at = '2000-01-01T00:00:00' WHERE seq > ?", (since,))
+    assert client.post("/changes/compact", params={"retention_days": 30}).json()["deleted"] >= 1
+
+    feed = client.get("/changes", params={"since": since}).json()
+    assert feed["reset"] and feed["changes"] == []
+    assert client.get("/changes", params={"since": feed["next"]}).json()["reset"] is False
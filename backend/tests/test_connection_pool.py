@@ -0,0 +1,110 @@
+# File: test_connection_pool.py
+
+import sqlite3
+import threading
+
+import pytest
+
+
+@pytest.fixture()
+def pool(main, tmp_path, monkeypatch):
+    """A ConnectionPool over a scratch database with a deferred foreign key."""
+    monkeypatch.setattr(main, "SQLITE_PRAGMAS", main.SQLITE_PRAGMAS + ["PRAGMA foreign_keys = ON"])
+    db_path = tmp_path / "pool.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE parent (id INTEGER PRIMARY KEY)")
+        conn.execute("""
+            CREATE TABLE child (
+                id INTEGER PRIMARY KEY,
+                parent_id INTEGER REFERENCES parent (id) DEFERRABLE INITIALLY DEFERRED
+            )
+        """)
+    commits = []
+    pool = main.ConnectionPool(
+        str(db_path),
+        before_commit=lambda conn: conn.execute("SELECT COUNT(*) FROM parent").fetchone()[0],
+        on_commit=commits.append,
+    )
+    pool.commits = commits
+    return pool
+
+
+def _count(pool, table):
+    with pool.read() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_write_commits_and_reports_only_changing_transactions(pool):
+    with pool.write() as conn:
+        conn.execute("INSERT INTO parent (id) VALUES (1)")
+    with pool.write() as conn:
+        conn.execute("SELECT COUNT(*) FROM parent")
+    with pool.write() as conn:
+        conn.execute("INSERT INTO parent (id) VALUES (2)")
+
+    assert _count(pool, "parent") == 2
+    # before_commit ran inside each changing transaction and saw its rows.
+    assert pool.commits == [1, 2]
+
+
+def test_failing_before_commit_rolls_back(pool):
+    pool.before_commit = lambda conn: conn.execute("INSERT INTO parent (id) VALUES (1)")
+    with pytest.raises(sqlite3.IntegrityError):
+        with pool.write() as conn:
+            conn.execute("INSERT INTO parent (id) VALUES (1)")
+
+    assert _count(pool, "parent") == 0
+    assert pool.commits == []
+
+
+def test_on_begin_runs_inside_the_transaction(pool):
+    pool.on_begin = lambda conn: pool.commits.append(("begin", conn.in_transaction))
+    with pool.write() as conn:
+        pass
+
+    assert pool.commits == [("begin", True)]
+
+
+def test_write_rolls_back_on_error(pool):
+    with pytest.raises(RuntimeError):
+        with pool.write() as conn:
+            conn.execute("INSERT INTO parent (id) VALUES (1)")
+            raise RuntimeError("boom")
+
+    assert _count(pool, "parent") == 0
+    assert pool.commits == []
+
+
+def test_failed_commit_does_not_leave_the_writer_in_a_transaction(pool):
+    # The deferred foreign key is only checked at COMMIT, which then fails
+    # with the transaction still open.
+    with pytest.raises(sqlite3.IntegrityError):
+        with pool.write() as conn:
+            conn.execute("INSERT INTO child (id, parent_id) VALUES (1, 99)")
+
+    with pool.write() as conn:
+        assert not conn.execute("SELECT COUNT(*) FROM child").fetchone()[0]
+        conn.execute("INSERT INTO parent (id) VALUES (99)")
+        conn.execute("INSERT INTO child (id, parent_id) VALUES (1, 99)")
+
+    assert _count(pool, "child") == 1
+    assert pool.commits == [1]
+
+
+def test_connections_are_persistent_per_thread_and_in_wal_mode(pool):
+    with pool.read() as first, pool.read() as second:
+        assert first is second
+        assert first.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    other = []
+
+    def read_on_other_thread():
+        with pool.read() as conn:
+            other.append(conn)
+
+    thread = threading.Thread(target=read_on_other_thread)
+    thread.start()
+    thread.join()
+    with pool.read() as conn:
+        assert other[0] is not conn
+    assert pool.metrics()["read"]["connections_opened"] == 2
@@ -0,0 +1,128 @@
+# File: test_data_version.py
+
+import sqlite3
+
+
+def _add_lot(client, symbol, qty, buy_price):
+    response = client.post("/positions", json={
+        "symbol": symbol, "qty": qty, "buy_price": buy_price, "buy_date": "2024-01-02", "type": "BUY",
+    })
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def _commit_elsewhere(main, sql, params=()):
+    """Writes the way another process using the database would: its own connection, bumping the shared version."""
+    conn = sqlite3.connect(main.db.db_name, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(sql, params)
+        main.DataVersion.bump(conn)
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+
+def _insert_lot_elsewhere(main, symbol, qty, buy_price, current_price):
+    _commit_elsewhere(main, """
+        INSERT INTO positions (ticker, symbol, sector, buy_date, buy_price, qty, type, current_price,
+                               market_value, daily_change, daily_pnl, account)
+        VALUES ('', ?, 'Energy', '2024-01-01', ?, ?, 'BUY', ?, ?, 0.0, 0.0, '')
+    """, (symbol, buy_price, qty, current_price, qty * current_price))
+
+
+def test_unchanged_data_answers_304(main, client, empty_positions):
+    _add_lot(client, "ETAG", 2, 10.0)
+    first = client.get("/positions")
+    etag = first.headers["ETag"]
+
+    again = client.get("/positions", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+    assert again.content == b""
+    # The version is shared by every path, so the tag also validates other reads.
+    assert client.get("/trades", headers={"If-None-Match": f'W/{etag}, "other"'}).status_code == 304
+
+
+def test_a_write_changes_the_etag(main, client, empty_positions):
+    _add_lot(client, "ETAG", 2, 10.0)
+    etag = client.get("/positions").headers["ETag"]
+
+    _add_lot(client, "ETAG", 3, 12.0)
+    after = client.get("/positions", headers={"If-None-Match": etag})
+    assert after.status_code == 200
+    assert after.headers["ETag"] != etag
+    assert after.json()[0]["totalQty"] == 5
+
+
+def test_a_transaction_without_changes_keeps_the_etag(main, client, empty_positions):
+    etag = client.get("/positions").headers["ETag"]
+    with main.db.write() as conn:
+        conn.execute("UPDATE positions SET note = 'x' WHERE id = -1")
+    assert client.get("/positions", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_the_version_is_stored_in_the_database(main, client, empty_positions):
+    _add_lot(client, "ETAG", 1, 1.0)
+    with main.db.read() as conn:
+        stored = main.DataVersion.read(conn)
+
+    assert main.data_version.refresh() == stored
+    assert client.get("/positions").headers["ETag"] == '"%s-%s"' % stored
+    # A process starting now serves the same tag.
+    assert main.DataVersion().refresh() == stored
+
+
+def test_another_process_writing_invalidates_etags_and_caches(main, client, empty_positions):
+    _add_lot(client, "LIVE", 10, 100.0)
+    client.post("/prices", json=[{"symbol": "LIVE", "price": 110.0, "prev_close": 110.0}])
+    etag = client.get("/calculate-live-index").headers["ETag"]
+    assert client.get("/calculate-live-index").json()["current_market_value"] == 1100.0
+    hits = main.live_index_cache.stats()["hits"]
+    assert client.get("/calculate-live-index").status_code == 200
+    assert main.live_index_cache.stats()["hits"] == hits + 1
+
+    _insert_lot_elsewhere(main, "LIVE", 5, 100.0, 110.0)
+
+    res = client.get("/calculate-live-index", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.headers["ETag"] != etag
+    assert res.json()["current_market_value"] == 1650.0
+    assert client.get("/analytics").json()["open_pnl"] == [{"symbol": "LIVE", "pnl": 150.0}]
+
+
+def test_engine_catches_up_with_another_process(main, client, empty_positions):
+    _add_lot(client, "ENG", 4, 10.0)
+    _insert_lot_elsewhere(main, "ENG", 6, 20.0, 20.0)
+
+    simulated = client.post("/simulate", json={"symbol": "ENG", "qty": 1, "buy_price": 30.0}).json()
+    assert simulated == {"simulated_avg_price": 17.27, "simulated_qty": 11}
+    assert client.get("/engine/check").json()["consistent"]
+
+
+def test_write_paths_catch_up_before_updating_the_engine(main, client, empty_positions):
+    _add_lot(client, "ENG", 4, 10.0)
+    _insert_lot_elsewhere(main, "ENG", 6, 20.0, 20.0)
+    stale_version = main.engine.version
+
+    # Written before any read caught the engine up: the write itself must.
+    _add_lot(client, "ENG", 1, 30.0)
+    assert main.engine.version != stale_version
+    assert main.engine.totals("ENG") == (11, 190.0)
+    assert client.post("/sell_trade", json={
+        "symbol": "ENG", "qty": 10, "sell_date": "2025-01-02", "sell_price": 25.0,
+    }).status_code == 200
+    assert main.engine.totals("ENG") == (1, 30.0)
+    assert client.get("/engine/check").json()["consistent"]
+
+
+def test_another_process_writing_changes_the_etag(main, client, empty_positions):
+    _add_lot(client, "ETAG", 2, 10.0)
+    etag = client.get("/trades").headers["ETag"]
+
+    _insert_lot_elsewhere(main, "ETAG", 5, 100.0, 110.0)
+
+    res = client.get("/trades", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.headers["ETag"] != etag
+    assert len(res.json()) == 2
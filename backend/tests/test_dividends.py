@@ -0,0 +1,176 @@
+# File: test_dividends.py
+
+import pandas as pd
+import pytest
+
+
+COLUMNS = ["Ticker", "Sector", "Date of Disbursment", "Qty", "Rs per Share ", "Amount"]
+ROWS = [
+    ["AAA", "Energy", "05-Jan-24", 10, 2.0, 20.0],
+    ["BBB", "Banking", "07-Feb-24", 5, 3.0, 15.0],
+    ["AAA", "Energy", "05-Jul-24", 10, 2.5, 25.0],
+    ["CCC", "IT", "11-Mar-23", 8, 1.5, 12.0],
+    ["DDD", "Pharma", "20-Sep-23", 4, 5.0, 20.0],
+]
+
+
+def _write_workbook(path, rows, columns=COLUMNS):
+    pd.DataFrame(rows, columns=columns).to_excel(path, index=False)
+
+
+def _stored(main):
+    with main.db.read() as conn:
+        return conn.execute(
+            "SELECT id, ticker, sector, date_of_disbur, qty, rs_per_share, amount FROM dividends ORDER BY id"
+        ).fetchall()
+
+
+@pytest.fixture()
+def dividends_workbook(main, tmp_path, monkeypatch):
+    """Points the importer at a workbook in tmp_path; returns a function that (re)writes and imports it."""
+    path = tmp_path / "dividends.xlsx"
+    monkeypatch.setattr(main, "DIVIDENDS_EXCEL_FILE", str(path))
+
+    def load(rows, columns=COLUMNS):
+        _write_workbook(path, rows, columns)
+        summary = main.load_dividends_data(force=True)
+        assert summary is not None
+        return summary
+
+    yield load
+    with main.db.write() as conn:
+        conn.execute("DELETE FROM dividends")
+    main.dividend_rollups.invalidate()
+
+
+def test_rollups_are_current_when_the_import_bumps_the_version(main, dividends_workbook):
+    dividends_workbook([["AAA", "Energy", "05-Jan-24", 10, 2.0, 20.0]])
+
+    # Whatever the request that sees the new ETag reads must be the new rollups.
+    seen = []
+    listener = lambda: seen.append(main.dividend_rollups.get()["records"])
+    main.data_version.listeners.append(listener)
+    try:
+        dividends_workbook([
+            ["AAA", "Energy", "05-Jan-24", 10, 2.0, 20.0],
+            ["BBB", "Banking", "07-Feb-24", 5, 3.0, 15.0],
+        ])
+    finally:
+        main.data_version.listeners.remove(listener)
+
+    assert seen == [2]
+
+
+def test_ticker_filter_is_a_case_insensitive_prefix(main, client, dividends_workbook):
+    dividends_workbook([
+        ["bbb", "Banking", "05-Jan-24", 10, 2.0, 20.0],
+        ["BBC", "Banking", "06-Jan-24", 1, 1.0, 1.0],
+        ["ABB", "Energy", "07-Jan-24", 5, 3.0, 15.0],
+    ])
+
+    for prefix in ("b", "B", " bB "):
+        body = client.get("/dividends", params={"ticker": prefix, "sort": "ticker"}).json()
+        assert [record["ticker"] for record in body["raw_data"]] == ["BBC", "bbb"]
+        assert body["summary"] == {"count": 2, "total_amount": 21.0}
+
+    with main.db.read() as conn:
+        where, params = main._dividend_filters("b", None, None, None)
+        plan = conn.execute("EXPLAIN QUERY PLAN SELECT id FROM dividends WHERE " + " AND ".join(where), params).fetchall()
+    assert "idx_dividends_ticker_upper" in plan[0][-1]
+
+
+def test_import_cleans_the_workbook_rows(main, client, dividends_workbook):
+    summary = dividends_workbook([
+        [" AAA ", "Energy ", "05-Jan-24", 10, "₹2", "₹1,020.50"],
+        ["BBB", None, "not a date", 5, 3.0, None],
+    ])
+    assert summary == {"inserted": 2, "deleted": 0, "unchanged": 0, "skipped": False}
+
+    assert [row[1:] for row in _stored(main)] == [
+        ("AAA", "Energy", "2024-01-05", 10, 2, 1020.5),
+        ("BBB", "", "", 5, 3, 0.0),
+    ]
+    raw = client.get("/dividends").json()["raw_data"]
+    # Newest first; the undated row sorts last.
+    assert [(record["ticker"], record["date_of_disbur"], record["qty"]) for record in raw] == [
+        ("AAA", "2024-01-05", 10), ("BBB", "", 5),
+    ]
+
+
+def test_extra_workbook_columns_come_back_in_raw_data(main, client, dividends_workbook):
+    dividends_workbook([row + ["interim"] for row in ROWS[:2]], columns=COLUMNS + ["Remarks"])
+    raw = client.get("/dividends", params={"sort": "ticker"}).json()["raw_data"]
+    assert [(record["ticker"], record["remarks"]) for record in raw] == [("AAA", "interim"), ("BBB", "interim")]
+    assert set(raw[0]) == {"ticker", "sector", "date_of_disbur", "qty", "rs_per_share", "amount", "remarks"}
+
+
+def test_reimport_applies_only_the_changed_rows(main, dividends_workbook):
+    dividends_workbook(ROWS)
+    before = {row[1:]: row[0] for row in _stored(main)}
+
+    edited = [list(row) for row in ROWS[:3]]
+    edited[1][5] = 16.0 # BBB's amount corrected; DDD and CCC dropped
+    summary = dividends_workbook(edited)
+    assert summary == {"inserted": 1, "deleted": 3, "unchanged": 2, "skipped": False}
+
+    after = {row[1:]: row[0] for row in _stored(main)}
+    assert len(after) == 3
+    # Unchanged rows keep their ids; only the edited one is new.
+    kept = {key: row_id for key, row_id in after.items() if key in before}
+    assert kept == {key: before[key] for key in kept} and len(kept) == 2
+    assert ("BBB", "Banking", "2024-02-07", 5, 3, 16.0) in after
+
+
+def test_identical_rows_are_kept_as_separate_dividends(main, client, dividends_workbook):
+    dividends_workbook([ROWS[0], ROWS[0]])
+    assert dividends_workbook([ROWS[0], ROWS[0], ROWS[0]])["inserted"] == 1
+    assert dividends_workbook([ROWS[0]])["deleted"] == 2
+    assert client.get("/dividends").json()["summary"] == {"count": 1, "total_amount": 20.0}
+
+
+def test_an_unchanged_workbook_is_skipped(main, dividends_workbook):
+    dividends_workbook(ROWS)
+    assert main.load_dividends_data() == {"inserted": 0, "deleted": 0, "unchanged": 0, "skipped": True}
+    assert main.load_dividends_data(force=True)["unchanged"] == len(ROWS)
+
+
+def test_a_missing_or_unreadable_workbook_keeps_the_table(main, client, dividends_workbook, tmp_path, monkeypatch):
+    dividends_workbook(ROWS)
+    stored = _stored(main)
+
+    monkeypatch.setattr(main, "DIVIDENDS_EXCEL_FILE", str(tmp_path / "absent.xlsx"))
+    assert main.load_dividends_data(force=True) is None
+    broken = tmp_path / "broken.xlsx"
+    broken.write_bytes(b"not a workbook")
+    monkeypatch.setattr(main, "DIVIDENDS_EXCEL_FILE", str(broken))
+    assert main.load_dividends_data(force=True) is None
+    assert client.post("/reload-dividends-data").status_code == 500
+
+    assert _stored(main) == stored
+
+
+def test_rollups_and_groups_follow_the_table(main, client, dividends_workbook):
+    dividends_workbook(ROWS)
+    body = client.get("/dividends", params={"group_by": "year"}).json()
+    assert body["summary"] == {"count": 5, "total_amount": 92.0}
+    assert body["groups"] == [
+        {"year": 2023, "total_amount": 32.0, "count": 2},
+        {"year": 2024, "total_amount": 60.0, "count": 3},
+    ]
+    filtered = client.get("/dividends", params={"group_by": "year", "ticker": "a"}).json()
+    assert filtered["groups"] == [{"year": 2024, "total_amount": 45.0, "count": 2}]
+    assert {row["ticker"]: row["total_amount"] for row in body["rollups"]["ticker"]} == {
+        "AAA": 45.0, "BBB": 15.0, "CCC": 12.0, "DDD": 20.0,
+    }
+
+
+def test_no_dividends_is_an_empty_payload(main, client, dividends_workbook):
+    body = client.get("/dividends").json()
+    assert body["raw_data"] == [] and body["next_cursor"] is None
+    assert body["summary"] == {"count": 0, "total_amount": 0.0}
+    assert body["total_dividend_earned"] == 0.0
+    assert body["chart_data"] == [] and body["dividends_by_year"] == []
+    assert all(rows == [] for rows in body["rollups"].values())
+    for group_by in ("ticker", "year"):
+        assert client.get("/dividends", params={"group_by": group_by}).json()["groups"] == []
+    assert client.get("/dividends", params={"group_by": "month", "ticker": "A"}).json()["groups"] == []
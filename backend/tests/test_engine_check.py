@@ -0,0 +1,77 @@
+# File: test_engine_check.py
+
+import random
+from datetime import date, timedelta
+
+SYMBOLS = ["AAA", "BBB", "CCC", "DDD"]
+
+
+def _open_qty(main, symbol):
+    with main.db.read() as conn:
+        return conn.execute(
+            "SELECT COALESCE(SUM(qty), 0) FROM positions WHERE symbol = ? AND sell_date IS NULL AND qty > 0 AND type = 'BUY'",
+            (symbol,),
+        ).fetchone()[0]
+
+
+def _open_lot_ids(main):
+    with main.db.read() as conn:
+        return [row[0] for row in conn.execute(main.OPEN_LOTS_SQL + " ORDER BY id")]
+
+
+def _trade(rng, symbol=None):
+    return {
+        "symbol": symbol or rng.choice(SYMBOLS),
+        "buy_price": round(rng.uniform(10, 500), 2),
+        "qty": rng.randint(1, 50),
+        "sector": "Energy",
+        "buy_date": (date(2023, 1, 1) + timedelta(days=rng.randint(0, 700))).isoformat(),
+        "type": "BUY",
+    }
+
+
+def _assert_consistent(client):
+    check = client.get("/engine/check").json()
+    assert check["mismatches"] == []
+    assert check["consistent"]
+
+
+def test_engine_matches_sql_after_random_trades(main, client, empty_positions):
+    """A random mix of buys, FIFO sells and lot edits leaves the engine identical to SQLite."""
+    rng = random.Random(11)
+    sell_date = date(2025, 1, 1)
+
+    for step in range(400):
+        action = rng.choices(["buy", "sell", "edit", "oversell"], weights=[4, 4, 2, 1])[0]
+        if action == "buy":
+            assert client.post("/positions", json=_trade(rng)).status_code == 200
+        elif action == "sell":
+            symbol = rng.choice(SYMBOLS)
+            held = _open_qty(main, symbol)
+            response = client.post("/sell_trade", json={
+                "symbol": symbol, "qty": rng.randint(1, held) if held else 1,
+                "sell_date": sell_date.isoformat(), "sell_price": round(rng.uniform(10, 500), 2),
+            })
+            assert response.status_code == (200 if held else 404)
+        elif action == "edit":
+            lot_ids = _open_lot_ids(main)
+            if lot_ids:
+                # Edits may change the symbol, date, price or quantity, or close the lot outright.
+                trade = _trade(rng)
+                if rng.random() < 0.2:
+                    trade["qty"] = 0
+                response = client.put(f"/positions/{rng.choice(lot_ids)}", json=trade)
+                assert response.status_code == 200
+        else:
+            symbol = rng.choice(SYMBOLS)
+            response = client.post("/sell_trade", json={
+                "symbol": symbol, "qty": _open_qty(main, symbol) + 1,
+                "sell_date": sell_date.isoformat(), "sell_price": 100.0,
+            })
+            assert response.status_code in (400, 404)
+
+        if step % 25 == 0:
+            _assert_consistent(client)
+
+    _assert_consistent(client)
+    assert client.get("/engine/check").json()["lots"] == len(_open_lot_ids(main))
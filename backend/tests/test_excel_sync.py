@@ -0,0 +1,146 @@
+# File: test_excel_sync.py
+
+import os
+
+import pandas as pd
+import pytest
+
+LOTS = [
+    # Symbol, Buy Date, Avg Price, Qty, Current Price
+    ("AAA", "2024-01-02", 100.0, 10, 110.0),
+    ("BBB", "2024-01-03", 50.0, 5, 55.0),
+    ("BBB", "2024-02-01", 52.0, 4, 55.0),
+    ("CCC", "2024-03-04", 20.0, 8, 18.0),
+]
+
+
+def write_positions_workbook(path, lots):
+    pd.DataFrame({
+        "Symbol": [lot[0] for lot in lots],
+        "Ticker": "",
+        "Sector": "Energy",
+        "Buy Date": pd.to_datetime([lot[1] for lot in lots]),
+        "Avg Price": [f"₹{lot[2]:,.2f}" for lot in lots],
+        "Qty": [lot[3] for lot in lots],
+        "Current Price": [f"₹{lot[4]:,.2f}" for lot in lots],
+        "Daily Change": 1.0,
+        "Daily PnL": [lot[3] * 1.0 for lot in lots],
+        "Tradevalue": [lot[2] * lot[3] for lot in lots],
+        "Market Value": [lot[4] * lot[3] for lot in lots],
+        "Account": "Zerodha",
+        "Type": "BUY",
+    }).to_excel(path, index=False)
+
+
+@pytest.fixture()
+def positions_workbook(main, tmp_path, monkeypatch, empty_positions):
+    path = tmp_path / "positions.xlsx"
+    monkeypatch.setattr(main, "POSITIONS_EXCEL_FILE", str(path))
+    write_positions_workbook(path, LOTS)
+    return path
+
+
+def _ledger(main):
+    """Every positions row except its id and sync bookkeeping, in a stable order."""
+    columns = ", ".join(main.EXCEL_SYNC_COLUMNS)
+    with main.db.read() as conn:
+        return conn.execute(f"SELECT {columns} FROM positions ORDER BY symbol, type, buy_date, qty").fetchall()
+
+
+def _lot_id(main, symbol, buy_date):
+    with main.db.read() as conn:
+        return conn.execute(
+            "SELECT id FROM positions WHERE symbol = ? AND buy_date = ? AND type = 'BUY'", (symbol, buy_date)
+        ).fetchone()[0]
+
+
+def test_incremental_sync_applies_only_changed_rows(main, positions_workbook):
+    assert main.load_raw_excel_data_into_db(force=True)["inserted"] == len(LOTS)
+    ids = {lot[0] + lot[1]: _lot_id(main, lot[0], lot[1]) for lot in LOTS}
+
+    changed = [LOTS[0], ("BBB", "2024-01-03", 50.0, 6, 55.0), LOTS[3], ("DDD", "2024-04-01", 9.0, 1, 9.5)]
+    write_positions_workbook(positions_workbook, changed)
+    summary = main.load_raw_excel_data_into_db()
+
+    assert {k: summary[k] for k in ("inserted", "updated", "deleted", "unchanged")} == {
+        "inserted": 1, "updated": 1, "deleted": 1, "unchanged": 2,
+    }
+    # Matched rows keep their ids.
+    assert _lot_id(main, "AAA", "2024-01-02") == ids["AAA2024-01-02"]
+    assert _lot_id(main, "BBB", "2024-01-03") == ids["BBB2024-01-03"]
+    assert main.load_raw_excel_data_into_db()["skipped"]
+
+
+def test_incremental_and_full_agree_after_edits_sells_and_ticks(main, client, positions_workbook):
+    main.load_raw_excel_data_into_db(force=True)
+
+    assert client.post("/sell_trade", json={
+        "symbol": "BBB", "qty": 2, "sell_date": "2025-01-02", "sell_price": 60.0,
+    }).status_code == 200
+    assert client.put(f"/positions/{_lot_id(main, 'CCC', '2024-03-04')}", json={
+        "symbol": "CCC", "qty": 3, "buy_price": 20.0, "buy_date": "2024-03-04", "type": "BUY", "sector": "Energy",
+    }).status_code == 200
+    client.post("/prices", json=[{"symbol": "AAA", "price": 123.0, "prev_close": 120.0}])
+
+    incremental = main.load_raw_excel_data_into_db(force=True)
+    assert incremental["updated"] == 3
+    after_incremental = _ledger(main)
+
+    main.load_raw_excel_data_into_db(mode="full")
+    assert _ledger(main) == after_incremental
+    assert client.get("/engine/check").json()["consistent"]
+
+
+def test_unchanged_workbook_is_neither_hashed_nor_parsed(main, positions_workbook, monkeypatch):
+    main.load_raw_excel_data_into_db(force=True)
+    hashed = []
+    monkeypatch.setattr(main, "_hash_file", lambda path: hashed.append(path) or "never")
+
+    assert main.load_raw_excel_data_into_db()["skipped"]
+    assert hashed == []
+
+
+def test_touched_workbook_is_hashed_but_not_parsed(main, positions_workbook, monkeypatch):
+    main.load_raw_excel_data_into_db(force=True)
+    stat = positions_workbook.stat()
+    os.utime(positions_workbook, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    hash_file = main._hash_file
+    hashed = []
+    monkeypatch.setattr(main, "_hash_file", lambda path: hashed.append(path) or hash_file(path))
+    monkeypatch.setattr(main, "read_excel_cached", lambda *args: pytest.fail("re-parsed a byte-identical workbook"))
+
+    assert main.load_raw_excel_data_into_db()["skipped"]
+    assert main.load_raw_excel_data_into_db()["skipped"]
+    # The new mtime is recorded, so only the first load hashed the file.
+    assert hashed == [str(positions_workbook)]
+
+
+def test_edited_workbook_is_reloaded(main, positions_workbook):
+    main.load_raw_excel_data_into_db(force=True)
+    write_positions_workbook(positions_workbook, LOTS[:2])
+
+    summary = main.load_raw_excel_data_into_db()
+    assert not summary["skipped"]
+    assert summary["deleted"] == 2
+    assert main.load_raw_excel_data_into_db(mode="full")["skipped"] is False
+
+
+def test_sidecar_is_parquet_or_nothing(main, positions_workbook, monkeypatch):
+    fingerprint, _ = main.source_fingerprint(str(positions_workbook))
+    # A pickle planted under the old sidecar name must never be loaded.
+    os.makedirs(main.EXCEL_CACHE_DIR, exist_ok=True)
+    planted = main._sidecar_path(str(positions_workbook), fingerprint["sha256"]).replace(".parquet", ".pkl")
+    pd.DataFrame({"symbol": ["EVIL"]}).to_pickle(planted)
+    parsed = []
+    parse = main._parse_positions_workbook
+    monkeypatch.setattr(main, "_parse_positions_workbook", lambda path: parsed.append(path) or parse(path))
+
+    df = main.read_excel_cached(str(positions_workbook), fingerprint, main._parse_positions_workbook)
+    assert sorted(df["symbol"]) == ["AAA", "BBB", "BBB", "CCC"]
+    main.read_excel_cached(str(positions_workbook), fingerprint, main._parse_positions_workbook)
+
+    if main.SIDECAR_ENABLED:
+        assert len(parsed) == 1
+        assert os.path.exists(main._sidecar_path(str(positions_workbook), fingerprint["sha256"]))
+    else:
+        assert len(parsed) == 2
@@ -0,0 +1,78 @@
+# File: test_excel_watcher.py
+
+import types
+
+import pytest
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture()
+def watched(main, tmp_path, monkeypatch):
+    """A watcher over one file, with a fake clock and the reloads recorded instead of run."""
+    path = tmp_path / "book.xlsx"
+    path.write_bytes(b"v1")
+    clock = Clock()
+    submitted = []
+    monkeypatch.setattr(main, "time", types.SimpleNamespace(monotonic=clock.monotonic))
+    monkeypatch.setattr(main, "_excel_executor", types.SimpleNamespace(submit=submitted.append))
+    loader = object()
+    watcher = main.ExcelWatcher([(lambda: str(path), loader)], debounce=5.0)
+    watcher.poll() # first sight of the file only records it
+    return types.SimpleNamespace(watcher=watcher, path=path, clock=clock, submitted=submitted, loader=loader)
+
+
+def test_watcher_reloads_once_after_change_settles(watched):
+    watched.path.write_bytes(b"v2 is longer")
+    watched.watcher.poll()
+    watched.clock.now += 4.9
+    watched.watcher.poll()
+    assert watched.submitted == []
+
+    watched.clock.now += 0.1
+    watched.watcher.poll()
+    watched.clock.now += 60
+    watched.watcher.poll()
+    assert watched.submitted == [watched.loader]
+
+
+def test_watcher_debounce_restarts_on_every_write(watched):
+    watched.path.write_bytes(b"partial")
+    watched.watcher.poll()
+    watched.clock.now += 4
+    watched.path.write_bytes(b"partial, then complete")
+    watched.watcher.poll()
+    watched.clock.now += 4
+    watched.watcher.poll()
+    assert watched.submitted == []
+
+    watched.clock.now += 1
+    watched.watcher.poll()
+    assert watched.submitted == [watched.loader]
+
+
+def test_watcher_waits_while_file_is_missing(watched):
+    watched.path.unlink() # OneDrive replaces a file by delete + rename
+    watched.watcher.poll()
+    watched.clock.now += 30
+    watched.watcher.poll()
+    assert watched.submitted == []
+
+    watched.path.write_bytes(b"v2 is back")
+    watched.watcher.poll()
+    watched.clock.now += 5
+    watched.watcher.poll()
+    assert watched.submitted == [watched.loader]
+
+
+def test_watcher_ignores_untouched_files(watched):
+    for _ in range(3):
+        watched.clock.now += 10
+        watched.watcher.poll()
+    assert watched.submitted == []
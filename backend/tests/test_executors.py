@@ -0,0 +1,53 @@
+# File: test_executors.py
+
+import asyncio
+import threading
+
+import httpx
+
+
+def test_db_routes_run_on_the_db_executor(main, client, monkeypatch):
+    threads = []
+    aggregate = main.aggregate_open_positions
+
+    def recording_aggregate(conn):
+        threads.append(threading.current_thread().name)
+        return aggregate(conn)
+
+    monkeypatch.setattr(main, "aggregate_open_positions", recording_aggregate)
+    assert client.get("/positions").status_code == 200
+    assert threads and threads[0].startswith("db")
+
+
+def test_event_loop_keeps_serving_during_a_reload(main, monkeypatch):
+    """A reload blocked in the Excel executor does not hold up other requests."""
+    release = threading.Event()
+    reload_threads = []
+
+    def blocking_reload(mode="incremental", force=False):
+        reload_threads.append(threading.current_thread().name)
+        release.wait(10)
+        return {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0, "skipped": False}
+
+    monkeypatch.setattr(main, "load_raw_excel_data_into_db", blocking_reload)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            reload = asyncio.create_task(http.post("/reload-excel-data"))
+            while not reload_threads:
+                await asyncio.sleep(0.01)
+            # The reload is still parked; these must complete regardless.
+            realised = await asyncio.wait_for(http.get("/realised"), timeout=5)
+            trades = await asyncio.wait_for(http.get("/trades", params={"limit": 1}), timeout=5)
+            assert not reload.done()
+            release.set()
+            return realised, trades, await reload
+
+    try:
+        realised, trades, reload = asyncio.run(scenario())
+    finally:
+        release.set()
+
+    assert realised.status_code == trades.status_code == reload.status_code == 200
+    assert reload_threads[0].startswith("excel")
@@ -0,0 +1,61 @@
+# File: test_export.py
+
+import csv
+import io
+import json
+
+import pytest
+
+
+@pytest.fixture()
+def ledger(main, empty_positions, monkeypatch):
+    """25 lots across two symbols, exported in batches of 7 so chunk boundaries fall mid-ledger."""
+    monkeypatch.setattr(main, "EXPORT_BATCH_SIZE", 7)
+    with main.db.write() as conn:
+        for i in range(25):
+            conn.execute("""
+                INSERT INTO positions (ticker, symbol, sector, buy_date, buy_price, qty, type, note, account)
+                VALUES ('', ?, 'Energy', ?, 100.0 + ?, ?, 'BUY', ?, 'Zerodha')
+            """, ("AAA" if i % 2 else "BBB", f"2024-01-{i % 9 + 1:02d}", i / 3, i + 1, 'comma, "quote"' if i == 4 else ''))
+        main.engine.rebuild(conn)
+
+
+def test_ndjson_export_matches_the_ledger(client, ledger):
+    res = client.get("/trades/export")
+
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("application/x-ndjson")
+    assert res.headers["content-disposition"].endswith('.ndjson"')
+    assert [json.loads(line) for line in res.text.splitlines()] == client.get("/trades").json()
+
+
+def test_csv_export_matches_the_ledger(client, ledger):
+    res = client.get("/trades/export", params={"format": "csv"})
+    ledger_rows = client.get("/trades").json()
+
+    rows = list(csv.reader(io.StringIO(res.text)))
+    assert rows[0] == list(ledger_rows[0])
+    assert len(rows) == len(ledger_rows) + 1
+    assert [int(row[0]) for row in rows[1:]] == [row["id"] for row in ledger_rows]
+    assert 'comma, "quote"' in [row[rows[0].index("note")] for row in rows[1:]]
+
+
+def test_export_applies_the_ledger_filters(client, ledger):
+    params = {"symbol": "aaa", "date_from": "2024-01-03", "date_to": "2024-01-06"}
+    exported = [json.loads(line) for line in client.get("/trades/export", params=params).text.splitlines()]
+
+    assert exported == client.get("/trades", params=params).json()
+    assert exported and all(row["symbol"] == "AAA" for row in exported)
+
+
+def test_export_streams_in_batches(main, ledger):
+    filters = main._ledger_filters(None, None, None, None, 'buy_date', None, None)
+    chunks = list(main._iter_ledger_export("ndjson", filters))
+    assert [chunk.count("\n") for chunk in chunks] == [7, 7, 7, 4]
+
+    csv_chunks = list(main._iter_ledger_export("csv", filters))
+    assert len(csv_chunks) == 5 # header, then one chunk per batch
+
+
+def test_export_rejects_unknown_formats(client, ledger):
+    assert client.get("/trades/export", params={"format": "xlsx"}).status_code == 400
@@ -0,0 +1,155 @@
+# File: test_history.py
+
+import random
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def _reference_lttb(points, threshold):
+    """The textbook LTTB loop (Steinarsson, 2013), on a list of (x, y)."""
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+    every = (n - 2) / (threshold - 2)
+    selected, a = [0], 0
+    for i in range(threshold - 2):
+        avg_start, avg_end = int((i + 1) * every) + 1, min(int((i + 2) * every) + 1, n)
+        avg_x = sum(p[0] for p in points[avg_start:avg_end]) / (avg_end - avg_start)
+        avg_y = sum(p[1] for p in points[avg_start:avg_end]) / (avg_end - avg_start)
+        range_start, range_end = int(i * every) + 1, int((i + 1) * every) + 1
+        best, best_area = range_start, -1.0
+        for j in range(range_start, range_end):
+            area = abs((points[a][0] - avg_x) * (points[j][1] - points[a][1])
+                       - (points[a][0] - points[j][0]) * (avg_y - points[a][1]))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    selected.append(n - 1)
+    return selected
+
+
+@pytest.mark.parametrize("n, max_points", [(10, 5), (100, 7), (1000, 50), (1001, 3), (365, 364)])
+def test_lttb_matches_the_reference_algorithm(main, n, max_points):
+    rng = np.random.default_rng(n + max_points)
+    x = np.cumsum(rng.integers(1, 4, n)).astype(float)
+    y = np.cumsum(rng.normal(0, 1, n)) + 100
+    selected = main.lttb_indices(x, y, max_points)
+    assert selected.tolist() == _reference_lttb(list(zip(x.tolist(), y.tolist())), max_points)
+    assert len(selected) == max_points and selected[0] == 0 and selected[-1] == n - 1
+    assert (np.diff(selected) > 0).all()
+
+
+def test_lttb_keeps_a_spike_and_short_series(main):
+    y = np.full(500, 100.0)
+    y[123] = 180.0
+    assert 123 in main.lttb_indices(np.arange(500.0), y, 20)
+    assert main.lttb_indices(np.arange(5.0), np.arange(5.0), 10).tolist() == [0, 1, 2, 3, 4]
+    assert main.lttb_indices(np.arange(5.0), np.arange(5.0), 2).tolist() == [0, 1, 2, 3, 4]
+
+
+def _seed_snapshots(main, days, start=date(2023, 12, 27), seed=21):
+    """Inserts one snapshot per weekday and refreshes the rollups; returns them as a DataFrame."""
+    rng = random.Random(seed)
+    rows, day, index = [], start, 100.0
+    while len(rows) < days:
+        if day.weekday() < 5:
+            index = round(index * rng.uniform(0.97, 1.03), 2)
+            rows.append((day.isoformat(), round(rng.uniform(1e5, 2e5), 2), index, rng.choice([0.0, 0.0, 500.0, -250.0])))
+        day += timedelta(days=1)
+    with main.db.write() as conn:
+        conn.execute("DELETE FROM portfolio_snapshots")
+        conn.execute("DELETE FROM portfolio_rollups")
+        conn.executemany("""
+            INSERT INTO portfolio_snapshots (date, market_value, total_cost_value, total_pnl, daily_pnl_sum,
+                                             portfolio_index_value, net_cash_flow_today)
+            VALUES (?, ?, 0.0, 0.0, 0.0, ?, ?)
+        """, rows)
+        main.refresh_portfolio_rollups(conn, rows[0][0], rows[-1][0])
+    return pd.DataFrame(rows, columns=["date", "market_value", "idx", "net_cash_flow"])
+
+
+def _expected_rollups(snapshots, period):
+    """The rollups recomputed with pandas: weeks run Monday to Sunday, months from the 1st."""
+    df = snapshots.assign(date=pd.to_datetime(snapshots["date"]))
+    grouped = df.groupby(df["date"].dt.to_period("W-SUN" if period == "week" else "M").dt.start_time)
+    expected = pd.DataFrame({
+        "first_date": grouped["date"].min().dt.strftime("%Y-%m-%d"),
+        "last_date": grouped["date"].max().dt.strftime("%Y-%m-%d"),
+        "open": grouped["idx"].first(),
+        "high": grouped["idx"].max(),
+        "low": grouped["idx"].min(),
+        "close": grouped["idx"].last(),
+        "market_value": grouped["market_value"].last(),
+        "net_cash_flow": grouped["net_cash_flow"].sum(),
+        "snapshots": grouped.size(),
+    })
+    expected.index = expected.index.strftime("%Y-%m-%d")
+    return [
+        {"period": period, "period_start": period_start,
+         **{key: pytest.approx(value) if isinstance(value, float) else value for key, value in row.items()}}
+        for period_start, row in expected.to_dict("index").items()
+    ]
+
+
+def _rollups(client, period, **params):
+    response = client.get("/portfolio-history/rollups", params={"period": period, **params})
+    assert response.status_code == 200
+    return response.json()
+
+
+@pytest.mark.parametrize("period", ["week", "month"])
+def test_rollups_match_a_pandas_resample(main, client, period):
+    snapshots = _seed_snapshots(main, 130)
+    assert _rollups(client, period) == _expected_rollups(snapshots, period)
+
+
+def test_rollups_filter_on_period_start(main, client):
+    _seed_snapshots(main, 130)
+    months = _rollups(client, "month", **{"from": "2024-02-01", "to": "2024-04-30"})
+    assert [row["period_start"] for row in months] == ["2024-02-01", "2024-03-01", "2024-04-01"]
+    # The first week starts in the previous year and is still found by its start.
+    assert _rollups(client, "week", to="2023-12-31")[0]["period_start"] == "2023-12-25"
+    assert client.get("/portfolio-history/rollups", params={"period": "day"}).status_code == 400
+
+
+def test_a_refresh_recomputes_only_the_overlapping_periods(main, client):
+    snapshots = _seed_snapshots(main, 130)
+    with main.db.write() as conn:
+        conn.execute("UPDATE portfolio_snapshots SET portfolio_index_value = 1.0 WHERE date = '2024-03-13'")
+        conn.execute("UPDATE portfolio_snapshots SET portfolio_index_value = 999.0 WHERE date = '2024-05-15'")
+        main.refresh_portfolio_rollups(conn, "2024-03-13", "2024-03-13")
+    snapshots.loc[snapshots["date"] == "2024-03-13", "idx"] = 1.0
+
+    for period in ("week", "month"):
+        # 2024-05-15 was changed but not refreshed, so its periods keep the old values.
+        assert _rollups(client, period) == _expected_rollups(snapshots, period)
+
+
+def test_rebuilding_the_index_refreshes_the_rollups(main, client):
+    _seed_snapshots(main, 130)
+    with main.db.write() as conn:
+        conn.execute("UPDATE portfolio_snapshots SET net_cash_flow_today = 0.0")
+    assert client.post("/portfolio-history/rebuild-index").json()["updated"] > 100
+
+    history = pd.DataFrame(client.get("/portfolio-history").json())
+    snapshots = history.rename(columns={"portfolio_index_value": "idx", "net_cash_flow_today": "net_cash_flow"})
+    for period in ("week", "month"):
+        assert _rollups(client, period) == _expected_rollups(snapshots, period)
+
+
+def test_history_downsamples_within_the_range(main, client):
+    snapshots = _seed_snapshots(main, 300)
+    everything = client.get("/portfolio-history").json()
+    assert [row["date"] for row in everything] == snapshots["date"].tolist()
+
+    params = {"from": "2024-02-01", "to": "2024-09-30"}
+    in_range = client.get("/portfolio-history", params=params).json()
+    sampled = client.get("/portfolio-history", params={**params, "max_points": 40}).json()
+    assert len(sampled) == 40
+    assert sampled[0] == in_range[0] and sampled[-1] == in_range[-1]
+    assert all(row in in_range for row in sampled)
+    assert client.get("/portfolio-history", params={"max_points": 2}).status_code == 422
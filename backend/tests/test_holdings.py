@@ -0,0 +1,83 @@
+# File: test_holdings.py
+
+import random
+
+SYMBOLS = ["AAA", "BBB", "CCC"]
+
+
+def _insert_lot(conn, rng, symbol=None):
+    conn.execute("""
+        INSERT INTO positions (ticker, symbol, sector, buy_date, buy_price, qty, type,
+                               current_price, daily_change, daily_pnl, account)
+        VALUES ('', ?, 'Energy', ?, ?, ?, 'BUY', ?, 0.0, ?, 'Zerodha')
+    """, (
+        symbol or rng.choice(SYMBOLS),
+        f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        round(rng.uniform(10, 500), 2),
+        rng.randint(1, 50),
+        round(rng.uniform(10, 500), 2),
+        round(rng.uniform(-50, 50), 2),
+    ))
+
+
+def _random_lot(conn, rng):
+    ids = [row[0] for row in conn.execute("SELECT id FROM positions")]
+    return rng.choice(ids) if ids else None
+
+
+MUTATIONS = {
+    # Each one touches the columns a different trigger (or trigger branch) watches.
+    "qty": ("UPDATE positions SET qty = ? WHERE id = ?", lambda rng: rng.randint(0, 60)),
+    "symbol": ("UPDATE positions SET symbol = ? WHERE id = ?", lambda rng: rng.choice(SYMBOLS)),
+    "buy_date": ("UPDATE positions SET buy_date = ? WHERE id = ?", lambda rng: f"2023-{rng.randint(1, 12):02d}-01"),
+    "buy_price": ("UPDATE positions SET buy_price = ? WHERE id = ?", lambda rng: round(rng.uniform(10, 500), 2)),
+    "sell_date": ("UPDATE positions SET sell_date = ? WHERE id = ?", lambda rng: rng.choice([None, "2025-01-02"])),
+    "type": ("UPDATE positions SET type = ? WHERE id = ?", lambda rng: rng.choice(["BUY", "SELL", "CLOSED_FULL_SELL"])),
+    "price": ("UPDATE positions SET current_price = ?, daily_pnl = current_price - 1 WHERE id = ?",
+              lambda rng: round(rng.uniform(10, 500), 2)),
+    "note": ("UPDATE positions SET note = ? WHERE id = ?", lambda rng: f"n{rng.randint(0, 9)}"),
+}
+
+
+def test_triggers_keep_holdings_equal_to_the_open_lots(main, empty_positions):
+    rng = random.Random(5)
+    try:
+        for step in range(600):
+            with main.db.write() as conn:
+                action = rng.choices(["insert", "update", "delete"], weights=[3, 6, 1])[0]
+                lot_id = _random_lot(conn, rng)
+                if action == "insert" or lot_id is None:
+                    _insert_lot(conn, rng)
+                elif action == "delete":
+                    conn.execute("DELETE FROM positions WHERE id = ?", (lot_id,))
+                else:
+                    sql, value = MUTATIONS[rng.choice(sorted(MUTATIONS))]
+                    conn.execute(sql, (value(rng), lot_id))
+                if step % 50 == 0:
+                    assert main.check_holdings(conn) == []
+        with main.db.read() as conn:
+            assert main.check_holdings(conn) == []
+            assert conn.execute("SELECT COUNT(*) FROM holdings").fetchone()[0] > 0
+    finally:
+        with main.db.write() as conn:
+            main.engine.rebuild(conn)
+
+
+def test_price_ticks_and_bulk_updates_keep_holdings_consistent(main, client, empty_positions):
+    rng = random.Random(9)
+    with main.db.write() as conn:
+        for _ in range(30):
+            _insert_lot(conn, rng)
+        main.engine.rebuild(conn)
+
+    client.post("/prices", json=[{"symbol": symbol, "price": 123.45, "prev_close": 120.0} for symbol in SYMBOLS])
+    with main.db.write() as conn:
+        conn.execute("UPDATE positions SET qty = qty + 1 WHERE symbol = 'AAA'")
+        conn.execute("UPDATE positions SET sell_date = '2025-02-03' WHERE symbol = 'BBB' AND id % 2 = 0")
+        main.engine.rebuild(conn)
+
+    assert client.get("/holdings/check").json() == {"consistent": True, "mismatches": []}
+    with main.db.read() as conn:
+        market_value = conn.execute("SELECT market_value FROM holdings WHERE symbol = 'CCC'").fetchone()[0]
+        qty = conn.execute("SELECT total_qty FROM holdings WHERE symbol = 'CCC'").fetchone()[0]
+    assert abs(market_value - qty * 123.45) < 0.01
@@ -0,0 +1,125 @@
+# File: test_index_rebuild.py
+#
+# The reference for the rebuild is take_snapshot itself: POST /snapshot is
+# replayed day by day with a fixed clock and fixed open totals, and the rebuilt
+# index must equal what that replay stores.
+
+import random
+from datetime import date, datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture()
+def snapshots(main, client, monkeypatch):
+    """Returns take(series): replays (market_value, net_cash_flow) days through POST /snapshot."""
+    clock = {}
+
+    class FixedDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return cls.combine(clock["today"], datetime.min.time())
+
+    monkeypatch.setattr(main, "datetime", FixedDatetime)
+
+    def take(series):
+        with main.db.write() as conn:
+            conn.execute("DELETE FROM portfolio_snapshots")
+        day = date(2020, 1, 6) # a Monday
+        for market_value, net_cash_flow in series:
+            while day.weekday() >= 5:
+                day += timedelta(days=1)
+            clock["today"] = day
+            monkeypatch.setattr(main, "fetch_open_totals", lambda conn, mv=market_value: (mv, 0.0, 0.0))
+            response = client.post("/snapshot", json={"net_cash_flow_today": net_cash_flow})
+            assert response.status_code == 200
+            day += timedelta(days=1)
+        return _stored(main)
+
+    return take
+
+
+def _stored(main):
+    with main.db.read() as conn:
+        return conn.execute(
+            "SELECT date, market_value, net_cash_flow_today, portfolio_index_value FROM portfolio_snapshots ORDER BY date"
+        ).fetchall()
+
+
+def _correct(main, day, market_value):
+    with main.db.write() as conn:
+        conn.execute("UPDATE portfolio_snapshots SET market_value = ? WHERE date = ?", (market_value, day))
+
+
+def _random_series(rng, days):
+    series, market_value = [], 100000.0
+    for _ in range(days):
+        flow = rng.choice([0.0, 0.0, 0.0, round(rng.uniform(-5000, 20000), 2)])
+        market_value = round(max(market_value * rng.uniform(0.93, 1.08) + flow, 0.0), 2)
+        series.append((market_value, flow))
+    return series
+
+
+def test_an_untouched_history_is_left_alone(main, client, snapshots):
+    snapshots(_random_series(random.Random(20), 60))
+    result = client.post("/portfolio-history/rebuild-index").json()
+    assert result["updated"] == 0 and result["first_changed"] is None
+
+
+def test_a_corrected_history_matches_taking_the_snapshots_again(main, client, snapshots):
+    """Over a year and a half of volatile days, rounding per day is what keeps the two equal."""
+    series = _random_series(random.Random(21), 400)
+    stored = snapshots(series)
+    corrected = list(series)
+    corrected[3] = (round(series[3][0] * 1.2, 2), series[3][1])
+    _correct(main, stored[3][0], corrected[3][0])
+
+    result = client.post("/portfolio-history/rebuild-index").json()
+    assert result["first_changed"] == stored[3][0]
+    rebuilt = [row[3] for row in _stored(main)]
+    assert rebuilt == [row[3] for row in snapshots(corrected)]
+
+
+def test_zero_denominator_days_carry_the_index(main, client, snapshots):
+    series = [
+        (1000.0, 0.0),
+        (1100.0, 0.0),
+        (0.0, -2200.0),   # prev 1100 + half of -2200 = 0: carried
+        (0.0, 0.0),       # prev 0, no flow: carried
+        (500.0, 1000.0),  # prev 0 + 500 > 0: chained again
+        (520.0, 0.0),
+    ]
+    stored = snapshots(series)
+    corrected = list(series)
+    corrected[1] = (1200.0, 0.0)
+    corrected[2] = (0.0, -2400.0)
+    _correct(main, stored[1][0], 1200.0)
+    with main.db.write() as conn:
+        conn.execute("UPDATE portfolio_snapshots SET net_cash_flow_today = -2400.0 WHERE date = ?", (stored[2][0],))
+
+    client.post("/portfolio-history/rebuild-index")
+    rebuilt = [row[3] for row in _stored(main)]
+    expected = [row[3] for row in snapshots(corrected)]
+    assert rebuilt == expected
+    assert expected[2] == expected[1] == 120.0
+
+
+def test_a_zero_index_stays_zero_until_a_reset(main, client, snapshots):
+    series = [
+        (0.0, 0.0),       # first snapshot: 100
+        (0.0, 0.0),       # prev 0, no flow: carried
+        (-400.0, 0.0),    # a negative value, e.g. a mistyped correction
+        (300.0, 500.0),   # prev -400 + 250 <= 0 with value and inflow: reset to 100
+        (330.0, 0.0),
+    ]
+    stored = snapshots(series)
+    assert [row[3] for row in stored][3:] == [100.0, 110.0]
+    with main.db.write() as conn:
+        conn.execute("UPDATE portfolio_snapshots SET portfolio_index_value = 0.0 WHERE date <= ?", (stored[2][0],))
+
+    result = client.post("/portfolio-history/rebuild-index", params={"dry_run": True}).json()
+    assert result["updated"] == 0 # a zero base carries zero, and the reset does not look back
+
+    _correct(main, stored[4][0], 360.0)
+    client.post("/portfolio-history/rebuild-index")
+    assert [row[3] for row in _stored(main)][3:] == [100.0, 120.0]
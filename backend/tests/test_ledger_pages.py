@@ -0,0 +1,90 @@
+# File: test_ledger_pages.py
+
+import random
+
+import pytest
+
+SYMBOLS = ["AAA", "BBB", "CCC"]
+
+
+@pytest.fixture()
+def ledger(main, empty_positions):
+    """Buys and sells whose dates collide often, plus buys with no buy_date."""
+    rng = random.Random(7)
+    with main.db.write() as conn:
+        for i in range(57):
+            is_sell = i % 3 == 0
+            conn.execute("""
+                INSERT INTO positions (ticker, symbol, sector, buy_date, sell_date, buy_price, sell_price,
+                                       qty, type, account)
+                VALUES ('', ?, ?, ?, ?, 100.0, ?, ?, ?, 'Zerodha')
+            """, (
+                rng.choice(SYMBOLS),
+                rng.choice(["Energy", "Banks"]),
+                None if i % 11 == 5 else f"2024-01-{rng.randint(1, 4):02d}",
+                f"2024-06-{rng.randint(1, 4):02d}" if is_sell else None,
+                110.0 if is_sell else None,
+                0 if is_sell else rng.randint(1, 9),
+                "SELL" if is_sell else "BUY",
+            ))
+        main.engine.rebuild(conn)
+
+
+def _walk(client, path, limit, **params):
+    """Follows X-Next-Cursor to the end; returns the rows and the X-Total-Count of every page."""
+    rows, totals, cursor = [], [], None
+    while True:
+        res = client.get(path, params={"limit": limit, **params, **({"cursor": cursor} if cursor else {})})
+        assert res.status_code == 200
+        rows += res.json()
+        totals.append(res.headers.get("X-Total-Count"))
+        cursor = res.headers.get("X-Next-Cursor")
+        if not cursor:
+            return rows, totals
+
+
+@pytest.mark.parametrize("path", ["/trades", "/realised"])
+@pytest.mark.parametrize("limit", [1, 4, 19, 1000])
+def test_pages_cover_every_row_once_in_order(client, ledger, path, limit):
+    everything = client.get(path).json()
+    rows, totals = _walk(client, path, limit)
+
+    assert [row["id"] for row in rows] == [row["id"] for row in everything]
+    assert len(everything) == (19 if path == "/realised" else 57)
+    # Counting scans every matching row, so only the first page pays for it.
+    assert totals == [str(len(everything))] + [None] * (len(totals) - 1)
+
+
+def test_trades_order_nulls_first_then_date_and_id(client, ledger):
+    rows, _ = _walk(client, "/trades", 5)
+    keys = [(row["buy_date"] is not None, row["buy_date"] or "", row["id"]) for row in rows]
+    assert keys == sorted(keys)
+    assert rows[0]["buy_date"] is None
+
+
+def test_realised_order_newest_first(client, ledger):
+    rows, _ = _walk(client, "/realised", 3)
+    keys = [(row["sell_date"], row["id"]) for row in rows]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_filters_apply_to_every_page_and_the_total(client, ledger):
+    params = {"symbol": "bbb", "sector": "Energy", "date_from": "2024-01-02", "date_to": "2024-01-03"}
+    rows, totals = _walk(client, "/trades", 2, **params)
+    expected = [
+        row for row in client.get("/trades").json()
+        if row["symbol"] == "BBB" and row["sector"] == "Energy" and row["buy_date"] in ("2024-01-02", "2024-01-03")
+    ]
+
+    assert [row["id"] for row in rows] == [row["id"] for row in expected]
+    assert totals[0] == str(len(expected))
+
+
+def test_with_total_counts_on_cursor_pages(client, ledger):
+    first = client.get("/trades", params={"limit": 10})
+    second = client.get("/trades", params={"limit": 10, "cursor": first.headers["X-Next-Cursor"], "with_total": True})
+    assert second.headers["X-Total-Count"] == first.headers["X-Total-Count"]
+
+
+def test_invalid_cursor_is_a_400(client, ledger):
+    assert client.get("/trades", params={"limit": 5, "cursor": "not-a-cursor"}).status_code == 400
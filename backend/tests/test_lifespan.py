@@ -0,0 +1,29 @@
+# File: test_lifespan.py
+
+from fastapi.testclient import TestClient
+
+
+def test_lifespan_starts_and_stops_the_background_work(main, monkeypatch):
+    events = []
+
+    class FakeWatcher:
+        def __init__(self, sources):
+            events.append(("watch", [path() for path, _ in sources]))
+
+        def start(self):
+            events.append("start")
+
+        def stop(self):
+            events.append("stop")
+
+    monkeypatch.setattr(main, "ExcelWatcher", FakeWatcher)
+    monkeypatch.setattr(main, "EXCEL_WATCH_ENABLED", True)
+
+    for _ in range(2): # a second startup gets a fresh watcher
+        with TestClient(main.app):
+            task = main.broadcaster._task
+            assert not task.done()
+        assert task.done()
+
+    watch = ("watch", [main.POSITIONS_EXCEL_FILE, main.DIVIDENDS_EXCEL_FILE])
+    assert events == [watch, "start", "stop"] * 2
@@ -0,0 +1,23 @@
+# File: test_positions.py
+
+
+def _insert_lot(conn, ticker, buy_date, qty, current_price):
+    return conn.execute("""
+        INSERT INTO positions (ticker, symbol, sector, buy_date, buy_price, qty, type, current_price, account)
+        VALUES (?, 'TIE', 'Energy', ?, 100.0, ?, 'BUY', ?, 'Zerodha')
+    """, (ticker, buy_date, qty, current_price)).lastrowid
+
+
+def test_first_lot_attributes_break_buy_date_ties_by_id(main, client, empty_positions):
+    with main.db.write() as conn:
+        # The first lot booked has the larger qty, so an index walk over
+        # (symbol, buy_date, qty, ...) without the id tie-breaker would pick the second.
+        _insert_lot(conn, "NSE:TIE-1", "2024-01-02", 9, 120.0)
+        _insert_lot(conn, "NSE:TIE-2", "2024-01-02", 1, 130.0)
+        _insert_lot(conn, "NSE:TIE-3", "2024-03-01", 5, 140.0)
+        main.engine.rebuild(conn)
+
+    [position] = client.get("/positions").json()
+    assert position["ticker"] == "NSE:TIE-1"
+    assert position["currentPrice"] == 120.0
+    assert position["totalQty"] == 15
@@ -0,0 +1,88 @@
+# File: test_prices.py
+
+
+def _add_lot(client, symbol, qty, buy_price):
+    response = client.post("/positions", json={
+        "symbol": symbol, "qty": qty, "buy_price": buy_price, "buy_date": "2024-01-02", "type": "BUY",
+    })
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def _lot(main, lot_id):
+    with main.db.read() as conn:
+        row = conn.execute(
+            "SELECT current_price, daily_change, daily_pnl, market_value, total_pnl FROM positions WHERE id = ?",
+            (lot_id,),
+        ).fetchone()
+    return dict(zip(("current_price", "daily_change", "daily_pnl", "market_value", "total_pnl"), row))
+
+
+def _latest_seq(client):
+    """The seq to pass as `since` to see only changes made from now on."""
+    feed = {"next": 0, "has_more": True}
+    while feed["has_more"]:
+        feed = client.get("/changes", params={"since": feed["next"]}).json()
+    return feed["next"]
+
+
+def test_first_tick_without_prev_close_has_no_daily_change(main, client, empty_positions):
+    lot_id = _add_lot(client, "NEWLOT", 10, 90.0)
+
+    assert client.post("/prices", json=[{"symbol": "NEWLOT", "price": 101.0}]).json()["lots_updated"] == 1
+    assert _lot(main, lot_id) == {
+        "current_price": 101.0, "daily_change": 0.0, "daily_pnl": 0.0, "market_value": 1010.0, "total_pnl": 110.0,
+    }
+    assert client.get("/calculate-live-index").json()["daily_pnl_sum"] == 0.0
+
+    # Later ticks move against the base the first tick set.
+    client.post("/prices", json=[{"symbol": "NEWLOT", "price": 103.0}])
+    assert _lot(main, lot_id)["daily_pnl"] == 20.0
+
+
+def test_prev_close_sets_the_day_base(main, client, empty_positions):
+    lot_id = _add_lot(client, "PCLOSE", 10, 90.0)
+
+    client.post("/prices", json=[{"symbol": "PCLOSE", "price": 101.0, "prev_close": 100.0}])
+    assert _lot(main, lot_id)["daily_pnl"] == 10.0
+    client.post("/prices", json=[{"symbol": "PCLOSE", "price": 99.0}])
+    assert _lot(main, lot_id)["daily_change"] == -1.0
+
+
+def test_repriced_lots_reach_the_change_feed(main, client, empty_positions):
+    first = _add_lot(client, "FEED", 5, 50.0)
+    second = _add_lot(client, "FEED", 3, 60.0)
+    _add_lot(client, "QUIET", 1, 10.0)
+    since = _latest_seq(client)
+
+    client.post("/prices", json=[{"symbol": "FEED", "price": 55.0}, {"symbol": "UNHELD", "price": 1.0}])
+    client.post("/prices", json=[{"symbol": "FEED", "price": 56.0}])
+    feed = client.get("/changes", params={"since": since}).json()
+
+    assert [(change["table"], change["op"], change["key"]) for change in feed["changes"]] == [
+        ("positions", "update", first), ("positions", "update", second),
+    ]
+    assert [change["row"]["current_price"] for change in feed["changes"]] == [56.0, 56.0]
+    assert feed["changes"][0]["row"]["market_value"] == 280.0
+    assert client.get("/changes", params={"since": feed["next"]}).json()["changes"] == []
+
+
+def test_repriced_lot_edited_in_the_same_page_is_sent_once(main, client, empty_positions):
+    lot_id = _add_lot(client, "EDIT", 5, 50.0)
+    since = _latest_seq(client)
+
+    client.post("/prices", json=[{"symbol": "EDIT", "price": 55.0}])
+    client.put(f"/positions/{lot_id}", json={"symbol": "EDIT", "qty": 7, "buy_price": 50.0, "type": "BUY"})
+    changes = client.get("/changes", params={"since": since}).json()["changes"]
+
+    assert [(change["key"], change["row"]["qty"]) for change in changes] == [(lot_id, 7)]
+
+
+def test_pct_pnl_is_a_percentage_like_the_other_paths(main, client, empty_positions):
+    lot_id = _add_lot(client, "PCT", 4, 80.0)
+
+    client.post("/prices", json=[{"symbol": "PCT", "price": 100.0}])
+    with main.db.read() as conn:
+        assert conn.execute("SELECT pct_pnl FROM positions WHERE id = ?", (lot_id,)).fetchone()[0] == 25.0
+    entry = next(entry for entry in client.get("/positions").json() if entry["symbol"] == "PCT")
+    assert entry["excel_pct_pnl"] == entry["pct_pnl"] == 25.0
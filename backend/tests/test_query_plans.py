@@ -0,0 +1,31 @@
+# File: test_query_plans.py
+
+import sqlite3
+
+
+def test_hot_queries_use_indexes(main, tmp_path, monkeypatch):
+    """A freshly migrated database serves every HOT_QUERIES entry from an index."""
+    db_path = tmp_path / "plans.db"
+    monkeypatch.setattr(main, "DB_NAME", str(db_path))
+    main.init_db()
+
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0] == main.MIGRATIONS[-1][0]
+        assert main.check_query_plans(conn) == []
+
+
+def test_check_query_plans_reports_table_scans(main, tmp_path, monkeypatch):
+    """With the positions indexes dropped, the same queries are reported as offenders."""
+    db_path = tmp_path / "bare.db"
+    monkeypatch.setattr(main, "DB_NAME", str(db_path))
+    main.init_db()
+
+    with sqlite3.connect(db_path) as conn:
+        indexes = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'positions' AND sql IS NOT NULL"
+        ).fetchall()
+        for (name,) in indexes:
+            conn.execute(f"DROP INDEX {name}")
+        offenders = dict(main.check_query_plans(conn))
+
+    assert {"sell_fifo", "realised", "trades"} <= offenders.keys()
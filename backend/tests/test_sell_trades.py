@@ -0,0 +1,87 @@
+# File: test_sell_trades.py
+
+import pytest
+
+SELL_DATE = "2025-01-02"
+
+
+@pytest.fixture()
+def lots(main, client, empty_positions):
+    for symbol, qty, buy_price, buy_date in [
+        ("AAA", 5, 100.0, "2024-01-02"), ("AAA", 5, 110.0, "2024-02-01"), ("BBB", 4, 50.0, "2024-01-05"),
+    ]:
+        assert client.post("/positions", json={
+            "symbol": symbol, "qty": qty, "buy_price": buy_price, "buy_date": buy_date, "type": "BUY",
+        }).status_code == 200
+
+
+def _ledger(main):
+    with main.db.read() as conn:
+        return conn.execute("SELECT * FROM positions ORDER BY id").fetchall()
+
+
+def _sell(symbol, qty, price):
+    return {"symbol": symbol, "qty": qty, "sell_price": price, "sell_date": SELL_DATE}
+
+
+def test_batch_sells_fifo_in_request_order(main, client, lots):
+    res = client.post("/sell_trades", json=[_sell("AAA", 3, 120.0), _sell("BBB", 4, 40.0), _sell("AAA", 4, 130.0)])
+
+    assert res.status_code == 200
+    body = res.json()
+    # AAA: 3 @120 and 2 @130 from the 100.0 lot, then 2 @130 from the 110.0 lot.
+    assert body["symbols"]["AAA"] == {"qty_sold": 7, "cash_generated": 880.0, "realised_pnl": 160.0}
+    assert body["symbols"]["BBB"] == {"qty_sold": 4, "cash_generated": 160.0, "realised_pnl": -40.0}
+    assert main.engine.totals("AAA") == (3, 330.0)
+    assert main.engine.totals("BBB") == (0, 0.0)
+    assert client.get("/engine/check").json()["consistent"]
+    assert client.get("/holdings/check").json()["consistent"]
+
+
+def test_oversold_batch_is_rejected_before_writing(main, client, lots):
+    before = _ledger(main)
+    # Each sell fits on its own; together they exceed the 10 open AAA.
+    res = client.post("/sell_trades", json=[_sell("AAA", 6, 120.0), _sell("AAA", 5, 120.0)])
+
+    assert res.status_code == 400
+    assert _ledger(main) == before
+
+
+def test_failed_write_rolls_back_the_whole_batch(main, client, lots):
+    before = _ledger(main)
+    with main.db.write() as conn:
+        conn.execute("""
+            CREATE TRIGGER test_fail_bbb_sell BEFORE INSERT ON positions
+            WHEN NEW.type = 'SELL' AND NEW.symbol = 'BBB'
+            BEGIN SELECT RAISE(ABORT, 'simulated failure'); END
+        """)
+    try:
+        res = client.post("/sell_trades", json=[_sell("AAA", 7, 120.0), _sell("BBB", 1, 40.0)])
+    finally:
+        with main.db.write() as conn:
+            conn.execute("DROP TRIGGER test_fail_bbb_sell")
+
+    assert res.status_code == 500
+    assert _ledger(main) == before
+    assert main.engine.totals("AAA") == (10, 1050.0)
+    assert client.get("/engine/check").json()["consistent"]
+
+
+def test_engine_books_are_restored_after_a_rollback(main, client, lots, monkeypatch):
+    before = _ledger(main)
+    consume = main.engine.consume
+
+    def consume_then_fail(symbol, qty):
+        if symbol == "BBB":
+            raise RuntimeError("simulated failure")
+        consume(symbol, qty)
+
+    monkeypatch.setattr(main.engine, "consume", consume_then_fail)
+    res = client.post("/sell_trades", json=[_sell("AAA", 7, 120.0), _sell("BBB", 1, 40.0)])
+    monkeypatch.undo()
+
+    assert res.status_code == 500
+    assert _ledger(main) == before
+    # AAA had already been consumed in memory when BBB failed.
+    assert main.engine.totals("AAA") == (10, 1050.0)
+    assert client.get("/engine/check").json()["consistent"]
@@ -0,0 +1,209 @@
+# File: test_stream.py
+#
+# Drives a LiveBroadcaster of its own, calling _broadcast where the running app
+# would after a debounced wakeup. Each client is a replica built from the
+# events it is sent, and must end equal to the positions the server computes.
+
+import asyncio
+import json
+import random
+import sqlite3
+
+
+def _add_lot(client, symbol, qty, buy_price, buy_date="2024-01-02"):
+    response = client.post("/positions", json={
+        "symbol": symbol, "qty": qty, "buy_price": buy_price, "buy_date": buy_date, "type": "BUY",
+    })
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def _sell_all(main, client, symbol):
+    qty = main.engine.totals(symbol)[0]
+    response = client.post("/sell_trade", json={
+        "symbol": symbol, "qty": qty, "sell_date": "2025-01-02", "sell_price": 30.0,
+    })
+    assert response.status_code == 200
+
+
+def _decode(message):
+    event, data = message.split("\n")[:2]
+    return event[len("event: "):], json.loads(data[len("data: "):])
+
+
+class Replica:
+    """A /stream client: its snapshot plus every queued event applied in order."""
+
+    def __init__(self, main, broadcaster, net_cash_flow_today=0.0):
+        self.main = main
+        self.broadcaster = broadcaster
+        self.net_cash_flow_today = net_cash_flow_today
+        self.queue = broadcaster.subscribe(net_cash_flow_today)
+        self.positions = {}
+        self.index = None
+
+    async def connect(self):
+        self.apply(await self.broadcaster.snapshot(self.net_cash_flow_today))
+
+    async def drain(self):
+        while not self.queue.empty():
+            message = self.queue.get_nowait()
+            if message is self.main.STREAM_RESYNC:
+                while not self.queue.empty():
+                    self.queue.get_nowait()
+                message = await self.broadcaster.snapshot(self.net_cash_flow_today)
+            self.apply(message)
+
+    def apply(self, message):
+        event, payload = _decode(message)
+        if event == "snapshot":
+            self.positions = {entry["symbol"]: entry for entry in payload["positions"]}
+        else:
+            for symbol in payload["removed"]:
+                self.positions.pop(symbol, None)
+            for entry in payload["changed"]:
+                self.positions[entry["symbol"]] = entry
+        self.index = payload["index"]
+
+
+def _server_positions(main):
+    return main.load_live_state()[0]
+
+
+def _run(main, scenario):
+    async def body():
+        broadcaster = main.LiveBroadcaster()
+        broadcaster.start()
+        try:
+            await scenario(broadcaster)
+        finally:
+            broadcaster.stop()
+
+    asyncio.run(body())
+
+
+def test_a_client_joining_between_broadcasts_gets_the_diff_baseline(main, client, empty_positions):
+    """
+    A symbol opened and closed again between two broadcasts never shows up in
+    their diff, so a client whose snapshot saw it open would keep it forever.
+    """
+    _add_lot(client, "KEEP", 5, 10.0)
+
+    async def scenario(broadcaster):
+        first = Replica(main, broadcaster)
+        await first.connect()
+        _add_lot(client, "BLIP", 2, 10.0)
+        second = Replica(main, broadcaster)
+        await second.connect()
+        assert second.positions == first.positions
+        _sell_all(main, client, "BLIP")
+        _add_lot(client, "KEEP", 1, 12.0)
+        await broadcaster._broadcast()
+
+        for replica in (first, second):
+            await replica.drain()
+            assert replica.positions == _server_positions(main)
+            assert "BLIP" not in replica.positions
+
+    _run(main, scenario)
+
+
+def test_replicas_follow_random_changes(main, client, empty_positions):
+    rng = random.Random(16)
+    symbols = ["AAA", "BBB", "CCC"]
+
+    async def scenario(broadcaster):
+        replicas = []
+        for step in range(40):
+            action = rng.choice(["add", "sell", "prices", "join", "leave"])
+            if action == "add":
+                _add_lot(client, rng.choice(symbols), rng.randint(1, 9), rng.uniform(5, 50))
+            elif action == "sell":
+                symbol = rng.choice(symbols)
+                if main.engine.totals(symbol)[0]:
+                    _sell_all(main, client, symbol)
+            elif action == "prices":
+                client.post("/prices", json=[{"symbol": rng.choice(symbols), "price": round(rng.uniform(5, 50), 2)}])
+            elif action == "join" or not replicas:
+                replica = Replica(main, broadcaster, net_cash_flow_today=rng.choice([0.0, 100.0]))
+                await replica.connect()
+                replicas.append(replica)
+            else:
+                broadcaster.unsubscribe(replicas.pop(rng.randrange(len(replicas))).queue)
+            if rng.random() < 0.4:
+                await broadcaster._broadcast()
+                for replica in replicas:
+                    await replica.drain()
+
+        await broadcaster._broadcast()
+        expected = _server_positions(main)
+        for replica in replicas:
+            await replica.drain()
+            assert replica.positions == expected
+
+    _run(main, scenario)
+
+
+def test_a_stale_baseline_is_resent_in_full(main, client, empty_positions):
+    _add_lot(client, "STALE", 3, 10.0)
+
+    async def scenario(broadcaster):
+        await broadcaster._broadcast() # nobody listening: the baseline goes stale
+        _add_lot(client, "FRESH", 1, 10.0)
+        queue = broadcaster.subscribe(0.0)
+        await broadcaster._broadcast()
+        event, payload = _decode(queue.get_nowait())
+        assert event == "snapshot"
+        assert {entry["symbol"] for entry in payload["positions"]} == {"STALE", "FRESH"}
+
+    _run(main, scenario)
+
+
+def test_a_slow_client_resyncs_from_a_snapshot(main, client, empty_positions, monkeypatch):
+    monkeypatch.setattr(main, "STREAM_QUEUE_SIZE", 2)
+
+    async def scenario(broadcaster):
+        slow = Replica(main, broadcaster)
+        await slow.connect()
+        dropped = broadcaster.dropped
+        for i in range(4):
+            _add_lot(client, f"SLOW{i}", 1, 10.0)
+            await broadcaster._broadcast()
+        assert broadcaster.dropped > dropped
+        assert slow.queue.get_nowait() is main.STREAM_RESYNC
+        slow.queue.put_nowait(main.STREAM_RESYNC)
+        await slow.drain()
+        assert slow.positions == _server_positions(main)
+
+    _run(main, scenario)
+
+
+def test_a_commit_by_another_process_is_pushed(main, client, empty_positions, monkeypatch):
+    monkeypatch.setattr(main, "STREAM_POLL", 0.05)
+    monkeypatch.setattr(main, "STREAM_DEBOUNCE", 0.01)
+
+    async def scenario(broadcaster):
+        main.data_version.listeners.append(broadcaster.notify)
+        try:
+            replica = Replica(main, broadcaster)
+            await replica.connect()
+            conn = sqlite3.connect(main.db.db_name, isolation_level=None)
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("""
+                    INSERT INTO positions (ticker, symbol, sector, buy_date, buy_price, qty, type, current_price,
+                                           market_value, daily_change, daily_pnl, account)
+                    VALUES ('', 'ELSE', 'Energy', '2024-01-01', 10.0, 4, 'BUY', 11.0, 44.0, 0.0, 0.0, '')
+                """)
+                main.DataVersion.bump(conn)
+                conn.execute("COMMIT")
+            finally:
+                conn.close()
+
+            message = await asyncio.wait_for(replica.queue.get(), timeout=5)
+            replica.apply(message)
+            assert replica.positions["ELSE"]["totalQty"] == 4
+        finally:
+            main.data_version.listeners.remove(broadcaster.notify)
+
+    _run(main, scenario)
@@ -0,0 +1,97 @@
+# File: test_tick_replay.py
+
+import argparse
+import asyncio
+import contextlib
+import math
+
+import httpx
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture()
+def tick_replay(main):
+    import tick_replay as module # importable once main has put the backend on sys.path
+    return module
+
+
+def test_generated_ticks_are_reproducible_and_evenly_spaced(tick_replay):
+    ticks = tick_replay.generate_ticks(symbols=5, ticks=200, rate=50.0, seed=1)
+
+    assert list(ticks.columns) == ["ts", "symbol", "price", "prev_close"]
+    assert len(ticks) == 200
+    assert np.allclose(np.diff(ticks["ts"]), 1 / 50.0)
+    assert (ticks["price"] > 0).all()
+    # prev_close is the symbol's start price, the same on every one of its ticks.
+    assert (ticks.groupby("symbol")["prev_close"].nunique() == 1).all()
+    pd.testing.assert_frame_equal(ticks, tick_replay.generate_ticks(symbols=5, ticks=200, rate=50.0, seed=1))
+
+
+def test_without_drift_or_volatility_prices_stay_put(tick_replay):
+    ticks = tick_replay.generate_ticks(symbols=3, ticks=30, rate=10.0, mu=0.0, sigma=0.0)
+    assert (ticks["price"] == ticks["prev_close"]).all()
+
+
+def test_log_returns_follow_the_drift(tick_replay):
+    """With no volatility each symbol's log price grows by mu * elapsed time, counted from ts 0."""
+    mu = 0.5
+    ticks = tick_replay.generate_ticks(symbols=2, ticks=40, rate=1.0, mu=mu, sigma=0.0)
+    expected = ticks["prev_close"] * np.exp(mu * ticks["ts"] / tick_replay.TRADING_SECONDS_PER_YEAR)
+    assert np.allclose(ticks["price"], expected.round(2))
+
+
+def test_read_ticks_normalizes_and_orders(tick_replay, tmp_path):
+    path = tmp_path / "ticks.csv"
+    path.write_text("ts,symbol,price\n2.0, abc ,10.5\n1.0,xyz,20.0\n1.0,abc,10.0\n")
+
+    ticks = tick_replay.read_ticks(path)
+    assert ticks["symbol"].tolist() == ["XYZ", "ABC", "ABC"]
+    assert ticks["price"].tolist() == [20.0, 10.0, 10.5]
+    assert ticks["prev_close"].isna().all()
+
+
+def test_read_ticks_rejects_missing_columns(tick_replay, tmp_path):
+    path = tmp_path / "ticks.csv"
+    path.write_text("ts,ticker,price\n1.0,ABC,10.0\n")
+    with pytest.raises(SystemExit, match="symbol"):
+        tick_replay.read_ticks(path)
+
+
+def test_payloads_send_a_missing_prev_close_as_null(tick_replay):
+    ticks = pd.DataFrame({"symbol": ["A", "B"], "price": [1.5, 2.0], "prev_close": [1.0, math.nan]})
+    assert tick_replay.tick_payloads(ticks) == [
+        {"symbol": "A", "price": 1.5, "prev_close": 1.0},
+        {"symbol": "B", "price": 2.0, "prev_close": None},
+    ]
+
+
+def test_replay_revalues_the_seeded_lots(main, tick_replay, empty_positions):
+    ticks = tick_replay.generate_ticks(symbols=4, ticks=40, rate=1000.0, seed=3)
+    lots = tick_replay.seed_lots(main.DB_NAME, ticks, lots_per_symbol=3)
+    assert lots == 12
+    with main.db.write() as conn:
+        main.engine.rebuild(conn)
+
+    args = argparse.Namespace(probes=["live-index"], probe_interval=0.01, batch_interval=0.01)
+    schedule = np.arange(len(ticks)) / 1000.0
+
+    async def replay():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://replay") as client:
+            return await tick_replay.run_phase(
+                client, tick_replay.tick_payloads(ticks), schedule, 0.2, args, contextlib.nullcontext,
+            )
+
+    stats, probe_results = asyncio.run(replay())
+    assert stats["sent"] == len(ticks)
+    assert set(stats["status"]) == {200}
+    assert not stats["unknown"]
+    assert stats["lots"] >= 12
+    assert probe_results["live-index"][1][200] >= 1
+
+    last = ticks.groupby("symbol")["price"].last()
+    with main.db.read() as conn:
+        prices = dict(conn.execute("SELECT symbol, current_price FROM positions WHERE type = 'BUY' AND qty > 0"))
+    assert prices == last.to_dict()
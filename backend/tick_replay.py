@@ -0,0 +1,302 @@
+# File: tick_replay.py
+#
+# Local stand-in for a market-data feed. Generates synthetic ticks (geometric
+# Brownian motion per symbol) or reads a recorded tick file, and replays them
+# into POST /prices at a fixed rate while probing the price-dependent reads
+# (/calculate-live-index, /positions, /snapshot). Reports tick throughput,
+# /prices latency, how far the sender fell behind schedule, and probe latencies.
+#
+# Tick files are CSV with a header: ts,symbol,price[,prev_close]
+# (ts in seconds from the start of the recording).
+#
+# Usage (from the backend directory):
+#   python tick_replay.py generate ticks.csv --symbols 500 --ticks 100000 --rate 1000
+#   python tick_replay.py replay                              # synthetic ticks at 1, 100 and 10k ticks/s
+#   python tick_replay.py replay --file ticks.csv --rates 500 --duration 30
+#   python tick_replay.py replay --file recorded.csv --speed 2    # recorded timing, twice as fast
+#   python tick_replay.py replay --url http://localhost:8000 --file ticks.csv --rates 100
+#
+# Without --url the app runs in-process against a throwaway database in a temp
+# directory, seeded with --lots-per-symbol open lots for every ticked symbol;
+# portfolio.db is untouched. With --url the ticks go to a running server, and
+# symbols it does not hold are counted as unknown.
+
+import argparse
+import asyncio
+import contextlib
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+TRADING_SECONDS_PER_YEAR = 252 * 6.25 * 3600 # NSE session, used to scale GBM volatility
+
+PROBES = {
+    "live-index": ("GET", "/calculate-live-index", None),
+    "positions": ("GET", "/positions", None),
+    "snapshot": ("POST", "/snapshot", {"net_cash_flow_today": 0.0}),
+}
+
+
+def generate_ticks(symbols, ticks, rate, mu=0.08, sigma=0.3, seed=42):
+    """
+    Returns a DataFrame of `ticks` GBM ticks spread over `symbols` random
+    symbols at `rate` ticks/s. Each symbol's log price moves by
+    (mu - sigma^2 / 2) dt + sigma sqrt(dt) Z, with dt the time since its last tick.
+    """
+    rng = np.random.default_rng(seed)
+    names = np.array([f"SYM{i:05d}" for i in range(symbols)])
+    start_price = rng.uniform(50, 5000, symbols).round(2)
+
+    df = pd.DataFrame({
+        "ts": np.arange(ticks) / rate,
+        "sym": rng.integers(0, symbols, ticks),
+    })
+    # A symbol's first tick moves it from the start of the recording.
+    dt = df.groupby("sym")["ts"].diff().fillna(df["ts"]).to_numpy() / TRADING_SECONDS_PER_YEAR
+    log_return = (mu - 0.5 * sigma ** 2) * dt + sigma * np.sqrt(dt) * rng.standard_normal(ticks)
+    df["log_price"] = log_return
+    cumulative = df.groupby("sym")["log_price"].cumsum().to_numpy()
+
+    sym = df["sym"].to_numpy()
+    return pd.DataFrame({
+        "ts": df["ts"].round(6),
+        "symbol": names[sym],
+        "price": (start_price[sym] * np.exp(cumulative)).round(2),
+        "prev_close": start_price[sym],
+    })
+
+
+def read_ticks(path):
+    """Reads a tick file, ordered by time. prev_close is optional."""
+    df = pd.read_csv(path)
+    missing = {"ts", "symbol", "price"} - set(df.columns)
+    if missing:
+        raise SystemExit(f"{path}: missing column(s) {', '.join(sorted(missing))}")
+    if "prev_close" not in df.columns:
+        df["prev_close"] = np.nan
+    df["symbol"] = df["symbol"].astype(str).str.strip().str.upper()
+    return df.sort_values("ts", kind="stable").reset_index(drop=True)
+
+
+def tick_payloads(df):
+    """Converts a tick DataFrame into the POST /prices JSON items."""
+    prev_close = df["prev_close"].astype(object).where(df["prev_close"].notna(), None)
+    return [
+        {"symbol": symbol, "price": price, "prev_close": prev}
+        for symbol, price, prev in zip(df["symbol"].tolist(), df["price"].tolist(), prev_close.tolist())
+    ]
+
+
+def seed_lots(db_path, ticks, lots_per_symbol, seed=7):
+    """Inserts `lots_per_symbol` open BUY lots for every symbol in `ticks`, bought near its first price."""
+    rng = np.random.default_rng(seed)
+    first = ticks.groupby("symbol", sort=True)["price"].first()
+    symbols = np.repeat(first.index.to_numpy(), lots_per_symbol)
+    lots = len(symbols)
+    buy_price = (np.repeat(first.to_numpy(), lots_per_symbol) * rng.uniform(0.7, 1.3, lots)).round(2)
+    buy_dates = (pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 2000, lots), unit="D")).strftime("%Y-%m-%d")
+    rows = zip(symbols.tolist(), buy_dates.tolist(), buy_price.tolist(), rng.integers(1, 500, lots).tolist())
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany("""
+            INSERT INTO positions (ticker, symbol, sector, buy_date, buy_price, qty, type,
+                                   current_price, daily_change, daily_pnl, tradevalue,
+                                   market_value, total_pnl, pct_pnl, tvm, pos_age, account)
+            VALUES ('', ?, 'Energy', ?, ?, ?, 'BUY', 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, '', 'Zerodha')
+        """, rows)
+    return lots
+
+
+def percentile(values, pct):
+    return float(np.percentile(values, pct)) * 1000 if values else 0.0
+
+
+def report(label, latencies, extra=""):
+    print(f"  {label:<24} n={len(latencies):<7} "
+          f"p50={percentile(latencies, 50):8.2f} ms  "
+          f"p95={percentile(latencies, 95):8.2f} ms  "
+          f"p99={percentile(latencies, 99):8.2f} ms  "
+          f"max={percentile(latencies, 100):8.2f} ms{extra}")
+
+
+async def send_ticks(client, payloads, schedule, duration, batch_interval, stats):
+    """
+    Open-loop sender: every batch_interval it POSTs all ticks whose scheduled
+    time has passed. A slow /prices call makes the next batch bigger instead of
+    slowing the feed down, the way a real feed handler would keep up.
+    """
+    started = time.perf_counter()
+    sent = 0
+    total = len(schedule)
+    while sent < total:
+        now = time.perf_counter() - started
+        if now >= duration:
+            break
+        due = int(np.searchsorted(schedule, now, side="right"))
+        if due == sent:
+            await asyncio.sleep(min(batch_interval, schedule[sent] - now))
+            continue
+        batch = [payloads[i % len(payloads)] for i in range(sent, due)]
+        # How late the oldest tick in the batch goes out; up to batch_interval is batching.
+        stats["lag"].append(now - schedule[sent])
+        t0 = time.perf_counter()
+        response = await client.post("/prices", json=batch)
+        stats["latency"].append(time.perf_counter() - t0)
+        stats["status"][response.status_code] += 1
+        if response.status_code == 200:
+            body = response.json()
+            stats["lots"] += body["lots_updated"]
+            stats["unknown"].update(body["unknown_symbols"])
+        stats["batch_sizes"].append(due - sent)
+        sent = due
+        elapsed = time.perf_counter() - started - now
+        if elapsed < batch_interval:
+            await asyncio.sleep(batch_interval - elapsed)
+    # Throughput is measured over the whole phase, including the idle tail.
+    remaining = duration - (time.perf_counter() - started)
+    if remaining > 0:
+        await asyncio.sleep(remaining)
+    stats["sent"] = sent
+    stats["elapsed"] = time.perf_counter() - started
+
+
+async def probe(client, name, interval, stop_event, results):
+    method, path, body = PROBES[name]
+    latencies, statuses = results.setdefault(name, ([], Counter()))
+    while not stop_event.is_set():
+        t0 = time.perf_counter()
+        response = await client.request(method, path, json=body)
+        latencies.append(time.perf_counter() - t0)
+        statuses[response.status_code] += 1
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(stop_event.wait(), interval)
+
+
+async def run_phase(client, payloads, schedule, duration, args, quiet):
+    stats = {"latency": [], "lag": [], "batch_sizes": [], "status": Counter(),
+             "lots": 0, "unknown": Counter(), "sent": 0, "elapsed": 0.0}
+    probe_results = {}
+    stop_event = asyncio.Event()
+    # main.py logs every request; keep the report readable.
+    with quiet():
+        probes = [asyncio.create_task(probe(client, name, args.probe_interval, stop_event, probe_results))
+                  for name in args.probes]
+        await send_ticks(client, payloads, schedule, duration, args.batch_interval, stats)
+        stop_event.set()
+        await asyncio.gather(*probes)
+    return stats, probe_results
+
+
+def print_phase(label, stats, probe_results):
+    elapsed = stats["elapsed"] or 1e-9
+    errors = sum(count for status, count in stats["status"].items() if status != 200)
+    batches = stats["batch_sizes"]
+    print(f"{label}: {stats['sent']} ticks in {stats['elapsed']:.2f} s "
+          f"= {stats['sent'] / elapsed:,.1f} ticks/s, {stats['lots'] / elapsed:,.0f} lots revalued/s, "
+          f"{len(batches)} batches (mean {np.mean(batches) if batches else 0:.1f} ticks), "
+          f"{errors} failed, {len(stats['unknown'])} unknown symbols")
+    report("POST /prices", stats["latency"])
+    report("send lag", stats["lag"])
+    for name, (latencies, statuses) in probe_results.items():
+        method, path, _ = PROBES[name]
+        codes = ", ".join(f"{status}: {count}" for status, count in sorted(statuses.items()))
+        report(f"{method} {path}", latencies, f"  [{codes}]")
+
+
+async def replay(args, ticks, client, quiet):
+    payloads = tick_payloads(ticks)
+    if args.rates:
+        for rate in args.rates:
+            # Loops over the ticks if the file is shorter than rate * duration.
+            count = max(int(rate * args.duration), 1)
+            schedule = np.arange(count) / rate
+            stats, probe_results = await run_phase(client, payloads, schedule, args.duration, args, quiet)
+            print_phase(f"{rate:g} ticks/s", stats, probe_results)
+    else:
+        schedule = (ticks["ts"] - ticks["ts"].iloc[0]).to_numpy() / args.speed
+        duration = schedule[-1] + args.batch_interval if len(schedule) else 0.0
+        stats, probe_results = await run_phase(client, payloads, schedule, duration, args, quiet)
+        print_phase(f"recorded timing x{args.speed:g}", stats, probe_results)
+
+
+async def run(args, ticks):
+    import httpx
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=60.0) as client:
+            await replay(args, ticks, client, contextlib.nullcontext)
+        return
+
+    def quiet():
+        return contextlib.redirect_stdout(devnull)
+
+    with open(os.devnull, "w") as devnull:
+        with quiet():
+            import main # creates and migrates portfolio.db in the temp directory
+        lots = seed_lots(main.DB_NAME, ticks, args.lots_per_symbol)
+        with quiet(), main.db.read() as conn:
+            main.engine.rebuild(conn)
+        print(f"Seeded {lots} open lots over {ticks['symbol'].nunique()} symbols in {os.getcwd()}")
+
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://replay", timeout=60.0) as client:
+            await replay(args, ticks, client, quiet)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Replay market ticks into POST /prices and measure the backend")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    gen = commands.add_parser("generate", help="Write a synthetic GBM tick file")
+    gen.add_argument("out", help="CSV file to write")
+    gen.add_argument("--symbols", type=int, default=500)
+    gen.add_argument("--ticks", type=int, default=100_000)
+    gen.add_argument("--rate", type=float, default=1000.0, help="Ticks per second in the recording")
+    gen.add_argument("--mu", type=float, default=0.08, help="Annual drift")
+    gen.add_argument("--sigma", type=float, default=0.3, help="Annual volatility")
+    gen.add_argument("--seed", type=int, default=42)
+
+    rep = commands.add_parser("replay", help="Drive POST /prices from a tick file or synthetic ticks")
+    rep.add_argument("--file", help="Tick file (default: synthetic GBM ticks)")
+    rep.add_argument("--symbols", type=int, default=500, help="Symbols in the synthetic ticks")
+    rep.add_argument("--rates", type=float, nargs="*", default=[1, 100, 10_000],
+                     help="Ticks per second, one phase each; pass no values with --file to keep recorded timing")
+    rep.add_argument("--speed", type=float, default=1.0, help="Speed-up of recorded timing")
+    rep.add_argument("--duration", type=float, default=10.0, help="Seconds per rate")
+    rep.add_argument("--batch-interval", type=float, default=0.05, help="Seconds between POST /prices batches")
+    rep.add_argument("--probes", nargs="*", choices=sorted(PROBES), default=["live-index", "positions", "snapshot"])
+    rep.add_argument("--probe-interval", type=float, default=0.2, help="Pause between calls of each probe")
+    rep.add_argument("--lots-per-symbol", type=int, default=20, help="Open lots seeded per symbol (in-process only)")
+    rep.add_argument("--url", help="Base URL of a running backend (default: in-process app)")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        ticks = generate_ticks(args.symbols, args.ticks, args.rate, args.mu, args.sigma, args.seed)
+        ticks.to_csv(args.out, index=False)
+        print(f"Wrote {len(ticks)} ticks for {ticks['symbol'].nunique()} symbols "
+              f"({ticks['ts'].iloc[-1]:.1f} s at {args.rate:g} ticks/s) to {args.out}")
+        return
+
+    if args.file:
+        ticks = read_ticks(os.path.abspath(args.file))
+    else:
+        peak = max(args.rates) if args.rates else 1000.0
+        ticks = generate_ticks(args.symbols, max(int(peak * args.duration), 1000), peak)
+    if ticks.empty:
+        raise SystemExit("No ticks to replay.")
+
+    if not args.url:
+        # main.py opens portfolio.db relative to the working directory at import time.
+        os.chdir(tempfile.mkdtemp(prefix="tick_replay_"))
+        sys.path.insert(0, BACKEND_DIR)
+    asyncio.run(run(args, ticks))
+
+
+if __name__ == "__main__":
+    main_cli()
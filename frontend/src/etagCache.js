@@ -0,0 +1,48 @@
+// File: src/etagCache.js
+
+import axios from "axios";
+
+// Conditional GETs for the backend's read endpoints. The last response to each
+// GET URL is kept together with its ETag; the next request for that URL sends
+// If-None-Match, and a 304 answer is turned back into the cached response.
+const MAX_ENTRIES = 100;
+const cache = new Map(); // full URL -> { etag, data, headers }
+
+const cacheKey = (config) => axios.getUri(config);
+const isGet = (config) => (config.method || "get").toLowerCase() === "get";
+
+axios.interceptors.request.use((config) => {
+  if (isGet(config)) {
+    const entry = cache.get(cacheKey(config));
+    if (entry) {
+      config.headers.set("If-None-Match", entry.etag);
+    }
+  }
+  return config;
+});
+
+axios.interceptors.response.use(
+  (response) => {
+    const etag = response.headers["etag"];
+    if (etag && isGet(response.config)) {
+      const key = cacheKey(response.config);
+      cache.delete(key); // re-insert so the Map stays in least-recently-used order
+      cache.set(key, { etag, data: response.data, headers: response.headers });
+      if (cache.size > MAX_ENTRIES) {
+        cache.delete(cache.keys().next().value);
+      }
+    }
+    return response;
+  },
+  (error) => {
+    // axios treats 304 as an error (validateStatus only accepts 2xx).
+    const response = error.response;
+    if (response && response.status === 304) {
+      const entry = cache.get(cacheKey(response.config));
+      if (entry) {
+        return { ...response, status: 200, data: entry.data, headers: entry.headers };
+      }
+    }
+    return Promise.reject(error);
+  }
+);
@@ -4,6 +4,7 @@ import ReactDOM from "react-dom/client";
 import App from "./App.jsx";
 import { BrowserRouter } from "react-router-dom";
 import "./index.css";
+import "./etagCache"; // conditional GETs for every axios call
 
 ReactDOM.createRoot(document.getElementById("root")).render(
   <React.StrictMode>
@@ -72,21 +72,14 @@ const CustomTreemapTooltip = ({ active, payload }) => {
 
 
 const Analysis = () => {
-  const [openPositions, setOpenPositions] = useState([]);
-  const [closedPositions, setClosedPositions] = useState([]);
+  // Every breakdown is computed by GET /analytics; the page only assigns colours.
+  const [analytics, setAnalytics] = useState(null);
 
   useEffect(() => {
     const fetchData = async () => {
       try {
-        const openRes = await axios.get("http://localhost:8000/positions");
-        const processedOpenPositions = openRes.data.map(pos => ({
-          ...pos,
-          marketValue: parseFloat(pos.marketValue) || 0
-        }));
-        setOpenPositions(processedOpenPositions);
-
-        const closedRes = await axios.get("http://localhost:8000/realised");
-        setClosedPositions(closedRes.data);
+        const res = await axios.get("http://localhost:8000/analytics");
+        setAnalytics(res.data);
       } catch (err) {
         console.error("Error fetching data for analysis:", err);
       }
@@ -94,127 +87,25 @@ const Analysis = () => {
     fetchData();
   }, []);
 
-  // --- Data preparation for Open Positions ---
-
-  // PnL by Symbol (Open Positions) - Bar chart
-  const openPnlData = openPositions.map(pos => ({
-    symbol: pos.symbol,
-    pnl: pos.pnl
-  }));
-
-  // Sector Exposure (Open Positions - Market Value) - Pie chart (This was the one removed)
-  // No longer needed:
-  // const openSectorExposure = openPositions.reduce((acc, pos) => {
-  //   acc[pos.sector || 'Uncategorized'] = (acc[pos.sector || 'Uncategorized'] || 0) + pos.marketValue;
-  //   return acc;
-  // }, {});
-  // const openSectorData = Object.keys(openSectorExposure).map(sector => ({
-  //   name: sector,
-  //   value: parseFloat(openSectorExposure[sector].toFixed(2))
-  // }));
-
-  // Age of Positions (Open Positions - Categorized by days) - Bar chart
-  const openPosAgeData = openPositions.reduce((acc, pos) => {
-    const ageInDays = parseFloat(pos.pos_age);
-
-    let category = "Unknown/Invalid Age";
-    if (!isNaN(ageInDays) && ageInDays >= 0) {
-      if (ageInDays <= 90) {
-        category = "<= 90 Days";
-      } else if (ageInDays <= 180) {
-        category = "91-180 Days";
-      } else if (ageInDays <= 365) {
-        category = "181-365 Days";
-      } else {
-        category = "> 365 Days";
-      }
-    }
-    acc[category] = (acc[category] || 0) + 1;
-    return acc;
-  }, {});
-
-  const openPosAgeChartData = Object.keys(openPosAgeData).map(age => ({
-    name: age,
-    value: openPosAgeData[age]
-  })).sort((a, b) => {
-    const order = {
-      "<= 90 Days": 1,
-      "91-180 Days": 2,
-      "181-365 Days": 3,
-      "> 365 Days": 4,
-      "Unknown/Invalid Age": 99
-    };
-    return (order[a.name] || 99) - (order[b.name] || 99);
-  });
-
-
-  // TVM Grade (Open Positions) - Pie chart
-  const openTvmGrades = openPositions.reduce((acc, pos) => {
-    let grade = "N/A";
-    if (pos.tvm !== null && pos.tvm !== undefined) {
-      const tvmValue = parseFloat(pos.tvm);
-      if (!isNaN(tvmValue)) {
-        if (tvmValue >= 10) grade = "Excellent";
-        else if (tvmValue >= 5) grade = "Good";
-        else if (tvmValue >= 1) grade = "Fair";
-        else grade = "Poor";
-      }
-    }
-    acc[grade] = (acc[grade] || 0) + 1;
-    return acc;
-  }, {});
+  // --- Open Positions ---
+  const openPnlData = analytics ? analytics.open_pnl : [];
+  const openPosAgeChartData = analytics ? analytics.position_age : [];
+  const openTvmChartData = analytics ? analytics.tvm_grades : [];
 
-  const openTvmChartData = Object.keys(openTvmGrades).map(grade => ({
-    name: grade,
-    value: openTvmGrades[grade]
+  // Market Value by Sector Treemap, with a colour per sector
+  const treemapData = (analytics ? analytics.sector_market_value : []).map((entry, index) => ({
+    name: entry.name,
+    size: entry.value,
+    color: COLORS[index % COLORS.length]
   }));
 
-  // --- DATA PREP FOR NEW CHARTS IN ANALYSIS.JSX (from previous PortfolioCharts.jsx) ---
+  // Market Value by Account Pie Chart
+  const pieChartDataAccounts = analytics ? analytics.account_market_value : [];
 
-  // UPDATED: Data for Market Value by Sector Treemap - now includes color assignment
-  const marketValueBySectorForTreemap = openPositions.reduce((acc, pos) => {
-    const sector = pos.sector || 'Uncategorized';
-    acc[sector] = (acc[sector] || 0) + pos.marketValue;
-    return acc;
-  }, {});
-
-  const treemapData = Object.keys(marketValueBySectorForTreemap).map((sector, index) => ({
-    name: sector,
-    size: marketValueBySectorForTreemap[sector],
-    color: COLORS[index % COLORS.length] // Assign a color from the COLORS array
-  }));
-
-  // Data for Market Value by Account Pie Chart
-  const marketValueByAccount = openPositions.reduce((acc, pos) => {
-    const account = pos.account || 'Uncategorized';
-    acc[account] = (acc[account] || 0) + pos.marketValue;
-    return acc;
-  }, {});
-  const pieChartDataAccounts = Object.keys(marketValueByAccount).map(account => ({
-    name: account,
-    value: marketValueByAccount[account]
-  }));
-
-  // --- END NEW DATA PREP ---
-
-
-  // --- Data preparation for Closed Positions ---
-
-  // PnL Distribution (Closed Positions) - Bar Chart
-  const closedPnlData = closedPositions.map(pos => ({
-    symbol: pos.symbol,
-    pnl: pos.total_pnl
-  }));
-
-  // Sector Performance (Closed Positions - Total PnL by sector) - Pie chart
-  const closedSectorPerformance = closedPositions.reduce((acc, pos) => {
-    acc[pos.sector || 'Uncategorized'] = (acc[pos.sector || 'Uncategorized'] || 0) + pos.total_pnl;
-    return acc;
-  }, {});
-  const closedSectorPerformanceData = Object.keys(closedSectorPerformance).map(sector => ({
-    name: sector,
-    value: parseFloat(closedSectorPerformance[sector].toFixed(2))
-  }));
+  // --- Closed Positions ---
+  // Realised P&L summed per symbol
+  const closedPnlData = analytics ? analytics.closed_pnl : [];
+  const closedSectorPerformanceData = analytics ? analytics.closed_sector_pnl : [];
 
   return (
     <div className="analysis-container">
@@ -1,6 +1,6 @@
 // File: src/pages/Dividends.jsx
 
-import React, { useEffect, useState, useMemo } from 'react';
+import React, { useEffect, useState } from 'react';
 import axios from 'axios';
 import {
   BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer,
@@ -13,38 +13,66 @@ const COLORS = [
   '#A020F0', '#FF6347', '#4682B4', '#DA70D6', '#8A2BE2', '#D2B48C', '#F08080'
 ];
 
+// Rows per page of the raw records table; groups come back whole.
+const PAGE_SIZE = 100;
+
 const Dividends = () => {
   const [rawDividends, setRawDividends] = useState([]);
+  const [groups, setGroups] = useState([]);
+  const [summary, setSummary] = useState({ count: 0, total_amount: 0 });
+  const [nextCursor, setNextCursor] = useState(null);
   const [chartData, setChartData] = useState([]); // For Total Amount by Ticker
   const [yearlyChartData, setYearlyChartData] = useState([]); // For Dividends by Year
   const [totalDividendEarned, setTotalDividendEarned] = useState(0);
   const [loading, setLoading] = useState(true);
+  const [tableLoading, setTableLoading] = useState(false);
   const [error, setError] = useState(null);
 
-  // ⚡️ NEW: State for filters ⚡️
+  // Filters are applied by the backend (GET /dividends query parameters).
   const [groupBy, setGroupBy] = useState('none'); // 'none', 'ticker', 'sector', 'year'
   const [searchTerm, setSearchTerm] = useState('');
+  const [tickerFilter, setTickerFilter] = useState(''); // searchTerm, debounced
 
-  const fetchDividendsData = async () => {
-    setLoading(true);
+  useEffect(() => {
+    const timer = setTimeout(() => setTickerFilter(searchTerm.trim()), 300);
+    return () => clearTimeout(timer);
+  }, [searchTerm]);
+
+  // Loads the first page for the current filters, or the next page when given a cursor.
+  const fetchDividendsData = async (cursor = null) => {
     setError(null);
+    const params = { group_by: groupBy };
+    if (tickerFilter) params.ticker = tickerFilter;
+    if (groupBy === 'none') params.limit = PAGE_SIZE;
+    if (cursor) params.cursor = cursor;
     try {
-      const response = await axios.get("http://localhost:8000/dividends");
-      setRawDividends(response.data.raw_data);
-      setChartData(response.data.chart_data);
-      setYearlyChartData(response.data.dividends_by_year);
-      setTotalDividendEarned(response.data.total_dividend_earned);
+      const response = await axios.get("http://localhost:8000/dividends", { params });
+      const data = response.data;
+      setRawDividends((prev) => (cursor ? [...prev, ...data.raw_data] : data.raw_data));
+      setGroups(data.groups || []);
+      setSummary(data.summary);
+      setNextCursor(data.next_cursor);
+      setChartData(data.chart_data);
+      setYearlyChartData(data.dividends_by_year);
+      setTotalDividendEarned(data.total_dividend_earned);
     } catch (err) {
       console.error("Error fetching dividends data:", err);
       setError("Failed to load dividends data. Please check the backend server and Excel file.");
     } finally {
       setLoading(false);
+      setTableLoading(false);
     }
   };
 
   useEffect(() => {
+    setTableLoading(true);
     fetchDividendsData();
-  }, []);
+  }, [groupBy, tickerFilter]);
+
+  const handleLoadMore = () => {
+    setTableLoading(true);
+    fetchDividendsData(nextCursor);
+  };
 
   const handleRefreshData = async () => {
     setLoading(true);
@@ -67,77 +95,7 @@ const Dividends = () => {
     return `₹${parseFloat(value).toLocaleString('en-IN', { minimumFractionDigits: 2, maximumFractionDigits: 2 })}`;
   };
 
-  // ⚡️ NEW: Memoized filtered and grouped data for the table ⚡️
-  const filteredAndGroupedDividends = useMemo(() => {
-    let currentData = rawDividends;
-
-    // Apply search filter
-    if (searchTerm) {
-      const lowerCaseSearchTerm = searchTerm.toLowerCase();
-      currentData = currentData.filter(record =>
-        record.ticker && record.ticker.toLowerCase().includes(lowerCaseSearchTerm)
-      );
-    }
-
-    // Apply group by logic
-    if (groupBy !== 'none' && currentData.length > 0) {
-      const grouped = {};
-      currentData.forEach(record => {
-        let key;
-        let displayKey;
-
-        switch (groupBy) {
-          case 'ticker':
-            key = record.ticker || 'N/A Ticker';
-            displayKey = key;
-            break;
-          case 'sector':
-            key = record.sector || 'N/A Sector';
-            displayKey = key;
-            break;
-          case 'year':
-            key = record.date_of_disbur ? new Date(record.date_of_disbur).getFullYear() : 'N/A Year';
-            displayKey = key;
-            break;
-          default:
-            key = 'none'; // Should not happen with current logic
-            displayKey = 'none';
-        }
-
-        if (!grouped[key]) {
-          grouped[key] = {
-            [groupBy]: displayKey,
-            total_amount: 0,
-            count: 0,
-            // To show a representative date if grouped by ticker/sector
-            first_record_date: record.date_of_disbur,
-            // Add other fields you might want to display for grouped rows
-          };
-        }
-        grouped[key].total_amount += record.amount || 0;
-        grouped[key].count += 1;
-      });
-
-      // Convert grouped object back to array
-      const groupedArray = Object.values(grouped);
-
-      // Sort grouped array
-      if (groupBy === 'year') {
-        groupedArray.sort((a, b) => a.year - b.year);
-      } else {
-        groupedArray.sort((a, b) => String(a[groupBy]).localeCompare(String(b[groupBy])));
-      }
-      return groupedArray;
-
-    } else {
-      // If no grouping, just sort the filtered raw data by date
-      return [...currentData].sort((a, b) => {
-        const dateA = a.date_of_disbur ? new Date(a.date_of_disbur) : new Date(0);
-        const dateB = b.date_of_disbur ? new Date(b.date_of_disbur) : new Date(0);
-        return dateB - dateA; // Descending order
-      });
-    }
-  }, [rawDividends, groupBy, searchTerm]);
+  const tableRows = groupBy === 'none' ? rawDividends : groups;
 
 
   if (loading) {
@@ -231,7 +189,7 @@ const Dividends = () => {
           Search Ticker:
           <input
             type="text"
-            placeholder="Search by Ticker"
+            placeholder="Ticker starts with..."
             value={searchTerm}
             onChange={(e) => setSearchTerm(e.target.value)}
           />
@@ -241,7 +199,11 @@ const Dividends = () => {
       {/* Raw Data Table Section */}
       <div className="table-responsive">
         <h3>All Dividend Records</h3>
-        {filteredAndGroupedDividends.length > 0 ? (
+        <p>
+          {summary.count} records, {formatCurrency(summary.total_amount)}
+          {tableLoading && " (updating...)"}
+        </p>
+        {tableRows.length > 0 ? (
           <table>
             <thead>
               <tr>
@@ -256,7 +218,7 @@ const Dividends = () => {
               </tr>
             </thead>
             <tbody>
-              {filteredAndGroupedDividends.map((record, index) => (
+              {tableRows.map((record, index) => (
                 <tr key={index}>
                   {groupBy === 'none' && <td>{record.ticker}</td>}
                   {groupBy === 'none' && <td>{record.date_of_disbur}</td>}
@@ -273,6 +235,11 @@ const Dividends = () => {
         ) : (
           <p>No dividend records found based on current filters.</p>
         )}
+        {groupBy === 'none' && nextCursor && (
+          <button onClick={handleLoadMore} disabled={tableLoading}>
+            Load more ({rawDividends.length} of {summary.count})
+          </button>
+        )}
       </div>
     </div>
   );
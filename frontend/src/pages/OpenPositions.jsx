@@ -1,6 +1,6 @@
 // File: src/pages/OpenPositions.jsx
 
-import React, { useEffect, useState, useMemo } from "react";
+import React, { useEffect, useState, useMemo, useRef } from "react";
 import axios from "axios";
 import "../App.css";
 
@@ -23,21 +23,14 @@ const OpenPositions = () => {
   const [portfolioIndex, setPortfolioIndex] = useState(0);
   const [netCashFlow, setNetCashFlow] = useState(0.0);
   const [livePortfolioIndex, setLivePortfolioIndex] = useState(0.0);
+  // Read by the stream handlers, so editing the cash flow does not reconnect the stream.
+  const netCashFlowRef = useRef(netCashFlow);
+  netCashFlowRef.current = netCashFlow;
 
   const [portfolioHistory, setPortfolioHistory] = useState([]);
   const [baseSnapshot, setBaseSnapshot] = useState(null);
 
 
-  const loadPositions = async () => {
-    try {
-      const res = await axios.get("http://localhost:8000/positions");
-      setGrouped(res.data);
-      console.log("Open positions data from Excel:", res.data);
-    } catch (err) {
-      console.error("Error loading open positions from Excel:", err);
-    }
-  };
-
   const loadLivePortfolioIndex = async (currentNetCashFlow) => {
     try {
       const res = await axios.get(`http://localhost:8000/calculate-live-index?net_cash_flow_today=${currentNetCashFlow}`);
@@ -52,7 +45,9 @@ const OpenPositions = () => {
 
   const loadPortfolioHistory = async () => {
       try {
-          const res = await axios.get("http://localhost:8000/portfolio-history");
+          // The chart is a few hundred pixels wide; the backend keeps the first
+          // and last snapshot when it downsamples.
+          const res = await axios.get("http://localhost:8000/portfolio-history?max_points=500");
           const historyData = res.data;
           // ⚡️ FIX: No need for explicit weekend filtering here if backend prevents weekend snapshots ⚡️
           // The backend's `ORDER BY date DESC LIMIT 1` will naturally pick Friday's data on Monday.
@@ -67,13 +62,11 @@ const OpenPositions = () => {
               setPortfolioIndex(latestSnapshot.portfolio_index_value);
               setBusinessDate(latestSnapshot.date);
               setNetCashFlow(latestSnapshot.net_cash_flow_today || 0.0);
-              await loadLivePortfolioIndex(latestSnapshot.net_cash_flow_today || 0.0);
           } else {
               setPortfolioIndex(0);
               setBusinessDate(new Date().toISOString().slice(0, 10));
               setNetCashFlow(0.0);
               setBaseSnapshot(null);
-              await loadLivePortfolioIndex(0.0);
           }
       } catch (err) {
           console.error("Error loading portfolio history:", err);
@@ -86,11 +79,53 @@ const OpenPositions = () => {
       }
   };
 
+  // Positions arrive over the stream below.
   useEffect(() => {
-    loadPositions();
     loadPortfolioHistory();
   }, []);
 
+  // The live index depends on the cash flow typed in below; re-estimate it when that changes.
+  useEffect(() => {
+    loadLivePortfolioIndex(netCashFlow);
+  }, [netCashFlow]);
+
+  // Live updates pushed by the backend: a full snapshot on connect, then diffs
+  // ({changed, removed, index}) whenever prices or positions change. The index
+  // in each event is computed for the cash flow the stream was opened with; once
+  // the cash flow has been edited, it is re-estimated for the current value instead.
+  useEffect(() => {
+    const streamCashFlow = parseFloat(netCashFlowRef.current) || 0;
+    const source = new EventSource(`http://localhost:8000/stream?net_cash_flow_today=${streamCashFlow}`);
+    const applyIndex = (index) => {
+      const currentCashFlow = parseFloat(netCashFlowRef.current) || 0;
+      if (currentCashFlow === streamCashFlow) {
+        setLivePortfolioIndex(index.live_portfolio_index_value);
+      } else {
+        loadLivePortfolioIndex(currentCashFlow);
+      }
+    };
+    source.addEventListener("snapshot", (event) => {
+      const { positions, index } = JSON.parse(event.data);
+      setGrouped(positions);
+      applyIndex(index);
+    });
+    source.addEventListener("diff", (event) => {
+      const { changed, removed, index } = JSON.parse(event.data);
+      setGrouped((prev) => {
+        const bySymbol = new Map(prev.map((entry) => [entry.symbol, entry]));
+        removed.forEach((symbol) => bySymbol.delete(symbol));
+        changed.forEach((entry) => bySymbol.set(entry.symbol, entry));
+        return Array.from(bySymbol.values());
+      });
+      applyIndex(index);
+    });
+    source.onerror = (err) => {
+      // EventSource reconnects on its own and gets a fresh snapshot.
+      console.error("Live update stream error:", err);
+    };
+    return () => source.close();
+  }, []);
+
   const handlePriceChange = (symbol, value) => {
     setManualPrices((prev) => ({ ...prev, [symbol]: Number(value) }));
   };
@@ -112,8 +147,7 @@ const OpenPositions = () => {
 
   const handleSellSubmit = async () => {
     // ... (existing sell logic)
-    setShowSellModal(false);
-    loadPositions();
+    setShowSellModal(false); // the stream pushes the changed positions
     loadPortfolioHistory();
   };
 
@@ -269,7 +303,6 @@ const OpenPositions = () => {
   const handleNetCashFlowChange = (e) => {
     const value = parseFloat(e.target.value);
     setNetCashFlow(isNaN(value) ? 0.0 : value);
-    loadLivePortfolioIndex(isNaN(value) ? 0.0 : value);
   };
 
 const renderTable = (data) => (
@@ -392,11 +425,8 @@ const renderTable = (data) => (
     <div className="open-positions-container">
       <h2>Open Positions</h2>
       <button onClick={() => {
+        // The stream pushes whatever the reload changed.
         axios.post("http://localhost:8000/reload-excel-data")
-          .then(() => {
-            loadPositions();
-            loadLivePortfolioIndex(netCashFlow);
-          })
           .catch(err => console.error("Error reloading Excel data:", err));
       }}>
         Refresh Data from Excel
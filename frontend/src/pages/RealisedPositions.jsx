@@ -4,25 +4,38 @@ import React, { useEffect, useState } from "react";
 import axios from "axios";
 import "../App.css";
 
+const PAGE_SIZE = 200;
+
 const RealisedPositions = () => {
   const [realised, setRealised] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [totalCount, setTotalCount] = useState(0);
 
-  useEffect(() => {
-    const fetchRealised = async () => {
-      try {
-        const res = await axios.get("http://localhost:8000/realised");
-        setRealised(res.data);
-      } catch (error) {
-        console.error("Failed to fetch realised positions", error);
+  // Pages through /realised with the keyset cursor returned in X-Next-Cursor.
+  const fetchRealised = async (cursor = null) => {
+    try {
+      const res = await axios.get("http://localhost:8000/realised", {
+        params: { limit: PAGE_SIZE, ...(cursor ? { cursor } : {}) },
+      });
+      setRealised((prev) => (cursor ? [...prev, ...res.data] : res.data));
+      setNextCursor(res.headers["x-next-cursor"] || null);
+      // Only the first page carries X-Total-Count; later pages keep the first total.
+      if (res.headers["x-total-count"] !== undefined) {
+        setTotalCount(Number(res.headers["x-total-count"]));
       }
-    };
+    } catch (error) {
+      console.error("Failed to fetch realised positions", error);
+    }
+  };
 
+  useEffect(() => {
     fetchRealised();
   }, []);
 
   return (
     <div className="realised-positions-container">
       <h2>Realised Positions</h2>
+      <p>Showing {realised.length} of {totalCount}</p>
       <div className="table-responsive">
         <table>
           <thead>
@@ -68,6 +81,9 @@ const RealisedPositions = () => {
           </tbody>
         </table>
       </div>
+      {nextCursor && (
+        <button onClick={() => fetchRealised(nextCursor)}>Load more</button>
+      )}
     </div>
   );
 };
@@ -4,25 +4,38 @@ import React, { useEffect, useState } from "react";
 import axios from "axios";
 import "../App.css";
 
+const PAGE_SIZE = 200;
+
 const TradesHistory = () => {
   const [trades, setTrades] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [totalCount, setTotalCount] = useState(0);
 
-  useEffect(() => {
-    const fetchTrades = async () => {
-      try {
-        const res = await axios.get("http://localhost:8000/all_trades");
-        setTrades(res.data);
-      } catch (error) {
-        console.error("Failed to fetch trade history", error);
+  // Pages through /all_trades with the keyset cursor returned in X-Next-Cursor.
+  const fetchTrades = async (cursor = null) => {
+    try {
+      const res = await axios.get("http://localhost:8000/all_trades", {
+        params: { limit: PAGE_SIZE, ...(cursor ? { cursor } : {}) },
+      });
+      setTrades((prev) => (cursor ? [...prev, ...res.data] : res.data));
+      setNextCursor(res.headers["x-next-cursor"] || null);
+      // Only the first page carries X-Total-Count; later pages keep the first total.
+      if (res.headers["x-total-count"] !== undefined) {
+        setTotalCount(Number(res.headers["x-total-count"]));
       }
-    };
+    } catch (error) {
+      console.error("Failed to fetch trade history", error);
+    }
+  };
 
+  useEffect(() => {
     fetchTrades();
   }, []);
 
   return (
     <div>
       <h2>Trades History (All Entries)</h2>
+      <p>Showing {trades.length} of {totalCount}</p>
       <table>
         <thead>
           <tr>
@@ -55,6 +68,9 @@ const TradesHistory = () => {
           ))}
         </tbody>
       </table>
+      {nextCursor && (
+        <button onClick={() => fetchTrades(nextCursor)}>Load more</button>
+      )}
     </div>
   );
 };